@@ -0,0 +1,185 @@
+"""
+Admin authentication
+- Admin accounts with hashed passwords and roles (app.models.Admin)
+- Sessions carry (admin_id, session_version)
+- Each admin request validates the session against a small in-process
+  TTL cache, so the admins table is read at most once per TTL per admin
+  instead of on every dashboard refresh
+- Logins and failed logins are recorded in the audit log
+"""
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, session
+
+import audit
+from config import DEFAULT_ADMIN_PASSWORD
+from dbhealth import DB_ERRORS
+from app.models import db, Admin
+
+
+class SessionCache:
+    """
+    TTL cache of admin account state keyed by admin id
+    - Stores (is_active, session_version, role, username)
+    """
+
+    def __init__(self, ttl=60, max_size=1000, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, admin_id, loader, ttl=None):
+        """
+        Get cached account state, loading it on miss or expiry
+
+        Args:
+            admin_id (int): Admin id from the session
+            loader (callable): Returns the state tuple or None
+            ttl (int): Seconds to keep a loaded entry (defaults to self.ttl)
+
+        Returns:
+            tuple: Account state, or None if the admin does not exist
+            (an expired entry is reused while the database is unavailable)
+        """
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(admin_id)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+
+        try:
+            state = loader(admin_id)
+        except DB_ERRORS:
+            if entry is None:
+                raise
+            return entry[1]
+
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                self._entries.clear()
+            self._entries[admin_id] = (now + (self.ttl if ttl is None else ttl), state)
+        return state
+
+    def invalidate(self, admin_id=None):
+        """Drop one admin (or every admin) from the cache"""
+        with self._lock:
+            if admin_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(admin_id, None)
+
+
+session_cache = SessionCache()
+
+
+def _load_admin_state(admin_id):
+    admin = db.session.get(Admin, admin_id)
+    if admin is None:
+        return None
+    return (admin.is_active, admin.session_version, admin.role, admin.username)
+
+
+def authenticate(username, password):
+    """
+    Check admin credentials
+
+    On a fresh install with no admin accounts, the ADMIN_USERNAME /
+    ADMIN_PASSWORD from config create the first 'owner' account (outside
+    development / testing only when ADMIN_PASSWORD is set to something
+    other than the public default).
+
+    Returns:
+        Admin: The authenticated admin, or None
+    """
+    admin = _check_credentials(username, password)
+    if admin is None:
+        audit.record('admin_login_failed', subject=username)
+    return admin
+
+
+def _check_credentials(username, password):
+    if not username or not password:
+        return None
+
+    admin = Admin.query.filter_by(username=username).first()
+
+    if admin is None and Admin.query.count() == 0:
+        config = current_app.config
+        if username == config.get('ADMIN_USERNAME') and password == config.get('ADMIN_PASSWORD'):
+            if password == DEFAULT_ADMIN_PASSWORD and not config.get('ADMIN_ALLOW_DEFAULT_PASSWORD'):
+                current_app.logger.error(
+                    'First owner login refused: ADMIN_PASSWORD is unset or the public default. '
+                    'Set ADMIN_PASSWORD, or create the owner with '
+                    '`python manage_admins.py create <username> owner`'
+                )
+                return None
+            admin = Admin(username=username, role='owner', session_version=0)
+            admin.set_password(password)
+            db.session.add(admin)
+            db.session.commit()
+            return admin
+        return None
+
+    if admin is None or not admin.is_active or not admin.check_password(password):
+        return None
+    return admin
+
+
+def login_admin(admin):
+    """Start an admin session"""
+    session.clear()
+    session['admin_logged_in'] = True
+    session['admin_id'] = admin.id
+    session['admin_username'] = admin.username
+    session['admin_role'] = admin.role
+    session['admin_session_version'] = admin.session_version
+    session.permanent = True
+
+    admin.last_login_at = datetime.utcnow()
+    db.session.commit()
+    session_cache.invalidate(admin.id)
+    audit.record('admin_login', admin_id=admin.id)
+
+
+def logout_admin():
+    """End the admin session"""
+    if session.get('admin_logged_in'):
+        audit.record('admin_logout')
+    session.clear()
+
+
+def current_admin_valid():
+    """
+    Validate the admin session
+    - Account must exist, be active and have the same session_version
+    - Served from the TTL cache (no query on cache hit)
+
+    Returns:
+        bool: True if the session belongs to a valid admin
+    """
+    admin_id = session.get('admin_id')
+    if not session.get('admin_logged_in') or admin_id is None:
+        return False
+
+    state = session_cache.get(admin_id, _load_admin_state,
+                              ttl=current_app.config.get('ADMIN_SESSION_CACHE_TTL'))
+    if state is None:
+        return False
+
+    is_active, session_version, role, _ = state
+    if not is_active or session_version != session.get('admin_session_version'):
+        return False
+
+    # Role changes apply without logging out
+    if session.get('admin_role') != role:
+        session['admin_role'] = role
+    return True
+
+
+def has_role(*roles):
+    """Check the role of the logged-in admin"""
+    return session.get('admin_role') in roles
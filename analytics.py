@@ -0,0 +1,292 @@
+"""
+Attendance analytics
+- Hour-of-day x day-of-week heatmap of check-ins (gym local time)
+- Live estimated occupancy from entry_time / exit_time
+- Daily counts with rolling averages
+
+The heatmap is bucketed by the database in a single GROUP BY pass
+(entry_date x local hour, at most 24 rows per day) and folded into a flat
+7 x 24 counter array; aggregates are cached for ANALYTICS_CACHE_SECONDS
+in the shared app cache (namespace 'analytics').
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import Integer, bindparam
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+import businessday
+from app.models import db, EntryLog
+from businessday import gym_timezone
+from cache import get_cache
+from tenancy import current_location
+
+
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+# ============================================================
+# HEATMAP
+# ============================================================
+
+class local_hour(FunctionElement):
+    """
+    SQL expression: hour of a UTC datetime column shifted by N minutes
+    - local_hour(EntryLog.entry_time, offset_minutes)
+    """
+    type = Integer()
+    name = 'local_hour'
+    inherit_cache = True
+
+    def __init__(self, column, offset_minutes):
+        super().__init__(column, bindparam('offset_minutes', int(offset_minutes), type_=Integer()))
+
+
+@compiles(local_hour)
+def _local_hour_default(element, compiler, **kw):
+    column, offset = list(element.clauses)
+    return (f'EXTRACT(HOUR FROM {compiler.process(column, **kw)} '
+            f'+ {compiler.process(offset, **kw)} * INTERVAL \'1 minute\')')
+
+
+@compiles(local_hour, 'mysql')
+def _local_hour_mysql(element, compiler, **kw):
+    column, offset = list(element.clauses)
+    return f'HOUR(DATE_ADD({compiler.process(column, **kw)}, INTERVAL {compiler.process(offset, **kw)} MINUTE))'
+
+
+@compiles(local_hour, 'sqlite')
+def _local_hour_sqlite(element, compiler, **kw):
+    column, offset = list(element.clauses)
+    return (f"CAST(strftime('%H', datetime({compiler.process(column, **kw)}, "
+            f"{compiler.process(offset, **kw)} || ' minutes')) AS INTEGER)")
+
+
+def _offset_segments(since, until, tz):
+    """
+    Split [since, until] into runs of days with the same UTC offset
+    (one segment per DST period, usually 1-3 per year)
+
+    Returns:
+        list: (first_day, last_day, offset_minutes)
+    """
+    segments = []
+    day = since
+    while day <= until:
+        noon = datetime(day.year, day.month, day.day, 12, tzinfo=tz)
+        offset = int(noon.utcoffset().total_seconds() // 60)
+        if segments and segments[-1][2] == offset:
+            segments[-1][1] = day
+        else:
+            segments.append([day, day, offset])
+        day += timedelta(days=1)
+    return [tuple(segment) for segment in segments]
+
+
+def hourly_heatmap(days=365, today=None):
+    """
+    Check-in counts by day of week and hour of day
+
+    Args:
+        days (int): Look-back window in days
+        today (date): Reference day (defaults to today)
+
+    Returns:
+        dict: {'weekdays': [...], 'hours': [0..23],
+               'counts': 7 x 24 matrix, 'averages': 7 x 24 matrix
+               (mean check-ins per occurrence of that weekday), 'total': int}
+    """
+    today = today or businessday.today()
+    since = today - timedelta(days=days - 1)
+
+    # Flat counter array: index = weekday * 24 + hour
+    buckets = [0] * (7 * 24)
+
+    for first_day, last_day, offset in _offset_segments(since, today, gym_timezone()):
+        hour = local_hour(EntryLog.entry_time, offset)
+        rows = db.session.query(
+            EntryLog.entry_date,
+            hour,
+            db.func.count(EntryLog.id)
+        ).filter(
+            EntryLog.entry_date >= first_day,
+            EntryLog.entry_date <= last_day
+        ).group_by(
+            EntryLog.entry_date,
+            hour
+        )
+        for entry_date, entry_hour, count in rows:
+            buckets[entry_date.weekday() * 24 + int(entry_hour)] += count
+
+    # Number of times each weekday occurs in the window (for averages)
+    occurrences = [0] * 7
+    for offset in range(days):
+        occurrences[(since + timedelta(days=offset)).weekday()] += 1
+
+    counts = [buckets[day * 24:(day + 1) * 24] for day in range(7)]
+    averages = [
+        [round(count / occurrences[day], 2) if occurrences[day] else 0 for count in counts[day]]
+        for day in range(7)
+    ]
+
+    return {
+        'weekdays': list(WEEKDAYS),
+        'hours': list(range(24)),
+        'counts': counts,
+        'averages': averages,
+        'total': sum(buckets),
+        'since': since.strftime('%Y-%m-%d'),
+        'until': today.strftime('%Y-%m-%d'),
+    }
+
+
+def peak_hours(heatmap, top=5):
+    """Busiest (weekday, hour) slots by average check-ins"""
+    slots = [
+        (heatmap['averages'][day][hour], WEEKDAYS[day], hour)
+        for day in range(7) for hour in range(24)
+    ]
+    slots.sort(reverse=True)
+    return [
+        {'weekday': weekday, 'hour': hour, 'average': average}
+        for average, weekday, hour in slots[:top] if average > 0
+    ]
+
+
+# ============================================================
+# DAILY TRENDS
+# ============================================================
+
+def daily_counts(days=30, today=None, window=7):
+    """
+    Check-ins per day with a rolling average
+
+    Args:
+        days (int): Number of days to return
+        today (date): Reference day
+        window (int): Rolling average window in days
+
+    Returns:
+        list: [{'date', 'count', 'rolling_avg'}], oldest first
+    """
+    today = today or businessday.today()
+    since = today - timedelta(days=days + window - 2)
+
+    rows = db.session.query(
+        EntryLog.entry_date,
+        db.func.count(EntryLog.id)
+    ).filter(
+        EntryLog.entry_date >= since,
+        EntryLog.entry_date <= today
+    ).group_by(
+        EntryLog.entry_date
+    ).all()
+    by_day = {row[0]: row[1] for row in rows}
+
+    # Dense series (days without check-ins count as zero)
+    series = [by_day.get(since + timedelta(days=i), 0) for i in range(days + window - 1)]
+
+    result = []
+    running = sum(series[:window - 1])
+    for i in range(window - 1, len(series)):
+        running += series[i]
+        day = since + timedelta(days=i)
+        result.append({
+            'date': day.strftime('%Y-%m-%d'),
+            'count': series[i],
+            'rolling_avg': round(running / window, 2)
+        })
+        running -= series[i - window + 1]
+    return result
+
+
+# ============================================================
+# OCCUPANCY
+# ============================================================
+
+def estimated_occupancy(now=None, today=None):
+    """
+    Members estimated to be on the floor right now
+    - Entries today with an exit_time in the future, or
+    - Entries today without exit_time that started less than
+      AVERAGE_VISIT_MINUTES ago
+
+    Returns:
+        int: Estimated occupancy
+    """
+    now = now or datetime.utcnow()
+    today = today or businessday.today()
+    visit = timedelta(minutes=current_app.config.get('AVERAGE_VISIT_MINUTES', 90))
+
+    return db.session.query(db.func.count(EntryLog.id)).filter(
+        EntryLog.entry_date == today,
+        EntryLog.entry_time <= now,
+        db.or_(
+            EntryLog.exit_time > now,
+            db.and_(EntryLog.exit_time.is_(None), EntryLog.entry_time > now - visit)
+        )
+    ).scalar()
+
+
+def occupancy_curve(today=None, step_minutes=30):
+    """
+    Estimated occupancy through the business day (gym local time)
+    - Slots run from DAY_ROLLOVER_HOUR to the next day's rollover, so
+      sessions after local midnight stay on the evening's curve (and a
+      DST change gives 23 or 25 hours of slots)
+    - One pass over today's entries using +1/-1 events and a prefix sum
+    """
+    today = today or businessday.today()
+    visit = timedelta(minutes=current_app.config.get('AVERAGE_VISIT_MINUTES', 90))
+    day_start, day_end = businessday.day_range(today)
+    step = timedelta(minutes=step_minutes)
+    slots = (day_end - day_start) // step
+    deltas = [0] * (slots + 1)
+
+    rows = db.session.query(EntryLog.entry_time, EntryLog.exit_time).filter(
+        EntryLog.entry_date == today
+    )
+    for entry_time, exit_time in rows:
+        first = min(max((entry_time - day_start) // step, 0), slots - 1)
+        last = min(((exit_time or entry_time + visit) - day_start) // step, slots)
+        deltas[first] += 1
+        deltas[max(last, first + 1)] -= 1
+
+    curve = []
+    current = 0
+    for slot in range(slots):
+        current += deltas[slot]
+        label = businessday.local_time(day_start + slot * step)
+        curve.append({'time': label.strftime('%H:%M'), 'occupancy': current})
+    return curve
+
+
+# ============================================================
+# SUMMARY
+# ============================================================
+
+def analytics_summary(days=365):
+    """
+    All analytics for the statistics view / JSON API
+    - Heatmap and daily trends cached per location
+    - Occupancy is always live
+    """
+    ttl = current_app.config.get('ANALYTICS_CACHE_SECONDS', 300)
+    cache = get_cache()
+    location = current_location()
+    today = businessday.today()
+
+    heatmap = cache.get_or_set('analytics', f'heatmap:{location}:{today}:{days}',
+                               lambda: hourly_heatmap(days=days, today=today), ttl=ttl)
+    daily = cache.get_or_set('analytics', f'daily:{location}:{today}',
+                             lambda: daily_counts(days=30, today=today), ttl=ttl)
+
+    return {
+        'heatmap': heatmap,
+        'peak_hours': peak_hours(heatmap),
+        'daily': daily,
+        'occupancy': {
+            'current': estimated_occupancy(today=today),
+            'curve': occupancy_curve(today=today),
+        },
+    }
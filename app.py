@@ -22,21 +22,33 @@ ARCHITECTURE:
 
 from flask import Flask, render_template, session
 from flask_sqlalchemy import SQLAlchemy
-from config import DevelopmentConfig
+from config import APP_CONFIG
 from models import db
 from routes_registration import registration_bp
 from routes_entry import entry_bp
 from routes_admin import admin_bp
+from tenancy import init_tenancy
+from ratelimit import init_rate_limiting
+from cache import init_cache
+from jobs import init_jobs
+from audit import init_audit
+from events import init_events
+from dbhealth import init_dbhealth
+from fallback import init_fallback
+from occupancy import init_occupancy
+from profiling import init_profiling
 import os
-from datetime import timedelta
 
 
-def create_app(config=None):
+def create_app(config=None, init_schema=None):
     """
     Application factory function to create and configure Flask app
     
     Args:
-        config: Configuration object (defaults to DevelopmentConfig)
+        config: Configuration object (defaults to the APP_ENV selection,
+                see config.load_config)
+        init_schema: Apply pending migrations on startup
+                     (defaults to the AUTO_MIGRATE config value)
     
     Returns:
         Flask application instance
@@ -45,17 +57,30 @@ def create_app(config=None):
     
     # Load configuration
     if config is None:
-        config = DevelopmentConfig()
+        config = APP_CONFIG
     app.config.from_object(config)
     
     # Initialize database
     db.init_app(app)
     
-    # Configure session
-    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=2)
-    app.config['SESSION_COOKIE_SECURE'] = False  # Set to True for HTTPS
-    app.config['SESSION_COOKIE_HTTPONLY'] = True
-    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+    # Opt-in request profiling (first, so its timings include the other hooks)
+    init_profiling(app)
+    
+    # Resolve the gym location (tenant) for each request
+    init_tenancy(app)
+    
+    # Request rate limiting (login, check-in, member lookup)
+    init_rate_limiting(app)
+    init_cache(app)
+    init_jobs(app)
+    init_audit(app)
+    init_events(app)
+    
+    # Query timeouts and circuit breakers; check-ins journaled during outages
+    init_dbhealth(app)
+    init_fallback(app)
+    
+    # Session settings (lifetime, secure cookies) come from the config class
     
     # Register blueprints
     # ============================================================
@@ -106,17 +131,24 @@ def create_app(config=None):
     # ============================================================
     # DATABASE INITIALIZATION
     # ============================================================
-    with app.app_context():
-        # Create all database tables
-        db.create_all()
-        print("✓ Database tables initialized")
+    # Schema changes are versioned in migrations.py; production workers
+    # skip this step and start without touching the schema
+    if init_schema is None:
+        init_schema = app.config.get('AUTO_MIGRATE', True)
+    if init_schema:
+        from migrations import upgrade_all
+        upgrade_all(app)
+        print("✓ Database schema up to date")
+    
+    # Live occupancy starts from the database, not from zero
+    init_occupancy(app)
     
     return app
 
 
 if __name__ == '__main__':
     """
-    Application entry point
+    Development entry point
     
     Before running:
     1. Install dependencies: pip install -r requirements.txt
@@ -125,15 +157,18 @@ if __name__ == '__main__':
     4. Run: python app.py
     
     The application will be available at: http://localhost:5000
+    
+    Production runs under gunicorn instead (see wsgi.py / DEPLOYMENT.md):
+        gunicorn -c gunicorn.conf.py wsgi:app
     """
     
     # Create Flask app
     app = create_app()
     
-    # Run development server
+    # Run development server (single process, debug from the config class)
     app.run(
         host='localhost',
         port=5000,
-        debug=True,
-        use_reloader=True
+        debug=app.config.get('DEBUG', False),
+        use_reloader=app.config.get('DEBUG', False)
     )
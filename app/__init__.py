@@ -1,13 +1,33 @@
 from flask import Flask
 from config import APP_CONFIG
 from app.models import db
+from tenancy import init_tenancy
+from ratelimit import init_rate_limiting
+from cache import init_cache
+from profiling import init_profiling
 
-def create_app():
+def create_app(init_schema=None):
     app = Flask(__name__)
     app.config.from_object(APP_CONFIG)
     
     # Initialize extensions
     db.init_app(app)
+    init_profiling(app)
+    init_tenancy(app)
+    init_rate_limiting(app)
+    init_cache(app)
+    
+    # Imported here: these modules import app.models
+    from jobs import init_jobs
+    from audit import init_audit
+    from events import init_events
+    from dbhealth import init_dbhealth
+    from fallback import init_fallback
+    init_jobs(app)
+    init_audit(app)
+    init_events(app)
+    init_dbhealth(app)
+    init_fallback(app)
     
     # Register Blueprints
     from app.main_routes import main_bp
@@ -18,8 +38,14 @@ def create_app():
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(auth_bp, url_prefix='/auth')
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
+    # Apply pending migrations (skipped in production, see AUTO_MIGRATE)
+    if init_schema is None:
+        init_schema = app.config.get('AUTO_MIGRATE', True)
+    if init_schema:
+        from migrations import upgrade_all
+        upgrade_all(app)
+    
+    from occupancy import init_occupancy
+    init_occupancy(app)
         
     return app
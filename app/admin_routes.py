@@ -1,14 +1,23 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session
-from app.models import User, EntryLog, db
+from flask import Blueprint, render_template, request, redirect, url_for, session, Response, stream_with_context
+from app.models import db, User
+from events import broker, format_sse
+from admin_auth import current_admin_valid
+from tenancy import current_location
+from reports import not_entered_query
+from services import StatsService
+from config import APP_CONFIG
 from functools import wraps
-from datetime import date, datetime
+from datetime import datetime
+import businessday
 
 admin_bp = Blueprint('admin', __name__)
 
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not session.get('admin_logged_in'):
+        # Validated against the admin account via a TTL cache (admin_auth)
+        if not current_admin_valid():
+            session.clear()
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
     return decorated_function
@@ -16,7 +25,7 @@ def login_required(f):
 @admin_bp.route('/dashboard')
 @login_required
 def dashboard():
-    today = date.today()
+    today = businessday.today()
     filter_date_str = request.args.get('date')
     
     if filter_date_str:
@@ -27,37 +36,54 @@ def dashboard():
     else:
         filter_date = today
 
-    # Stats
-    total_registrations = User.query.count()
-    daily_entry_count = EntryLog.query.filter_by(entry_date=filter_date).count()
+    # Stats (cached until the next registration / check-in)
+    counts = StatsService.dashboard_counts(filter_date)
     
-    # Lists
-    entries_today = EntryLog.query.filter_by(entry_date=filter_date).all()
-    entered_user_ids = [entry.user_id for entry in entries_today]
+    # Lists (members loaded in the same query)
+    entries_today = StatsService.entries_query(filter_date).all()
     
-    # Users who have NOT entered today
-    # Note: For large databases, fetching all users might be slow. 
-    # But for a gym/org with <1000s users, this is fine.
-    # A more optimized query would be LEFT JOIN where entry is NULL.
-    # user_query = db.session.query(User).outerjoin(EntryLog, (User.id == EntryLog.user_id) & (EntryLog.entry_date == filter_date))
-    # not_entered_today = user_query.filter(EntryLog.id == None).all()
-    
-    # Doing Python-side filtering for simplicity and readability as requested, 
-    # unless dataset is huge. Let's do SQL query for best practice.
-    subquery = db.session.query(EntryLog.user_id).filter(EntryLog.entry_date == filter_date).subquery()
-    not_entered_today = User.query.filter(~User.id.in_(subquery)).all()
+    # Users who have NOT entered on the filter date
+    # LEFT JOIN anti-join returning lean rows, one page at a time
+    page = request.args.get('page', 1, type=int)
+    not_entered_today = not_entered_query(today=filter_date).paginate(
+        page=page, per_page=APP_CONFIG.ITEMS_PER_PAGE
+    )
     
     return render_template('admin_dashboard.html', 
-                           total_registrations=total_registrations,
-                           daily_entry_count=daily_entry_count,
+                           total_registrations=counts['total_users'],
+                           daily_entry_count=counts['entries'],
                            entries_today=entries_today,
                            not_entered_today=not_entered_today,
-                           filter_date=filter_date)
+                           filter_date=filter_date,
+                           is_today=(filter_date == today))
+
+@admin_bp.route('/stream')
+@login_required
+def stream():
+    # Counters seeded once per process (re-seeded every EVENTS_RESEED_SECONDS); dashboards then just listen
+    location = current_location()
+    counters = broker.ensure_counters(StatsService.live_counters, channel=location)
+    subscriber = broker.subscribe(channel=location)
+    initial = format_sse('counters', {'counters': counters})
+    # Release the pooled connection before the long-lived stream starts
+    db.session.remove()
+
+    response = Response(stream_with_context(broker.stream(subscriber, initial=initial)),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @admin_bp.route('/qr')
 @login_required
 def view_qr_codes():
-    return render_template('qr_view.html')
+    # Per-location QR images generated by run.py
+    location = current_location()
+    suffix = '' if location == APP_CONFIG.DEFAULT_LOCATION else f'_{location}'
+    return render_template('qr_view.html',
+                           registration_qr=f'registration_qr{suffix}.png',
+                           entry_qr=f'entry_qr{suffix}.png',
+                           exit_qr=f'exit_qr{suffix}.png')
 
 @admin_bp.route('/users')
 @login_required
@@ -1,16 +1,20 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, session
 from flask import current_app
+from ratelimit import rate_limit
+from admin_auth import authenticate, login_admin, logout_admin
 
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
+@rate_limit('login')
 def login():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
         
-        if username == current_app.config['ADMIN_USERNAME'] and password == current_app.config['ADMIN_PASSWORD']:
-            session['admin_logged_in'] = True
+        admin = authenticate(username, password)
+        if admin:
+            login_admin(admin)
             return redirect(url_for('admin.dashboard'))
         else:
             flash('Invalid credentials', 'error')
@@ -19,5 +23,5 @@ def login():
 
 @auth_bp.route('/logout')
 def logout():
-    session.pop('admin_logged_in', None)
+    logout_admin()
     return redirect(url_for('auth.login'))
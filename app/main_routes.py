@@ -1,7 +1,11 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for
-from app.models import db, User, EntryLog
-from datetime import datetime, date
-import uuid
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
+from tenancy import current_location
+from app.models import db
+from ratelimit import rate_limit
+from occupancy import occupancy
+from services import CheckinService, RegistrationService, ServiceError
+from dbhealth import DB_ERRORS
+from fallback import database_down, offline_scan, refresh_index
 
 main_bp = Blueprint('main', __name__)
 
@@ -12,69 +16,89 @@ def index():
 @main_bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
-        name = request.form.get('name')
+        # Same validation and membership ID rules as the /register blueprint
         try:
-            age = int(request.form.get('age'))
-        except (ValueError, TypeError):
-            flash('Invalid age', 'error')
+            new_user = RegistrationService.register(
+                request.form.get('name'),
+                request.form.get('age'),
+                request.form.get('mobile')
+            )
+        except ServiceError as e:
+            flash(e.message, e.category)
             return redirect(url_for('main.register'))
-            
-        mobile = request.form.get('mobile')
-        
-        # Validation
-        if User.query.filter_by(mobile_number=mobile).first():
-            flash('Mobile number already registered!', 'error')
+        except DB_ERRORS:
+            db.session.rollback()
+            flash('Registration is temporarily unavailable. Please try again in a few minutes.', 'error')
             return redirect(url_for('main.register'))
-            
-        # Generate Membership ID
-        # Format: MEM-{mobile_last_4}-{random_4} for uniqueness and simplicity
-        # Or just UUID. Let's use a simpler readable format as requested "MEM-XXXXX"
-        import random
-        rand_suffix = ''.join(random.choices('0123456789', k=5))
-        membership_id = f"MEM-{rand_suffix}"
-        
-        # Ensure it's unique (simple collision check)
-        while User.query.filter_by(membership_id=membership_id).first():
-            rand_suffix = ''.join(random.choices('0123456789', k=5))
-            membership_id = f"MEM-{rand_suffix}"
-            
-        new_user = User(name=name, age=age, mobile_number=mobile, membership_id=membership_id)
-        db.session.add(new_user)
-        db.session.commit()
         
-        flash(f'Registration Successful! Your Membership ID is {membership_id}', 'success')
+        flash(f'Registration Successful! Your Membership ID is {new_user.membership_id}', 'success')
         return redirect(url_for('main.register')) # Stay on page or go somewhere? Requirement: "Registration QR code must NEVER expire" implies we probably just show success on the same device and let next person scan. 
         # But usually user scans on THEIR phone. So we show success page.
         
     return render_template('register.html')
 
 @main_bp.route('/checkin', methods=['GET', 'POST'])
+@rate_limit('checkin')
 def checkin():
     if request.method == 'POST':
         identifier = request.form.get('identifier') # Mobile or Membership ID
+        refresh_index()  # offline member index, refreshed in the background
         
-        user = User.query.filter(
-            (User.mobile_number == identifier) | (User.membership_id == identifier)
-        ).first()
-        
-        if not user:
-            flash('User Not Found / Not Registered', 'error')
-            return redirect(url_for('main.checkin'))
-            
-        # Check if already entered today
-        today = date.today()
-        existing_entry = EntryLog.query.filter_by(user_id=user.id, entry_date=today).first()
-        
-        if existing_entry:
-            flash(f'User {user.name} already checked in today at {existing_entry.entry_time.strftime("%H:%M:%S")}', 'warning')
+        try:
+            user = CheckinService.require_member(CheckinService.find_by_identifier(identifier),
+                                                 identifier=identifier)
+            CheckinService.check_in(user)
+        except ServiceError as e:
+            flash(e.message, e.category)
             return redirect(url_for('main.checkin'))
-            
-        # Create Entry
-        new_entry = EntryLog(user_id=user.id, entry_date=today)
-        db.session.add(new_entry)
-        db.session.commit()
+        except DB_ERRORS:
+            # Journaled for replay once the database is back (503 while the breaker is closed)
+            if not database_down():
+                raise
+            return _offline(identifier, 'checkin', 'main.checkin', 'Welcome, {name}! Check-in Successful.')
         
         flash(f'Welcome, {user.name}! Check-in Successful.', 'success')
         return redirect(url_for('main.checkin'))
         
     return render_template('checkin.html')
+
+@main_bp.route('/checkout', methods=['GET', 'POST'])
+@rate_limit('checkin')
+def checkout():
+    if request.method == 'POST':
+        identifier = request.form.get('identifier') # Mobile or Membership ID
+        refresh_index()  # offline member index, refreshed in the background
+        
+        try:
+            user = CheckinService.require_member(CheckinService.find_by_identifier(identifier),
+                                                 identifier=identifier, event='exit')
+            CheckinService.check_out(user)
+        except ServiceError as e:
+            flash(e.message, e.category)
+            return redirect(url_for('main.checkout'))
+        except DB_ERRORS:
+            if not database_down():
+                raise
+            return _offline(identifier, 'exit', 'main.checkout', 'Goodbye, {name}! Check-out Successful.')
+        
+        flash(f'Goodbye, {user.name}! Check-out Successful.', 'success')
+        return redirect(url_for('main.checkout'))
+        
+    return render_template('checkout.html')
+
+def _offline(identifier, kind, endpoint, success):
+    # Single identifier field: matched as a mobile number or a membership ID
+    db.session.rollback()
+    identifier = (identifier or '').strip()
+    try:
+        _, name, _ = offline_scan(kind, mobile_number=identifier, membership_id=identifier)
+    except ServiceError as e:
+        flash(e.message, e.category)
+    else:
+        flash(success.format(name=name), 'success')
+    return redirect(url_for(endpoint))
+
+@main_bp.route('/occupancy')
+def occupancy_status():
+    # In-memory counter, reconciled from the database periodically
+    return jsonify({'location': current_location(), 'occupancy': occupancy.current()})
@@ -1,18 +1,45 @@
 """
 SQLAlchemy database models for the Gym QR Application
 """
+import json
+import secrets
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from datetime import datetime, timedelta
 from sqlalchemy import Index
+from werkzeug.security import generate_password_hash, check_password_hash
+from tenancy import LocationMixin, ShardedSession
+import businessday
+import phones
 
-db = SQLAlchemy()
+# ShardedSession routes each gym location to its database bind
+db = SQLAlchemy(session_options={'class_': ShardedSession})
 
 
-class User(db.Model):
+def _registration_day(context):
+    """Column default: business day of the row's registration_date"""
+    return businessday.business_day(context.get_current_parameters().get('registration_date'))
+
+
+def _mobile_e164(context):
+    """Column default: canonical form of the row's mobile_number"""
+    return phones.normalize_phone(context.get_current_parameters().get('mobile_number'))
+
+
+def new_kiosk_ref():
+    """Column default: random opaque member reference for kiosks"""
+    return secrets.token_hex(8)
+
+
+class User(LocationMixin, db.Model):
     """
     User model for storing registered gym members
     - UNIQUE constraint on mobile_number to prevent duplicate registrations
+    - mobile_e164: canonical mobile number (see phones.py), UNIQUE; all
+      mobile lookups and the duplicate check use it
     - auto-incremented membership_id is unique
+    - location: home gym location (tenant) of the member
+    - registration_day: business day of registration_date (see businessday.py)
+    - kiosk_ref: random reference kiosks use instead of the id (see kiosk.py)
     """
     __tablename__ = 'users'
 
@@ -22,6 +49,8 @@ class User(db.Model):
     name = db.Column(db.String(100), nullable=False)
     age = db.Column(db.Integer, nullable=False)
     mobile_number = db.Column(db.String(15), unique=True, nullable=False, index=True)
+    # NULL only for legacy duplicates / invalid numbers (python phones.py report)
+    mobile_e164 = db.Column(db.String(16), default=_mobile_e164)
     
     # Auto-generated unique membership ID (format: MEM-XXXXX)
     membership_id = db.Column(db.String(20), unique=True, nullable=False, index=True)
@@ -30,8 +59,26 @@ class User(db.Model):
     registration_date = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Gym-local business day of registration_date (indexed day filters)
+    registration_day = db.Column(db.Date, default=_registration_day)
+    
+    # Opaque member reference in kiosk snapshots and scan uploads
+    kiosk_ref = db.Column(db.String(16), default=new_kiosk_ref)
+    
     # Relationship to EntryLog
     entry_logs = db.relationship('EntryLog', backref='user', lazy=True, cascade='all, delete-orphan')
+    
+    # Per-location indexes matching the listings: kiosk snapshot by id
+    # (the primary key is implied), newest members first, not-entered
+    # report by name, day filters
+    __table_args__ = (
+        Index('idx_user_location', 'location'),
+        Index('idx_user_location_registered', 'location', 'registration_date'),
+        Index('idx_user_location_name', 'location', 'name'),
+        Index('idx_user_registration_day', 'location', 'registration_day'),
+        Index('idx_user_mobile_e164', 'mobile_e164', unique=True),
+        Index('idx_user_kiosk_ref', 'kiosk_ref', unique=True),
+    )
 
     def __repr__(self):
         return f'<User {self.membership_id} - {self.name}>'
@@ -44,16 +91,18 @@ class User(db.Model):
             'age': self.age,
             'mobile_number': self.mobile_number,
             'membership_id': self.membership_id,
-            'registration_date': self.registration_date.strftime('%Y-%m-%d %H:%M:%S')
+            'location': self.location,
+            'registration_date': self.registration_date.isoformat(sep=' ', timespec='seconds')
         }
 
 
-class EntryLog(db.Model):
+class EntryLog(LocationMixin, db.Model):
     """
     EntryLog model for tracking user check-ins
     - Records when a user enters the gym
-    - One entry per user per day is allowed
+    - One entry per user per day is allowed (UNIQUE on user_id, entry_date)
     - Indexed by user_id and entry_date for quick lookups
+    - location: gym location (tenant) where the check-in happened
     """
     __tablename__ = 'entry_logs'
 
@@ -72,23 +121,573 @@ class EntryLog(db.Model):
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
-    # Composite index for quick lookup of user entry on specific date
+    # Composite indexes for quick lookup of user entry on specific date
+    # and for per-location daily listings (already sorted by entry_time)
     __table_args__ = (
-        Index('idx_user_date', 'user_id', 'entry_date'),
+        Index('idx_user_date', 'user_id', 'entry_date', unique=True),
+        Index('idx_location_date_time', 'location', 'entry_date', 'entry_time'),
     )
 
     def __repr__(self):
         return f'<EntryLog User {self.user_id} - {self.entry_date}>'
 
+    def to_dict(self, include_user=True):
+        """
+        Convert entry log object to dictionary
+        - include_user=False skips the lazy User load (member history views)
+        """
+        data = {
+            'id': self.id,
+            'user_id': self.user_id,
+            'location': self.location,
+            'entry_date': self.entry_date.isoformat(),
+            'entry_time': self.entry_time.isoformat(sep=' ', timespec='seconds'),
+            'exit_time': self.exit_time.isoformat(sep=' ', timespec='seconds') if self.exit_time else None
+        }
+        if include_user:
+            data.update({
+                'user_name': self.user.name,
+                'membership_id': self.user.membership_id,
+                'mobile_number': self.user.mobile_number
+            })
+        return data
+
+
+class MemberStats(db.Model):
+    """
+    Per-member attendance summary
+    - One row per user, maintained incrementally on each check-in
+    - Lets the member detail view read counters in O(1) instead of
+      scanning the full entry history
+    """
+    __tablename__ = 'member_stats'
+    # Keyed by the user ids of the member's shard
+    __sharded__ = True
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    
+    # Counters
+    total_visits = db.Column(db.Integer, default=0, nullable=False)
+    first_visit_date = db.Column(db.Date, nullable=True)
+    last_visit_date = db.Column(db.Date, nullable=True)
+    current_streak = db.Column(db.Integer, default=0, nullable=False)
+    longest_streak = db.Column(db.Integer, default=0, nullable=False)
+    
+    # Visits in the month of last_visit_date (reset when a new month starts)
+    visits_this_month = db.Column(db.Integer, default=0, nullable=False)
+    
+    # Membership entitlement, copied from the current subscription so the
+    # check-in path never joins plans/subscriptions
+    subscription_id = db.Column(db.Integer, nullable=True)
+    valid_from = db.Column(db.Date, nullable=True)
+    valid_until = db.Column(db.Date, nullable=True)
+    visits_remaining = db.Column(db.Integer, nullable=True)  # NULL = unlimited
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Attendance columns derived from entry_logs (rebuild / reset_counters)
+    COUNTERS = ('total_visits', 'first_visit_date', 'last_visit_date',
+                'current_streak', 'longest_streak', 'visits_this_month')
+
+    def __repr__(self):
+        return f'<MemberStats User {self.user_id} - {self.total_visits} visits>'
+
+    def reset_counters(self):
+        """Zero the attendance counters (entitlement columns are kept)"""
+        self.total_visits = 0
+        self.first_visit_date = None
+        self.last_visit_date = None
+        self.current_streak = 0
+        self.longest_streak = 0
+        self.visits_this_month = 0
+
+    def record_visit(self, visit_date):
+        """
+        Apply one check-in to the counters
+        - A day before the last visit (kiosk / journal replay arriving
+          after a later check-in) still counts; the streaks are then
+          recomputed from the member's entry dates
+        
+        Args:
+            visit_date (date): Day of a check-in not counted yet
+        """
+        last = self.last_visit_date
+        if last is not None and visit_date == last:
+            # Same day: counters already include it
+            return
+        if last is not None and visit_date < last:
+            self.total_visits = (self.total_visits or 0) + 1
+            if (last.year, last.month) == (visit_date.year, visit_date.month):
+                self.visits_this_month = (self.visits_this_month or 0) + 1
+            self.first_visit_date = min(self.first_visit_date or visit_date, visit_date)
+            self._recompute_streaks(visit_date)
+            return
+
+        if last is not None and visit_date - last == timedelta(days=1):
+            self.current_streak = (self.current_streak or 0) + 1
+        else:
+            self.current_streak = 1
+
+        if last is not None and (last.year, last.month) == (visit_date.year, visit_date.month):
+            self.visits_this_month = (self.visits_this_month or 0) + 1
+        else:
+            self.visits_this_month = 1
+
+        self.total_visits = (self.total_visits or 0) + 1
+        self.longest_streak = max(self.longest_streak or 0, self.current_streak)
+        self.first_visit_date = self.first_visit_date or visit_date
+        self.last_visit_date = visit_date
+
+    def _recompute_streaks(self, visit_date):
+        """Current / longest streak from the distinct entry dates plus `visit_date`"""
+        # No autoflush: the caller's pending entry must fail (duplicate) at commit, not here
+        with db.session.no_autoflush:
+            dates = {row.entry_date for row in db.session.query(EntryLog.entry_date).filter(
+                EntryLog.user_id == self.user_id
+            ).distinct()}
+        dates.add(visit_date)
+
+        run = longest = 0
+        previous = None
+        for day in sorted(dates):
+            run = run + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+            longest = max(longest, run)
+            previous = day
+        self.current_streak = run
+        self.longest_streak = max(self.longest_streak or 0, longest)
+
+    @classmethod
+    def for_user(cls, user_id):
+        """Get the summary row for a user, creating an empty one if missing"""
+        stats = db.session.get(cls, user_id)
+        if stats is None:
+            stats = cls(user_id=user_id, total_visits=0, current_streak=0,
+                        longest_streak=0, visits_this_month=0)
+            db.session.add(stats)
+        return stats
+
+    @classmethod
+    def rebuild(cls, user_id):
+        """
+        Recompute the summary from entry_logs (backfill for existing members)
+        - Reads only the distinct entry dates, in order
+        """
+        stats = cls.for_user(user_id)
+        stats.reset_counters()
+
+        visit_dates = db.session.query(EntryLog.entry_date).filter(
+            EntryLog.user_id == user_id
+        ).distinct().order_by(EntryLog.entry_date)
+
+        for (visit_date,) in visit_dates:
+            stats.record_visit(visit_date)
+        return stats
+
+    def apply_subscription(self, subscription):
+        """Copy a subscription's validity window and remaining visits"""
+        self.subscription_id = subscription.id
+        self.valid_from = subscription.start_date
+        self.valid_until = subscription.end_date
+        self.visits_remaining = subscription.visits_remaining
+
+    def refresh_entitlement(self, today=None):
+        """
+        Re-resolve the entitlement from the subscriptions table
+        - Picks the earliest usable subscription that has not ended
+        - Keeps the old (expired / used up) values if there is none
+        """
+        today = today or businessday.today()
+        candidates = Subscription.query.filter(
+            Subscription.user_id == self.user_id,
+            Subscription.cancelled_at.is_(None),
+            Subscription.end_date >= today
+        ).order_by(Subscription.start_date, Subscription.id)
+
+        for subscription in candidates:
+            if subscription.visits_remaining != 0:
+                self.apply_subscription(subscription)
+                return subscription
+        return None
+
+    def eligibility(self, today, require_plan=False):
+        """
+        Check-in eligibility from the denormalized entitlement columns
+        
+        Args:
+            today (date): Day of the check-in
+            require_plan (bool): Deny members who never had a subscription
+        
+        Returns:
+            str: None if eligible, otherwise 'no_plan', 'not_started',
+                 'expired' or 'no_visits'
+        """
+        if self.subscription_id is None:
+            return 'no_plan' if require_plan else None
+        if self.valid_from and today < self.valid_from:
+            return 'not_started'
+        if self.valid_until and today > self.valid_until:
+            return 'expired'
+        if self.visits_remaining is not None and self.visits_remaining <= 0:
+            return 'no_visits'
+        return None
+
+    def use_visit(self):
+        """Consume one visit from a plan with a visit quota"""
+        if self.visits_remaining is None:
+            return
+        self.visits_remaining -= 1
+        Subscription.query.filter_by(id=self.subscription_id).update(
+            {Subscription.visits_used: Subscription.visits_used + 1},
+            synchronize_session=False
+        )
+
+    def to_dict(self, today=None):
+        """
+        Convert summary to dictionary
+        - Streak and monthly counters are reported relative to today
+        """
+        today = today or businessday.today()
+        last = self.last_visit_date
+
+        streak_alive = last is not None and (today - last) <= timedelta(days=1)
+        same_month = last is not None and (last.year, last.month) == (today.year, today.month)
+
+        return {
+            'total_visits': self.total_visits,
+            'first_visit': self.first_visit_date.strftime('%Y-%m-%d') if self.first_visit_date else None,
+            'last_visit': last.strftime('%Y-%m-%d') if last else None,
+            'current_streak': self.current_streak if streak_alive else 0,
+            'longest_streak': self.longest_streak,
+            'visits_this_month': self.visits_this_month if same_month else 0,
+            'valid_until': self.valid_until.strftime('%Y-%m-%d') if self.valid_until else None,
+            'visits_remaining': self.visits_remaining
+        }
+
+
+class Plan(db.Model):
+    """
+    Membership plan offered by the gym
+    - duration_days: validity window of a subscription
+    - visit_quota: visits allowed in that window (NULL = unlimited)
+    """
+    __tablename__ = 'plans'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    duration_days = db.Column(db.Integer, nullable=False)
+    visit_quota = db.Column(db.Integer, nullable=True)
+    price = db.Column(db.Numeric(10, 2), nullable=True)
+    is_active = db.Column(db.Boolean, default=True, nullable=False)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<Plan {self.name} - {self.duration_days} days>'
+
     def to_dict(self):
-        """Convert entry log object to dictionary"""
+        """Convert plan object to dictionary"""
         return {
             'id': self.id,
+            'name': self.name,
+            'duration_days': self.duration_days,
+            'visit_quota': self.visit_quota,
+            'price': float(self.price) if self.price is not None else None,
+            'is_active': self.is_active
+        }
+
+
+class Subscription(db.Model):
+    """
+    A member's purchase of a plan
+    - Validity window and visit quota are copied from the plan at
+      purchase time (later plan edits do not change it)
+    - The current subscription is mirrored into member_stats
+    - Stored with the member (shard); plan_id has no foreign key because
+      plans are global and live in the default database
+    """
+    __tablename__ = 'subscriptions'
+    __sharded__ = True
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    plan_id = db.Column(db.Integer, nullable=False)
+    
+    # Entitlement
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    visit_quota = db.Column(db.Integer, nullable=True)
+    visits_used = db.Column(db.Integer, default=0, nullable=False)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    cancelled_at = db.Column(db.DateTime, nullable=True)
+    
+    # Separate query: plans may be in another database than the subscription
+    plan = db.relationship('Plan', primaryjoin='foreign(Subscription.plan_id) == Plan.id',
+                           lazy='select', viewonly=True)
+    
+    # A member's subscriptions, newest first
+    __table_args__ = (
+        Index('idx_subscription_user_start', 'user_id', 'start_date'),
+    )
+
+    def __repr__(self):
+        return f'<Subscription User {self.user_id} - {self.start_date} to {self.end_date}>'
+
+    @property
+    def visits_remaining(self):
+        """Visits left, or None for an unlimited plan"""
+        if self.visit_quota is None:
+            return None
+        return max(self.visit_quota - (self.visits_used or 0), 0)
+
+    def to_dict(self):
+        """Convert subscription object to dictionary"""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'plan': self.plan.name if self.plan else None,
+            'start_date': self.start_date.strftime('%Y-%m-%d'),
+            'end_date': self.end_date.strftime('%Y-%m-%d'),
+            'visit_quota': self.visit_quota,
+            'visits_used': self.visits_used,
+            'cancelled': self.cancelled_at is not None
+        }
+
+
+
+class Admin(db.Model):
+    """
+    Admin account for the admin panel
+    - Passwords stored as salted hashes (werkzeug)
+    - role: 'owner' (full access) or 'staff'
+    - session_version is bumped to invalidate every open session of the
+      account (password change, deactivation)
+    """
+    __tablename__ = 'admins'
+
+    ROLES = ('owner', 'staff')
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    username = db.Column(db.String(50), unique=True, nullable=False, index=True)
+    password_hash = db.Column(db.String(255), nullable=False)
+    role = db.Column(db.String(20), default='staff', nullable=False)
+    is_active = db.Column(db.Boolean, default=True, nullable=False)
+    session_version = db.Column(db.Integer, default=1, nullable=False)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_login_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<Admin {self.username} ({self.role})>'
+
+    def set_password(self, password):
+        """Hash and store a new password, ending existing sessions"""
+        self.password_hash = generate_password_hash(password)
+        self.session_version = (self.session_version or 0) + 1
+
+    def check_password(self, password):
+        """Verify a password against the stored hash"""
+        return check_password_hash(self.password_hash, password)
+
+    def to_dict(self):
+        """Convert admin object to dictionary"""
+        return {
+            'id': self.id,
+            'username': self.username,
+            'role': self.role,
+            'is_active': self.is_active,
+            'last_login_at': self.last_login_at.strftime('%Y-%m-%d %H:%M:%S') if self.last_login_at else None
+        }
+
+
+class Job(LocationMixin, db.Model):
+    """
+    Background job run by the in-process job runner (jobs.py)
+    - status: queued -> running -> succeeded / failed / cancelled
+    - progress: 0-100, updated by the job while it runs
+    - result: small JSON result; result_path: file produced by the job
+    - Global table (default database) tagged with the submitting
+      location, so one runner sees every location's jobs
+    """
+    __tablename__ = 'jobs'
+    __sharded__ = False
+
+    STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+    FINISHED = ('succeeded', 'failed', 'cancelled')
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    name = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=True)  # JSON
+    status = db.Column(db.String(20), default='queued', nullable=False)
+    
+    # Progress reporting
+    progress = db.Column(db.Integer, default=0, nullable=False)
+    message = db.Column(db.String(255), nullable=True)
+    cancel_requested = db.Column(db.Boolean, default=False, nullable=False)
+    
+    # Outcome
+    result = db.Column(db.Text, nullable=True)  # JSON
+    result_path = db.Column(db.String(255), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    
+    # Metadata
+    created_by = db.Column(db.String(50), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        Index('idx_job_location_created', 'location', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.name} - {self.status}>'
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED
+
+    def to_dict(self):
+        """Convert job object to dictionary"""
+        def fmt(value):
+            return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+        return {
+            'id': self.id,
+            'name': self.name,
+            'params': json.loads(self.params) if self.params else {},
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'cancel_requested': self.cancel_requested,
+            'result': json.loads(self.result) if self.result else None,
+            'has_file': bool(self.result_path),
+            'error': self.error,
+            'created_by': self.created_by,
+            'created_at': fmt(self.created_at),
+            'started_at': fmt(self.started_at),
+            'finished_at': fmt(self.finished_at)
+        }
+
+
+class AuditEvent(LocationMixin, db.Model):
+    """
+    Append-only audit log (written in batches by audit.py)
+    - event / reason: small integer codes (EVENTS, REASONS); never
+      renumber them, only append
+    - day: business day of `at`; every query and the retention purge is
+      bounded by day (idx_audit_location_day), so the table is read and
+      expired one day at a time
+    - user_id / admin_id: plain ids without foreign keys, so events
+      outlive deleted members and admins
+    - subject: short free text (identifier typed for an unknown member,
+      username of a failed login, export name)
+    """
+    __tablename__ = 'audit_events'
+
+    EVENTS = {
+        'checkin': 1,
+        'checkin_rejected': 2,
+        'exit': 3,
+        'exit_rejected': 4,
+        'registration': 5,
+        'registration_rejected': 6,
+        'admin_login': 10,
+        'admin_login_failed': 11,
+        'admin_logout': 12,
+        'export': 20,
+        'job_submitted': 21,
+        'plan_assigned': 22,
+    }
+    # ServiceError codes (and kiosk scan statuses); 0 = other
+    REASONS = {
+        'not_found': 1,
+        'already_checked_in': 2,
+        'not_eligible': 3,
+        'no_open_visit': 4,
+        'invalid_name': 5,
+        'invalid_age': 6,
+        'invalid_mobile': 7,
+        'duplicate_mobile': 8,
+        'invalid': 9,
+    }
+    EVENT_NAMES = {code: name for name, code in EVENTS.items()}
+    REASON_NAMES = {code: name for name, code in REASONS.items()}
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    day = db.Column(db.Date, nullable=False)
+    at = db.Column(db.DateTime, nullable=False)
+    event = db.Column(db.SmallInteger, nullable=False)
+    reason = db.Column(db.SmallInteger, nullable=True)
+    user_id = db.Column(db.Integer, nullable=True)
+    admin_id = db.Column(db.Integer, nullable=True)
+    subject = db.Column(db.String(64), nullable=True)
+
+    __table_args__ = (
+        Index('idx_audit_location_day', 'location', 'day', 'at'),
+    )
+
+    def __repr__(self):
+        return f'<AuditEvent {self.id} {self.event_name} {self.at}>'
+
+    @property
+    def event_name(self):
+        return self.EVENT_NAMES.get(self.event, f'event_{self.event}')
+
+    @property
+    def reason_name(self):
+        if self.reason is None:
+            return None
+        return self.REASON_NAMES.get(self.reason, 'other')
+
+    def to_dict(self):
+        """Convert audit event to dictionary"""
+        return {
+            'id': self.id,
+            'location': self.location,
+            'day': self.day.strftime('%Y-%m-%d'),
+            'at': self.at.strftime('%Y-%m-%d %H:%M:%S'),
+            'event': self.event_name,
+            'reason': self.reason_name,
             'user_id': self.user_id,
-            'user_name': self.user.name,
-            'membership_id': self.user.membership_id,
-            'mobile_number': self.user.mobile_number,
-            'entry_date': self.entry_date.strftime('%Y-%m-%d'),
-            'entry_time': self.entry_time.strftime('%Y-%m-%d %H:%M:%S'),
-            'exit_time': self.exit_time.strftime('%Y-%m-%d %H:%M:%S') if self.exit_time else None
+            'admin_id': self.admin_id,
+            'subject': self.subject,
         }
+
+
+class Notification(LocationMixin, db.Model):
+    """
+    Outgoing member message (missed-visit reminders, see notifications.py)
+    - (user_id, kind, lapse_day) is UNIQUE: a member gets one reminder of
+      a kind per absence, however often the job runs
+    - lapse_day: last visit (or registration day) the reminder is about
+    - status: pending -> sent / failed; attempts counts delivery tries
+    - No foreign key, so the history outlives deleted members
+    """
+    __tablename__ = 'notifications'
+
+    STATUSES = ('pending', 'sent', 'failed')
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(30), nullable=False)
+    lapse_day = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(10), default='pending', nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    transport = db.Column(db.String(20), nullable=True)
+    recipient = db.Column(db.String(100), nullable=True)
+    error = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_notification_lapse', 'user_id', 'kind', 'lapse_day', unique=True),
+        Index('idx_notification_location_created', 'location', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<Notification {self.id} {self.kind} user {self.user_id} - {self.status}>'
@@ -0,0 +1,186 @@
+"""
+Audit log
+- record() queues an event (check-in / exit with the reject reason,
+  registrations, admin logins and logouts, exports) and returns at once;
+  the request never waits for the audit INSERT
+- AuditWriter drains the queue on a background thread every
+  AUDIT_FLUSH_SECONDS (sooner once AUDIT_BATCH_SIZE events are waiting)
+  with one executemany INSERT per location bind
+- The queue is bounded (AUDIT_QUEUE_SIZE): when the database cannot keep
+  up, new events are dropped and counted instead of blocking requests
+- Rows are compact (integer codes, see app.models.AuditEvent) and keyed
+  by business day; events_query() and the purge_audit_log job only touch
+  the days they need
+"""
+import atexit
+import os
+import queue
+import threading
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+
+from flask import current_app, has_app_context, has_request_context, session
+from sqlalchemy.exc import SQLAlchemyError
+
+import businessday
+from app.models import db, AuditEvent
+from tenancy import current_location
+
+
+class AuditWriter:
+    """Buffered, batched writer of audit events for one Flask app"""
+
+    def __init__(self, app, batch_size=500, flush_seconds=2.0, queue_size=10000):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue_size = queue_size
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pid = None
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def record(self, row):
+        """Queue one audit row (dict of AuditEvent columns)"""
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def _ensure_thread(self):
+        # Started on first use in each process: threads do not survive
+        # the fork of a preloaded gunicorn master
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            threading.Thread(target=self._run, name='audit-writer', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        Write every queued event now (background thread, shutdown, and
+        the audit page so it shows this worker's latest events)
+
+        Returns:
+            int: Events written
+        """
+        written = 0
+        with self._write_lock:
+            while True:
+                batch = []
+                try:
+                    while len(batch) < self.batch_size:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    pass
+                if not batch:
+                    return written
+                written += self._write(batch)
+
+    def _write(self, batch):
+        written = 0
+        with self.app.app_context():
+            binds = self.app.config.get('LOCATION_BINDS', {})
+            batch.sort(key=itemgetter('location'))
+            for location, rows in groupby(batch, key=itemgetter('location')):
+                rows = list(rows)
+                engine = db.engines[binds[location]] if location in binds else db.engine
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(AuditEvent.__table__.insert(), rows)
+                except SQLAlchemyError:
+                    self.dropped += len(rows)
+                    self.app.logger.exception('Dropped %d audit events for %s', len(rows), location)
+                    continue
+                written += len(rows)
+        self.written += written
+        return written
+
+
+def record(event, user_id=None, reason=None, subject=None, admin_id=None, at=None):
+    """
+    Queue an audit event (no-op when AUDIT_ENABLED is off)
+
+    Args:
+        event (str): Key of AuditEvent.EVENTS
+        user_id (int): Member the event is about
+        reason (str): ServiceError code of a rejection
+        subject (str): Identifier typed, username, export name (64 chars)
+        admin_id (int): Acting admin (defaults to the logged-in admin)
+        at (datetime): UTC time of the event (queued kiosk scans); defaults to now
+    """
+    writer = current_app.extensions.get('audit') if has_app_context() else None
+    if writer is None:
+        return
+    if admin_id is None and has_request_context():
+        admin_id = session.get('admin_id')
+    at = at or datetime.utcnow()
+    writer.record({
+        'location': current_location(),
+        'day': businessday.business_day(at),
+        'at': at,
+        'event': AuditEvent.EVENTS[event],
+        'reason': None if reason is None else AuditEvent.REASONS.get(reason, 0),
+        'user_id': user_id,
+        'admin_id': admin_id,
+        'subject': subject[:64] if subject else None,
+    })
+
+
+def events_query(start, end, events=None):
+    """
+    Audit events of the current location in [start, end), newest first
+
+    Args:
+        start, end (datetime): Naive UTC bounds
+        events (list): Event names to keep (default: all)
+    """
+    query = AuditEvent.query.filter(
+        AuditEvent.day >= businessday.business_day(start),
+        AuditEvent.day <= businessday.business_day(end),
+        AuditEvent.at >= start,
+        AuditEvent.at < end
+    )
+    if events:
+        query = query.filter(AuditEvent.event.in_([AuditEvent.EVENTS[name] for name in events]))
+    return query.order_by(AuditEvent.day.desc(), AuditEvent.at.desc())
+
+
+def init_audit(app):
+    """Create the audit writer for an app (no-op unless AUDIT_ENABLED)"""
+    if not app.config.get('AUDIT_ENABLED', True):
+        return
+    writer = app.extensions['audit'] = AuditWriter(
+        app,
+        batch_size=app.config.get('AUDIT_BATCH_SIZE', 500),
+        flush_seconds=app.config.get('AUDIT_FLUSH_SECONDS', 2.0),
+        queue_size=app.config.get('AUDIT_QUEUE_SIZE', 10000)
+    )
+    # Events still queued when the process exits
+    atexit.register(writer.flush)
+
+
+def get_writer():
+    """Audit writer of the current app, or None when auditing is off"""
+    return current_app.extensions.get('audit')
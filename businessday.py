@@ -0,0 +1,79 @@
+"""
+Gym business day
+- Timestamps (entry_time, registration_date, ...) are stored in UTC
+- Day columns (entry_logs.entry_date, users.registration_day) hold the
+  gym-local business day: GYM_TIMEZONE wall clock, starting at
+  DAY_ROLLOVER_HOUR, so a late-night session before the rollover still
+  counts for the evening it started
+- day_range() turns business days into UTC timestamp bounds, so day
+  filters are plain range predicates that can use indexes (never
+  DATE(column) or other functions on the column)
+"""
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from flask import current_app, has_app_context
+
+from config import APP_CONFIG
+
+
+def _setting(name):
+    if has_app_context():
+        return current_app.config.get(name, getattr(APP_CONFIG, name))
+    return getattr(APP_CONFIG, name)
+
+
+def gym_timezone():
+    """Configured gym time zone"""
+    return ZoneInfo(_setting('GYM_TIMEZONE'))
+
+
+def _rollover():
+    return timedelta(hours=_setting('DAY_ROLLOVER_HOUR'))
+
+
+def business_day(at=None):
+    """
+    Business day of a moment
+
+    Args:
+        at (datetime): Naive UTC datetime (defaults to now)
+
+    Returns:
+        date: Gym-local business day
+    """
+    at = at or datetime.utcnow()
+    local = at.replace(tzinfo=timezone.utc).astimezone(gym_timezone())
+    return (local.replace(tzinfo=None) - _rollover()).date()
+
+
+def today():
+    """Current business day"""
+    return business_day()
+
+
+def local_time(at):
+    """Naive UTC datetime -> naive gym-local wall clock time"""
+    return at.replace(tzinfo=timezone.utc).astimezone(gym_timezone()).replace(tzinfo=None)
+
+
+def utc_time(local):
+    """Naive gym-local wall clock time -> naive UTC datetime"""
+    return local.replace(tzinfo=gym_timezone()).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def day_start(day):
+    """First moment of a business day as a naive UTC datetime"""
+    local = datetime.combine(day, time(), tzinfo=gym_timezone()) + _rollover()
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def day_range(first, last=None):
+    """
+    UTC bounds of business days first..last (inclusive)
+
+    Returns:
+        tuple: (start, end) naive UTC datetimes; filter with
+               column >= start AND column < end
+    """
+    return day_start(first), day_start((last or first) + timedelta(days=1))
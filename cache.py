@@ -0,0 +1,340 @@
+"""
+Application cache
+- One cache object per app (app.extensions['cache']), configured from
+  CACHE_TYPE: 'null', 'memory' (LRU with TTL), 'filesystem' or 'redis'
+- Namespaced, versioned keys: bumping a namespace version invalidates
+  every key in it without scanning the backend
+- Hit/miss counters per namespace
+- get_or_set() is single-flight: concurrent misses for the same key in
+  one process compute the value once while the others wait
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+
+# ============================================================
+# BACKENDS
+# ============================================================
+
+class NullBackend:
+    """Caches nothing (every lookup is a miss)"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def version(self, namespace):
+        return 0
+
+    def bump(self, namespace):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryBackend:
+    """
+    Per-process LRU cache with TTL
+    - Least recently used entries are evicted past max_entries
+    - Namespace versions are kept apart so eviction never resets them
+    """
+
+    def __init__(self, max_entries=1024, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._versions = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = self.clock() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def version(self, namespace):
+        return self._versions.get(namespace, 0)
+
+    def bump(self, namespace):
+        # Old-version entries are never read again and age out of the LRU
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileSystemBackend:
+    """
+    Cache entries as pickle files in a directory
+    - Shared by every worker on one host
+    - Writes go through a temp file and os.replace (atomic)
+    """
+
+    def __init__(self, directory, clock=time.time):
+        self.directory = directory
+        self.clock = clock
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as fh:
+                expires_at, value = pickle.load(fh)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires_at is not None and expires_at <= self.clock():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = self.clock() + ttl if ttl else None
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as fh:
+            pickle.dump((expires_at, value), fh, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def version(self, namespace):
+        return self.get(f'__version__:{namespace}') or 0
+
+    def bump(self, namespace):
+        # Atomic within one process only; a lost bump across workers
+        # leaves entries to expire by TTL
+        with self._lock:
+            self.set(f'__version__:{namespace}', self.version(namespace) + 1)
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+class RedisBackend:
+    """
+    Shared cache in Redis (or any Redis-protocol server)
+    - Pass client= to use an existing (or stand-in) client
+    """
+
+    def __init__(self, url=None, prefix='cache', client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError('CACHE_TYPE=redis needs the redis package (pip install redis)')
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(f'{self.prefix}:{key}')
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        raw = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if ttl:
+            self.client.set(f'{self.prefix}:{key}', raw, ex=int(ttl))
+        else:
+            self.client.set(f'{self.prefix}:{key}', raw)
+
+    def delete(self, key):
+        self.client.delete(f'{self.prefix}:{key}')
+
+    def version(self, namespace):
+        return int(self.client.get(f'{self.prefix}:__version__:{namespace}') or 0)
+
+    def bump(self, namespace):
+        # Raw integer so INCR stays atomic across servers
+        self.client.incr(f'{self.prefix}:__version__:{namespace}')
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.prefix}:*'):
+            self.client.delete(key)
+
+
+# ============================================================
+# CACHE
+# ============================================================
+
+class Cache:
+    """
+    Cache front end shared by the whole app
+
+    Keys are built as <namespace>:v<version>:<key>. Values are stored
+    wrapped in a 1-tuple so None can be cached.
+    """
+
+    def __init__(self, backend=None, default_ttl=300):
+        self.backend = backend or MemoryBackend()
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._metrics = {}
+
+    # ----- keys -----
+
+    def _key(self, namespace, key):
+        return f'{namespace}:v{self.backend.version(namespace)}:{key}'
+
+    def invalidate(self, namespace):
+        """Drop every key in a namespace (bumps its version)"""
+        self.backend.bump(namespace)
+
+    # ----- metrics -----
+
+    def _count(self, namespace, hit):
+        with self._lock:
+            counters = self._metrics.setdefault(namespace, [0, 0])
+            counters[0 if hit else 1] += 1
+
+    def stats(self):
+        """
+        Hit/miss counters per namespace (this process)
+
+        Returns:
+            dict: {namespace: {'hits', 'misses', 'hit_rate'}}
+        """
+        with self._lock:
+            return {
+                namespace: {
+                    'hits': hits,
+                    'misses': misses,
+                    'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0
+                }
+                for namespace, (hits, misses) in self._metrics.items()
+            }
+
+    # ----- access -----
+
+    def get(self, namespace, key):
+        """
+        Get a cached value
+
+        Returns:
+            tuple: (found, value)
+        """
+        wrapped = self.backend.get(self._key(namespace, key))
+        self._count(namespace, wrapped is not None)
+        if wrapped is None:
+            return False, None
+        return True, wrapped[0]
+
+    def set(self, namespace, key, value, ttl=None):
+        """Store a value (ttl in seconds, defaults to default_ttl)"""
+        self.backend.set(self._key(namespace, key), (value,),
+                         self.default_ttl if ttl is None else ttl)
+
+    def delete(self, namespace, key):
+        self.backend.delete(self._key(namespace, key))
+
+    def get_or_set(self, namespace, key, compute, ttl=None):
+        """
+        Return the cached value or compute and store it
+        - Only one thread per process computes a missing key; the
+          others wait for it and reuse the result
+
+        Args:
+            namespace (str): Key namespace ('qr', 'dashboard', ...)
+            key (str): Key within the namespace
+            compute (callable): Produces the value on a miss
+            ttl (int): Seconds to keep the value
+
+        Returns:
+            The cached or computed value
+        """
+        found, value = self.get(namespace, key)
+        if found:
+            return value
+
+        flight_key = (namespace, key)
+        with self._lock:
+            lock = self._inflight.get(flight_key)
+            leader = lock is None
+            if leader:
+                # Held until the value is stored
+                lock = self._inflight[flight_key] = threading.Lock()
+                lock.acquire()
+
+        if not leader:
+            # Another thread is computing: wait, then read its result
+            with lock:
+                pass
+            found, value = self.get(namespace, key)
+            return value if found else compute()
+
+        try:
+            value = compute()
+            self.set(namespace, key, value, ttl=ttl)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(flight_key, None)
+            lock.release()
+
+
+def create_backend(config):
+    """Build the backend selected by CACHE_TYPE"""
+    cache_type = config.get('CACHE_TYPE', 'memory')
+    if cache_type == 'null':
+        return NullBackend()
+    if cache_type == 'filesystem':
+        return FileSystemBackend(config.get('CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'gym_cache'))
+    if cache_type == 'redis':
+        return RedisBackend(config.get('CACHE_REDIS_URL'), prefix=config.get('CACHE_KEY_PREFIX', 'gym'))
+    if cache_type == 'memory':
+        return MemoryBackend(max_entries=config.get('CACHE_MAX_ENTRIES', 1024))
+    raise ValueError(f'Unknown CACHE_TYPE: {cache_type}')
+
+
+def init_cache(app):
+    """Create the cache for an app"""
+    app.extensions['cache'] = Cache(create_backend(app.config),
+                                    default_ttl=app.config.get('CACHE_DEFAULT_TTL', 300))
+
+
+def get_cache():
+    """Cache of the current app"""
+    return current_app.extensions['cache']
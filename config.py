@@ -6,6 +6,43 @@ import urllib.parse
 from datetime import timedelta
 from dotenv import load_dotenv
 
+
+def parse_locations(value, default_code):
+    """
+    Parse gym locations from an environment string
+    Format: "main:Main Branch,north:North Branch"
+    
+    Returns:
+        dict: Location code -> display name
+    """
+    locations = {}
+    for item in (value or '').split(','):
+        code, _, name = item.strip().partition(':')
+        if code:
+            locations[code.strip()] = name.strip() or code.strip()
+    return locations or {default_code: 'Main Branch'}
+
+
+def parse_kiosk_tokens(value):
+    """
+    Parse kiosk device tokens from an environment string
+    Format: "frontdesk:<token>,annex:<token>"
+
+    Returns:
+        dict: Device name -> token
+    """
+    tokens = {}
+    for item in (value or '').split(','):
+        device, _, token = item.strip().partition(':')
+        if device and token.strip():
+            tokens[device.strip()] = token.strip()
+    return tokens
+
+
+# Documented first-login password (QUICKSTART.md)
+DEFAULT_ADMIN_PASSWORD = 'admin@123'
+
+
 class Config:
     """Base configuration"""
     # Database Configuration
@@ -21,7 +58,8 @@ class Config:
     _user = urllib.parse.quote_plus(DB_USER)
     _pwd = urllib.parse.quote_plus(DB_PASSWORD)
     
-    SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{_user}:{_pwd}@{DB_HOST}/{DB_NAME}'
+    # DATABASE_URL (full SQLAlchemy URL) takes precedence over the DB_* parts
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL') or f'mysql+pymysql://{_user}:{_pwd}@{DB_HOST}/{DB_NAME}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
     # Session Configuration
@@ -32,13 +70,175 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev_key')
     
     # Admin Credentials
+    # Used only to create the first owner account on a fresh install;
+    # further admins are managed with manage_admins.py. The public default
+    # password is accepted for that only in development and testing
+    ADMIN_SESSION_CACHE_TTL = int(os.getenv('ADMIN_SESSION_CACHE_TTL', '60'))
     ADMIN_USERNAME = os.getenv('ADMIN_USERNAME', 'admin')
-    ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'admin@123')
+    ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', DEFAULT_ADMIN_PASSWORD)
+    ADMIN_ALLOW_DEFAULT_PASSWORD = False
+    
+    # Multi-location (tenant) Configuration
+    # GYM_LOCATIONS="main:Main Branch,north:North Branch"
+    DEFAULT_LOCATION = os.getenv('DEFAULT_LOCATION', 'main')
+    LOCATIONS = parse_locations(os.getenv('GYM_LOCATIONS'), DEFAULT_LOCATION)
+    
+    # Shard routing: a location with DB_URI_<CODE> set gets its own database bind,
+    # all other locations share SQLALCHEMY_DATABASE_URI
+    SQLALCHEMY_BINDS = {
+        f'location_{code}': os.environ[f'DB_URI_{code.upper()}']
+        for code in LOCATIONS
+        if os.getenv(f'DB_URI_{code.upper()}')
+    }
+    LOCATION_BINDS = {key[len('location_'):]: key for key in SQLALCHEMY_BINDS}
     
     # QR Code Configuration
+    # Public address encoded in the QR codes (the URL members' phones open)
+    PUBLIC_URL = os.getenv('PUBLIC_URL', 'http://localhost:5000').rstrip('/')
     QR_VERSION = 1  # QR code version
     QR_ERROR_CORRECTION = 'M'  # Error correction level
     
+    # Rate limiting (per rule: list of (key, "count/period"))
+    # Storage: memory:// (per process) or redis://host:6379/0 (shared)
+    RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', '1') == '1'
+    RATELIMIT_STORAGE_URL = os.getenv('RATELIMIT_STORAGE_URL', 'memory://')
+    RATELIMIT_TRUST_PROXY = os.getenv('RATELIMIT_TRUST_PROXY', '0') == '1'
+    RATELIMITS = {
+        'login': [('ip', '20/minute'), ('identifier', '5/minute')],
+        'checkin': [('ip', '60/minute'), ('identifier', '5/minute')],
+        'check_duplicate': [('ip', '30/minute')],
+        'kiosk_scans': [('ip', '120/minute')],
+        'kiosk_members': [('ip', '30/minute')],
+    }
+    
+    # Caching
+    # CACHE_TYPE: null, memory (per-process LRU), filesystem or redis
+    CACHE_TYPE = os.getenv('CACHE_TYPE', 'memory')
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_DIR = os.getenv('CACHE_DIR', '')
+    CACHE_KEY_PREFIX = os.getenv('CACHE_KEY_PREFIX', 'gym')
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '1024'))
+    CACHE_DEFAULT_TTL = int(os.getenv('CACHE_DEFAULT_TTL', '300'))
+    QR_CACHE_SECONDS = int(os.getenv('QR_CACHE_SECONDS', '86400'))
+    DASHBOARD_CACHE_SECONDS = int(os.getenv('DASHBOARD_CACHE_SECONDS', '30'))
+    MEMBER_LOOKUP_CACHE_SECONDS = int(os.getenv('MEMBER_LOOKUP_CACHE_SECONDS', '600'))
+    
+    # Schema management
+    # Apply pending migrations inside create_app (development convenience).
+    # Production runs `python migrations.py upgrade` at deploy time instead.
+    AUTO_MIGRATE = os.getenv('AUTO_MIGRATE', '1') == '1'
+    
+    # Database health (dbhealth.py, /admin/db-health): client-side timeouts;
+    # DB_BREAKER_FAILURES consecutive connection errors / timeouts open the
+    # circuit breaker, so requests fail fast instead of waiting, and one
+    # probe is let through every DB_BREAKER_RESET_SECONDS
+    DB_CONNECT_TIMEOUT_SECONDS = int(os.getenv('DB_CONNECT_TIMEOUT_SECONDS', '3'))
+    DB_QUERY_TIMEOUT_SECONDS = int(os.getenv('DB_QUERY_TIMEOUT_SECONDS', '10'))
+    DB_BREAKER_FAILURES = int(os.getenv('DB_BREAKER_FAILURES', '5'))
+    DB_BREAKER_RESET_SECONDS = int(os.getenv('DB_BREAKER_RESET_SECONDS', '15'))
+    # Admin dashboard / statistics keep their last good data this long to
+    # show (marked stale) while the database is down
+    DB_STALE_SECONDS = int(os.getenv('DB_STALE_SECONDS', '86400'))
+    # Check-ins during an outage (fallback.py): members are matched against
+    # an in-memory index and the scans journaled for replay
+    DB_FALLBACK_ENABLED = os.getenv('DB_FALLBACK_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    DB_FALLBACK_INDEX_SECONDS = int(os.getenv('DB_FALLBACK_INDEX_SECONDS', '60'))
+    DB_FALLBACK_JOURNAL_DIR = os.getenv('DB_FALLBACK_JOURNAL_DIR', '')
+    
+    # Business day (businessday.py): gym-local dates for entry_date /
+    # registration_day; visits before DAY_ROLLOVER_HOUR (local time) count
+    # for the previous day
+    GYM_TIMEZONE = os.getenv('GYM_TIMEZONE', 'Asia/Kolkata')
+    DAY_ROLLOVER_HOUR = int(os.getenv('DAY_ROLLOVER_HOUR', '0'))
+    
+    # Phone numbers (phones.py): numbers typed without a country code get
+    # PHONE_COUNTRY_CODE and must have PHONE_NATIONAL_DIGITS digits
+    PHONE_COUNTRY_CODE = os.getenv('PHONE_COUNTRY_CODE', '91')
+    PHONE_NATIONAL_DIGITS = int(os.getenv('PHONE_NATIONAL_DIGITS', '10'))
+    
+    # Analytics
+    AVERAGE_VISIT_MINUTES = int(os.getenv('AVERAGE_VISIT_MINUTES', '90'))
+    ANALYTICS_CACHE_SECONDS = int(os.getenv('ANALYTICS_CACHE_SECONDS', '300'))
+    
+    # Background jobs (jobs.py)
+    JOBS_MAX_WORKERS = int(os.getenv('JOBS_MAX_WORKERS', '2'))
+    JOBS_MAX_QUEUED = int(os.getenv('JOBS_MAX_QUEUED', '20'))
+    JOBS_STALE_SECONDS = int(os.getenv('JOBS_STALE_SECONDS', '900'))
+    JOBS_RESULT_DIR = os.getenv('JOBS_RESULT_DIR', '')
+    JOB_LIMITS = {
+        'export_not_entered': 1,
+        'rebuild_member_stats': 1,
+        'render_qr_codes': 1,
+        'purge_audit_log': 1,
+        'send_missed_visit_reminders': 1,
+    }
+    
+    # Audit log (audit.py, /admin/audit): events are queued and written in
+    # batches off the request path; AUDIT_RETENTION_DAYS is applied by the
+    # purge_audit_log job (0 = keep forever)
+    AUDIT_ENABLED = os.getenv('AUDIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '500'))
+    AUDIT_FLUSH_SECONDS = float(os.getenv('AUDIT_FLUSH_SECONDS', '2'))
+    AUDIT_QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', '10000'))
+    AUDIT_RETENTION_DAYS = int(os.getenv('AUDIT_RETENTION_DAYS', '365'))
+    
+    # Missed-visit reminders (notifications.py): members with no visit in
+    # NOTIFY_INACTIVE_DAYS get one message per absence. NOTIFY_TRANSPORT is
+    # 'file' (JSON lines in NOTIFY_OUTBOX_DIR, the default stand-in), 'smtp'
+    # (email-to-SMS gateway, or a local debug SMTP server) or 'webhook'
+    # (HTTP POST to an SMS provider)
+    NOTIFY_INACTIVE_DAYS = int(os.getenv('NOTIFY_INACTIVE_DAYS', '14'))
+    NOTIFY_MESSAGE = os.getenv(
+        'NOTIFY_MESSAGE',
+        "Hi {first_name}, we haven't seen you at the gym for {days} days. We'd love to have you back!"
+    )
+    NOTIFY_TRANSPORT = os.getenv('NOTIFY_TRANSPORT', 'file')
+    NOTIFY_OUTBOX_DIR = os.getenv('NOTIFY_OUTBOX_DIR', '')
+    NOTIFY_SMTP_HOST = os.getenv('NOTIFY_SMTP_HOST', 'localhost')
+    NOTIFY_SMTP_PORT = int(os.getenv('NOTIFY_SMTP_PORT', '1025'))
+    NOTIFY_SMTP_SENDER = os.getenv('NOTIFY_SMTP_SENDER', 'gym@localhost')
+    NOTIFY_SMTP_DOMAIN = os.getenv('NOTIFY_SMTP_DOMAIN', 'sms.localhost')
+    NOTIFY_WEBHOOK_URL = os.getenv('NOTIFY_WEBHOOK_URL', '')
+    NOTIFY_WEBHOOK_TOKEN = os.getenv('NOTIFY_WEBHOOK_TOKEN', '')
+    NOTIFY_TIMEOUT_SECONDS = float(os.getenv('NOTIFY_TIMEOUT_SECONDS', '10'))
+    # Members read and recorded per batch; messages in flight at once;
+    # delivery attempts per message (exponential backoff between them)
+    NOTIFY_BATCH_SIZE = int(os.getenv('NOTIFY_BATCH_SIZE', '500'))
+    NOTIFY_CONCURRENCY = int(os.getenv('NOTIFY_CONCURRENCY', '8'))
+    NOTIFY_MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', '3'))
+    NOTIFY_RETRY_SECONDS = float(os.getenv('NOTIFY_RETRY_SECONDS', '0.5'))
+    
+    # Request profiling (profiling.py, /admin/profiling): template and SQL
+    # time of every request, cProfile dumps for a sample. Adds overhead;
+    # off unless PROFILING_ENABLED is set
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0.01'))
+    PROFILE_DIR = os.getenv('PROFILE_DIR', '')
+    PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '200'))
+    
+    # Membership plans: deny check-in to members who never had a plan
+    # (off by default so existing members keep access until subscribed)
+    MEMBERSHIP_REQUIRED = os.getenv('MEMBERSHIP_REQUIRED', 'false').lower() in ('1', 'true', 'yes')
+    
+    # Live occupancy (exit scanning)
+    OPEN_VISIT_MAX_MINUTES = int(os.getenv('OPEN_VISIT_MAX_MINUTES', '240'))
+    OCCUPANCY_RECONCILE_SECONDS = int(os.getenv('OCCUPANCY_RECONCILE_SECONDS', '300'))
+    
+    # Live dashboard counters are re-seeded from the database this often:
+    # each worker process only sees the check-ins it served itself
+    EVENTS_RESEED_SECONDS = int(os.getenv('EVENTS_RESEED_SECONDS', '30'))
+    
+    # Offline kiosk (/entry/kiosk/)
+    # Snapshot and scan uploads need a device token (X-Kiosk-Token) or an
+    # admin session. KIOSK_HASH_SALT is a server secret entered on each
+    # kiosk at setup (never sent by the server); members are matched on
+    # the device by salted identifier hashes. Unset salt = kiosk disabled
+    KIOSK_TOKENS = parse_kiosk_tokens(os.getenv('KIOSK_TOKENS'))
+    KIOSK_HASH_SALT = os.getenv('KIOSK_HASH_SALT', '')
+    KIOSK_SYNC_SECONDS = int(os.getenv('KIOSK_SYNC_SECONDS', '60'))
+    KIOSK_MAX_BATCH = int(os.getenv('KIOSK_MAX_BATCH', '200'))
+    KIOSK_MAX_SCAN_AGE_HOURS = int(os.getenv('KIOSK_MAX_SCAN_AGE_HOURS', '12'))
+    
     # Application Settings
     ITEMS_PER_PAGE = 20
 
@@ -47,20 +247,63 @@ class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
     TESTING = False
+    ADMIN_ALLOW_DEFAULT_PASSWORD = True
 
 
 class ProductionConfig(Config):
-    """Production configuration"""
+    """
+    Production configuration
+    - Schema is migrated at deploy time, not by every worker
+    - Pooled connections are checked before use and recycled before
+      MySQL's wait_timeout closes them
+    """
     DEBUG = False
     TESTING = False
-    SESSION_COOKIE_SECURE = True
+    # Set to 0 only for plain-HTTP LAN installs
+    SESSION_COOKIE_SECURE = os.getenv('SESSION_COOKIE_SECURE', '1') == '1'
+    AUTO_MIGRATE = False
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '280')),
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '5')),
+        # Seconds to wait for a free pooled connection (SQLAlchemy default 30)
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '5')),
+    }
 
 
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
+    ADMIN_ALLOW_DEFAULT_PASSWORD = True
+    RATELIMIT_ENABLED = False
+    CACHE_TYPE = 'null'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
 
 
-# Default to development
-APP_CONFIG = DevelopmentConfig()
+CONFIGS = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+}
+
+
+def load_config(name=None):
+    """
+    Build the configuration selected by name or the APP_ENV variable
+
+    Args:
+        name (str): 'development', 'production' or 'testing'
+                    (defaults to APP_ENV, then 'development')
+
+    Returns:
+        Config: Configuration instance
+    """
+    name = (name or os.getenv('APP_ENV') or 'development').lower()
+    if name not in CONFIGS:
+        raise ValueError(f'Unknown APP_ENV: {name} (expected one of {", ".join(CONFIGS)})')
+    return CONFIGS[name]()
+
+
+# Selected by APP_ENV (development by default)
+APP_CONFIG = load_config()
@@ -15,7 +15,7 @@ Setup Steps:
 
 import sys
 from app import create_app, db
-from models import User, EntryLog
+from migrations import upgrade_all
 
 
 def setup_database():
@@ -23,8 +23,8 @@ def setup_database():
     Initialize the database with proper tables and indexes
     """
     try:
-        # Create Flask app context
-        app = create_app()
+        # Create Flask app (schema is handled below, not at app creation)
+        app = create_app(init_schema=False)
         
         with app.app_context():
             print("=" * 60)
@@ -35,11 +35,16 @@ def setup_database():
             # db.drop_all()
             # print("✓ Dropped existing tables")
             
-            # Create all tables
-            db.create_all()
-            print("✓ Created database tables:")
+            # Apply versioned migrations (creates tables on a fresh database)
+            applied = upgrade_all(app, verbose=True)
+            if not any(applied):
+                print("✓ Schema already up to date")
+            print("✓ Database tables:")
             print("  - users")
             print("  - entry_logs")
+            print("  - member_stats")
+            print("  - plans")
+            print("  - subscriptions")
             
             # Print table structure information
             print("\n" + "=" * 60)
@@ -51,9 +56,11 @@ def setup_database():
             print("  - name (VARCHAR 100, NOT NULL)")
             print("  - age (INT, NOT NULL)")
             print("  - mobile_number (VARCHAR 15, UNIQUE, NOT NULL, INDEX)")
+            print("  - mobile_e164 (VARCHAR 16, UNIQUE, canonical mobile number)")
             print("  - membership_id (VARCHAR 20, UNIQUE, NOT NULL, INDEX)")
             print("  - registration_date (DATETIME, DEFAULT NOW)")
             print("  - updated_at (DATETIME, DEFAULT NOW)")
+            print("  - registration_day (DATE, INDEX with location)")
             
             print("\nTable: entry_logs")
             print("  - id (Primary Key, AUTO_INCREMENT)")
@@ -62,7 +69,36 @@ def setup_database():
             print("  - entry_time (DATETIME, DEFAULT NOW)")
             print("  - exit_time (DATETIME, NULL)")
             print("  - created_at (DATETIME, DEFAULT NOW)")
-            print("  - Composite Index: (user_id, entry_date)")
+            print("  - UNIQUE Composite Index: (user_id, entry_date)")
+            
+            print("\nTable: member_stats")
+            print("  - user_id (Primary Key, Foreign Key -> users.id)")
+            print("  - total_visits, current_streak, longest_streak (INT)")
+            print("  - visits_this_month (INT)")
+            print("  - first_visit_date, last_visit_date (DATE, NULL)")
+            print("  - subscription_id, valid_from, valid_until, visits_remaining (NULL)")
+            
+            print("\nTable: plans")
+            print("  - id (Primary Key, AUTO_INCREMENT)")
+            print("  - name (VARCHAR 50, UNIQUE), duration_days (INT)")
+            print("  - visit_quota (INT, NULL = unlimited), price (DECIMAL, NULL)")
+            
+            print("\nTable: subscriptions")
+            print("  - id (Primary Key, AUTO_INCREMENT)")
+            print("  - user_id (Foreign Key -> users.id), plan_id (Foreign Key -> plans.id)")
+            print("  - start_date, end_date (DATE), visit_quota, visits_used (INT)")
+            print("  - Composite Index: (user_id, end_date)")
+            
+            print("\nTable: audit_events")
+            print("  - id (Primary Key), day (DATE), at (DATETIME)")
+            print("  - event, reason (SMALLINT codes), user_id, admin_id (INT, NULL)")
+            print("  - subject (VARCHAR 64, NULL)")
+            print("  - Composite Index: (location, day, at)")
+            
+            print("\nTable: notifications")
+            print("  - id (Primary Key), user_id (INT), kind (VARCHAR 30), lapse_day (DATE)")
+            print("  - status (pending / sent / failed), attempts (INT), transport, recipient, error")
+            print("  - Unique Index: (user_id, kind, lapse_day)")
             
             print("\n" + "=" * 60)
             print("✓ Database initialization complete!")
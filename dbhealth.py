@@ -0,0 +1,321 @@
+"""
+Database health
+- Client-side timeouts on every connection (DB_CONNECT_TIMEOUT_SECONDS,
+  DB_QUERY_TIMEOUT_SECONDS), so a slow or unreachable server costs a
+  request seconds, not the driver's default minutes
+- One circuit breaker per engine (default database and each location
+  bind), fed by SQLAlchemy's handle_error / after_cursor_execute events:
+  DB_BREAKER_FAILURES consecutive connection errors or timeouts open it,
+  and while it is open connects and queries fail at once with
+  DatabaseUnavailable instead of waiting for the timeout
+- Only failed connects and lost connections (a MySQL read timeout drops
+  the connection) count; they are re-raised as DatabaseUnavailable. Lock
+  waits, deadlocks and bad SQL mean the server answered: they keep their
+  OperationalError and go through the normal error path
+- After DB_BREAKER_RESET_SECONDS one query goes through as a probe
+  (half-open); when it succeeds the breaker closes and the on_recover
+  callbacks run (fallback.py replays its journal)
+- Callers catch DB_ERRORS: check-ins fall back to fallback.py while the
+  breaker is open, admin pages serve their last good data marked stale
+  (stale_fallback), every other page gets a 503 with Retry-After
+- State is per worker process; /admin/db-health shows it
+"""
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, g, jsonify, render_template, request
+from jinja2 import TemplateNotFound
+from sqlalchemy import event
+from sqlalchemy.exc import InterfaceError, OperationalError, SQLAlchemyError, TimeoutError as PoolTimeoutError
+
+import businessday
+
+
+class DatabaseUnavailable(SQLAlchemyError):
+    """
+    Raised instead of touching the database while its breaker is open, and
+    in place of a failed connect or lost connection (a SQLAlchemyError, so
+    existing database error handling covers it)
+    """
+
+
+# Errors that mean "the database did not answer" (not a rejected statement)
+DB_ERRORS = (DatabaseUnavailable, PoolTimeoutError)
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half-open after `reset_seconds` (one probing thread);
+    half-open -> closed on the probe's success, back to open on its failure
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name, failure_threshold=5, reset_seconds=15.0, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.total_failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+        self.last_error = None
+        self.last_failure_at = None
+        self.changed_at = datetime.utcnow()
+        self._opened_at = 0.0
+        self._prober = None
+        self._lock = threading.Lock()
+        self._on_recover = []
+
+    def on_recover(self, callback):
+        """Call callback() (no arguments) whenever the breaker closes again"""
+        self._on_recover.append(callback)
+
+    @property
+    def is_open(self):
+        """Open or half-open: closing again will run the on_recover callbacks"""
+        return self.state != self.CLOSED
+
+    def _set_state(self, state):
+        self.state = state
+        self.changed_at = datetime.utcnow()
+
+    def allow(self):
+        """True when a database call may go ahead"""
+        if self.state == self.CLOSED:
+            return True
+        with self._lock:
+            if self.state == self.OPEN and self.clock() - self._opened_at >= self.reset_seconds:
+                self._set_state(self.HALF_OPEN)
+                self._prober = None
+            if self.state == self.HALF_OPEN:
+                # Only one thread probes; its follow-up queries go through too
+                if self._prober is None:
+                    self._prober = threading.get_ident()
+                if self._prober == threading.get_ident():
+                    return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        # Lock-free in the common case (every query of a healthy database)
+        if self.state == self.CLOSED and not self.failures:
+            return
+        with self._lock:
+            recovered = self.state != self.CLOSED
+            self.failures = 0
+            self._prober = None
+            if recovered:
+                self._set_state(self.CLOSED)
+        if recovered:
+            for callback in self._on_recover:
+                callback()
+
+    def record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.total_failures += 1
+            self.last_error = str(error).splitlines()[0][:255] if str(error) else error.__class__.__name__
+            self.last_failure_at = datetime.utcnow()
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and
+                                                self.failures >= self.failure_threshold):
+                self._set_state(self.OPEN)
+                self._opened_at = self.clock()
+                self._prober = None
+                self.times_opened += 1
+                return True
+        return False
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'state': self.state,
+            'since': self.changed_at.isoformat(timespec='seconds'),
+            'consecutive_failures': self.failures,
+            'total_failures': self.total_failures,
+            'rejected': self.rejected,
+            'times_opened': self.times_opened,
+            'last_error': self.last_error,
+            'last_failure_at': self.last_failure_at.isoformat(timespec='seconds') if self.last_failure_at else None,
+        }
+
+
+# ============================================================
+# ENGINE HOOKS
+# ============================================================
+
+def _timeout_params(dialect, connect_timeout, query_timeout):
+    """Driver connect() keyword arguments for the client-side timeouts"""
+    if dialect.name == 'mysql':
+        # PyMySQL and mysqlclient: a read / write blocked this long raises
+        # OperationalError and drops the connection
+        return {'connect_timeout': int(connect_timeout), 'read_timeout': int(query_timeout),
+                'write_timeout': int(query_timeout)}
+    if dialect.name == 'sqlite':
+        # Busy timeout: how long a writer waits for the database lock
+        return {'timeout': query_timeout}
+    return {}
+
+
+def watch_engine(engine, breaker, connect_timeout=3, query_timeout=10):
+    """Attach the timeouts and a breaker to an engine"""
+
+    @event.listens_for(engine, 'do_connect')
+    def _connect(dialect, conn_rec, cargs, cparams):
+        if not breaker.allow():
+            raise DatabaseUnavailable(f'Database {breaker.name} is unavailable (circuit open)')
+        for key, value in _timeout_params(dialect, connect_timeout, query_timeout).items():
+            cparams.setdefault(key, value)
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        if not breaker.allow():
+            raise DatabaseUnavailable(f'Database {breaker.name} is unavailable (circuit open)')
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        breaker.record_success()
+
+    @event.listens_for(engine, 'handle_error')
+    def _error(context):
+        if isinstance(context.original_exception, DatabaseUnavailable) or context.is_pre_ping:
+            return None
+        # No connection: connect() itself failed (refused, connect timeout)
+        if context.is_disconnect or (context.connection is None and isinstance(
+                context.sqlalchemy_exception, (OperationalError, InterfaceError))):
+            if breaker.record_failure(context.original_exception):
+                current_app.logger.error('Database %s circuit opened: %s', breaker.name, breaker.last_error)
+            # Returned exceptions replace SQLAlchemy's (the connection is still invalidated)
+            return DatabaseUnavailable(f'Database {breaker.name} is unavailable: {breaker.last_error}')
+        # The server answered (lock wait, deadlock, constraint violation, bad SQL): it is up
+        breaker.record_success()
+        return None
+
+
+class DatabaseHealth:
+    """Breakers of one Flask app, keyed by bind key (None = default database)"""
+
+    def __init__(self, app):
+        self.app = app
+        self.breakers = {}
+
+    def breaker(self, bind_key=None):
+        return self.breakers.get(bind_key)
+
+    def on_recover(self, callback):
+        """Register callback(bind_key) for every breaker"""
+        for bind_key, breaker in self.breakers.items():
+            breaker.on_recover(lambda bind_key=bind_key: callback(bind_key))
+
+    def healthy(self):
+        return all(breaker.state == CircuitBreaker.CLOSED for breaker in self.breakers.values())
+
+    def is_open(self, location):
+        """True while the breaker of the default database or of the location's bind is open"""
+        bind_key = self.app.config.get('LOCATION_BINDS', {}).get(location)
+        return any(breaker is not None and breaker.is_open
+                   for breaker in (self.breaker(None), self.breaker(bind_key)))
+
+    def to_dict(self):
+        return {
+            'healthy': self.healthy(),
+            'breakers': [breaker.to_dict() for breaker in self.breakers.values()],
+        }
+
+
+# ============================================================
+# DEGRADED RESPONSES
+# ============================================================
+
+def stale_fallback(key, compute):
+    """
+    Run compute() and keep its result as the last good copy; when the
+    database is unavailable serve that copy instead (g.db_stale_at is set
+    for the page banner) and re-raise only when there is none
+
+    Args:
+        key (str): Copy key within the current location
+        compute (callable): Builds picklable, plain data (no ORM objects)
+    """
+    from cache import get_cache
+    from tenancy import current_location
+
+    cache = get_cache()
+    key = f'{current_location()}:{key}'
+    try:
+        value = compute()
+    except DB_ERRORS:
+        found, copy = cache.get('stale', key)
+        if not found:
+            raise
+        saved_at, value = copy
+        g.db_stale_at = min(g.get('db_stale_at') or saved_at, saved_at)
+        return value
+    cache.set('stale', key, (datetime.utcnow(), value),
+              ttl=current_app.config.get('DB_STALE_SECONDS', 86400))
+    return value
+
+
+def _unavailable(error):
+    """503 for any request the database could not serve"""
+    from app.models import db
+
+    db.session.rollback()
+    current_app.logger.warning('Database unavailable for %s %s: %s', request.method, request.path, error)
+    retry_after = int(current_app.config.get('DB_BREAKER_RESET_SECONDS', 15))
+    message = 'The database is temporarily unavailable. Please try again shortly.'
+    if request.is_json or request.accept_mimetypes.best == 'application/json':
+        response = jsonify({'error': message})
+    else:
+        try:
+            response = current_app.make_response(render_template('503.html', message=message))
+        except TemplateNotFound:
+            response = current_app.make_response(message)
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def _stale_context():
+    stale_at = g.get('db_stale_at')
+    return {'db_stale_at': businessday.local_time(stale_at) if stale_at else None}
+
+
+def _mark_stale(response):
+    stale_at = g.get('db_stale_at')
+    if stale_at is not None:
+        response.headers['X-Data-As-Of'] = stale_at.isoformat(timespec='seconds') + 'Z'
+        response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def init_dbhealth(app):
+    """Attach timeouts and circuit breakers to every engine of an app"""
+    from app.models import db
+
+    health = app.extensions['dbhealth'] = DatabaseHealth(app)
+    config = app.config
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            breaker = health.breakers[bind_key] = CircuitBreaker(
+                bind_key or 'default',
+                failure_threshold=config.get('DB_BREAKER_FAILURES', 5),
+                reset_seconds=config.get('DB_BREAKER_RESET_SECONDS', 15)
+            )
+            watch_engine(engine, breaker,
+                         connect_timeout=config.get('DB_CONNECT_TIMEOUT_SECONDS', 3),
+                         query_timeout=config.get('DB_QUERY_TIMEOUT_SECONDS', 10))
+
+    for error in DB_ERRORS:
+        app.register_error_handler(error, _unavailable)
+    app.after_request(_mark_stale)
+    app.context_processor(_stale_context)
+
+
+def get_health():
+    """Database health (breakers) of the current app"""
+    return current_app.extensions['dbhealth']
@@ -0,0 +1,271 @@
+"""
+Live event broadcasting for the admin dashboard
+- Single in-process publish/subscribe fan-out
+- Check-in and registration events are pushed to every connected dashboard
+- Dashboard counters are kept incrementally, so N open admin screens cost
+  one seed query set plus one broadcast per event (not N full dashboards)
+
+NOTE: the broker is per process. Under a multi-worker server each worker
+keeps its own subscribers and sees only the events of its own requests,
+so its counters are re-seeded from the database every
+EVENTS_RESEED_SECONDS (init_events) and pushed to its dashboards; a
+dashboard is at most that far behind check-ins made on other workers.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy.exc import SQLAlchemyError
+
+import businessday
+
+
+# Counters that reset to zero when the day rolls over
+DAILY_COUNTERS = ('entries_today', 'registrations_today')
+
+
+class _Channel:
+    """Subscribers and counters of one gym location"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.counters = {}
+        self.counter_day = None
+        self.seeded_at = 0.0
+
+
+class EventBroker:
+    """
+    Fan-out of dashboard events to Server-Sent Events subscribers
+    - Each subscriber owns a bounded queue
+    - Slow subscribers drop events instead of blocking publishers
+    - Subscribers and counters are kept per channel (gym location)
+    - Counters are re-seeded from the database every `reseed_seconds`
+      (events of other worker processes never reach this broker)
+    """
+
+    def __init__(self, queue_size=100, reseed_seconds=30):
+        self.queue_size = queue_size
+        self.reseed_seconds = reseed_seconds
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._app = None
+        self._loader = None
+        self._pid = None
+
+    def _channel(self, name):
+        channel = self._channels.get(name)
+        if channel is None:
+            channel = self._channels[name] = _Channel()
+        return channel
+
+    # ============= SUBSCRIPTIONS =============
+
+    def subscribe(self, channel=None):
+        """Register a new subscriber and return its event queue"""
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        subscriber.channel = channel
+        with self._lock:
+            self._channel(channel).subscribers.add(subscriber)
+        self._ensure_thread()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """Remove a subscriber queue"""
+        with self._lock:
+            self._channel(getattr(subscriber, 'channel', None)).subscribers.discard(subscriber)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(channel.subscribers) for channel in self._channels.values())
+
+    # ============= COUNTERS =============
+
+    def ensure_counters(self, loader, today=None, channel=None):
+        """
+        Seed the counters from the database once per day, and again when
+        they are older than `reseed_seconds`
+
+        Args:
+            loader (callable): Returns a dict of counter values (runs queries)
+            today (date): Business day the counters belong to
+            channel (str): Gym location the counters belong to
+
+        Returns:
+            dict: Snapshot of the current counters
+        """
+        today = today or businessday.today()
+        with self._lock:
+            state = self._channel(channel)
+            if state.counter_day == today and time.monotonic() - state.seeded_at < self.reseed_seconds:
+                return dict(state.counters)
+
+        counters = loader()
+
+        with self._lock:
+            state.counters = dict(counters)
+            state.counter_day = today
+            state.seeded_at = time.monotonic()
+            return dict(state.counters)
+
+    def counters(self, channel=None):
+        """Return a snapshot of the current counters"""
+        with self._lock:
+            return dict(self._channel(channel).counters)
+
+    # ============= RE-SEEDING =============
+
+    def start_reseeding(self, app, loader):
+        """
+        Re-seed the counters of every watched channel on a background thread
+
+        Args:
+            app (Flask): Application whose database holds the counts
+            loader (callable): Counter queries, run per channel inside
+                               app context and the channel's location
+        """
+        self._app = app
+        self._loader = loader
+
+    def _ensure_thread(self):
+        # Started on first subscription in each process: threads do not
+        # survive the fork of a preloaded gunicorn master
+        if self._app is None or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._run, name='event-reseed', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            time.sleep(self.reseed_seconds)
+            self.reseed()
+
+    def reseed(self):
+        """Reload the counters of channels with subscribers and push them to the dashboards"""
+        from app.models import db
+        from tenancy import use_location
+
+        with self._lock:
+            channels = [name for name, state in self._channels.items() if state.subscribers]
+        for name in channels:
+            try:
+                with self._app.app_context(), use_location(name):
+                    today = businessday.today()
+                    try:
+                        counters = self._loader()
+                    finally:
+                        db.session.remove()
+            except SQLAlchemyError:
+                self._app.logger.warning('Dashboard counters of %s not re-seeded: database error', name)
+                continue
+
+            with self._lock:
+                state = self._channel(name)
+                state.counters = dict(counters)
+                state.counter_day = today
+                state.seeded_at = time.monotonic()
+                message = format_sse('counters', {'counters': dict(state.counters)})
+                subscribers = list(state.subscribers)
+            for subscriber in subscribers:
+                try:
+                    subscriber.put_nowait(message)
+                except queue.Full:
+                    pass
+
+    @staticmethod
+    def _roll_day(state, today):
+        """Reset daily counters when the first event of a new day arrives"""
+        if state.counter_day is not None and state.counter_day != today:
+            for name in DAILY_COUNTERS:
+                if name in state.counters:
+                    state.counters[name] = 0
+            state.counter_day = today
+
+    # ============= PUBLISHING =============
+
+    def publish(self, event_type, data, increments=None, today=None, channel=None):
+        """
+        Broadcast an event to all subscribers of a channel
+
+        Args:
+            event_type (str): SSE event name ('checkin', 'registration', ...)
+            data (dict): JSON-serializable event payload
+            increments (dict): Counter name -> amount to add
+            today (date): Business day of the event
+            channel (str): Gym location the event belongs to
+        """
+        today = today or businessday.today()
+
+        with self._lock:
+            state = self._channel(channel)
+            # Counters are only maintained once a dashboard has seeded them
+            if state.counter_day is not None:
+                self._roll_day(state, today)
+                for name, amount in (increments or {}).items():
+                    state.counters[name] = state.counters.get(name, 0) + amount
+
+            message = format_sse(event_type, {
+                **data,
+                'counters': dict(state.counters),
+            })
+            subscribers = list(state.subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # Slow client: drop the event, counters catch up on the next one
+                pass
+
+    def stream(self, subscriber, initial=None, heartbeat=15):
+        """
+        Generator of SSE messages for one subscriber
+
+        Args:
+            subscriber (queue.Queue): Queue returned by subscribe()
+            initial (str): Message sent immediately on connect
+            heartbeat (int): Seconds between keep-alive comments
+        """
+        try:
+            if initial:
+                yield initial
+            while True:
+                try:
+                    yield subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+        finally:
+            self.unsubscribe(subscriber)
+
+
+def format_sse(event_type, data):
+    """
+    Format a Server-Sent Events message
+
+    Args:
+        event_type (str): Event name
+        data (dict): JSON-serializable payload
+
+    Returns:
+        str: SSE wire format message
+    """
+    payload = json.dumps(data, separators=(',', ':'), default=str)
+    return f'event: {event_type}\ndata: {payload}\n\n'
+
+
+# Shared broker for the whole process
+broker = EventBroker()
+
+
+def init_events(app):
+    """Re-seed the live dashboard counters of this app every EVENTS_RESEED_SECONDS"""
+    from services import StatsService
+
+    broker.reseed_seconds = app.config.get('EVENTS_RESEED_SECONDS', 30)
+    broker.start_reseeding(app, StatsService.live_counters)
@@ -0,0 +1,407 @@
+"""
+Check-ins while the database is unavailable
+===========================================
+
+When a check-in or exit scan cannot reach the database because its
+circuit breaker is open (see dbhealth.py) the scan is not lost:
+
+- MemberIndex keeps a per-process copy of every member of a location
+  (canonical mobile number / membership ID -> id, name). It is refreshed
+  in the background every DB_FALLBACK_INDEX_SECONDS while the database
+  is healthy, fetching only the members added since the last refresh
+  (the kiosk snapshot rule). About 30 MB per 100k members per worker.
+- The member is looked up there and the scan is appended to a local
+  journal: JSON lines in DB_FALLBACK_JOURNAL_DIR, one file per worker
+  process, fsync'd before the member is let in.
+- The journal is replayed through kiosk.process_scans when the breaker
+  closes again, or from /admin/db-health (`python fallback.py replay`).
+  Replay applies the real rules with the scan time: one check-in per day,
+  membership eligibility, the audit log.
+- Only while the breaker is open (database_down): the replay runs when it
+  closes, so a scan journaled after a single error with the breaker still
+  closed would wait for an outage that may never come. Such an error gets
+  the usual 503 and the member scans again.
+
+While offline, a member is only stopped from checking in twice by the
+same worker; membership and check-ins made before the outage are checked
+at replay, and the audit log records what replay rejected. Scans older
+than KIOSK_MAX_SCAN_AGE_HOURS at replay time are not recorded.
+
+Usage:
+    python fallback.py replay    # replay every journal file now
+"""
+import fcntl
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+from flask import current_app
+
+import businessday
+from app.models import db, User
+from dbhealth import DB_ERRORS
+from phones import normalize_phone
+from services import ServiceError
+from tenancy import current_location, use_location
+
+
+class MemberIndex:
+    """Identifier -> member of each location, for lookups without the database"""
+
+    def __init__(self, app, refresh_seconds=60):
+        self.app = app
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        # location -> {'version', 'refreshed', 'keys': {identifier: id}, 'members': {id: (name, membership_id)}}
+        self._locations = {}
+        self._refreshing = set()
+
+    @staticmethod
+    def _key(mobile_number=None, membership_id=None):
+        if mobile_number:
+            return f'm:{normalize_phone(mobile_number) or mobile_number}'
+        return f'i:{membership_id}'
+
+    def lookup(self, mobile_number=None, membership_id=None, location=None):
+        """
+        Find a member by mobile number, then by membership ID
+
+        Returns:
+            tuple: (user_id, name, membership_id), or None when unknown
+        """
+        data = self._locations.get(location or current_location())
+        if data is None:
+            return None
+        keys = data['keys']
+        user_id = None
+        if mobile_number:
+            user_id = keys.get(self._key(mobile_number=mobile_number))
+        if user_id is None and membership_id:
+            user_id = keys.get(self._key(membership_id=membership_id))
+        if user_id is None:
+            return None
+        return (user_id,) + data['members'][user_id]
+
+    def loaded(self, location=None):
+        return (location or current_location()) in self._locations
+
+    def refresh_if_due(self, location=None):
+        """Start a background refresh when the location's copy is missing or old (never blocks)"""
+        location = location or current_location()
+        data = self._locations.get(location)
+        if data is not None and time.monotonic() - data['refreshed'] < self.refresh_seconds:
+            return
+        with self._lock:
+            if location in self._refreshing:
+                return
+            self._refreshing.add(location)
+        threading.Thread(target=self._refresh_thread, args=(location,),
+                         name='member-index', daemon=True).start()
+
+    def _refresh_thread(self, location):
+        try:
+            with self.app.app_context(), use_location(location):
+                self.refresh()
+        except DB_ERRORS:
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(location)
+
+    def refresh(self):
+        """Add members created since the last refresh (all of them the first time)"""
+        from kiosk import MEMBER_COLUMNS, snapshot_version
+
+        location = current_location()
+        data = self._locations.get(location)
+        try:
+            version = snapshot_version()
+            if data and data['version'] == version:
+                data['refreshed'] = time.monotonic()
+                return
+            since = data['version'] if data and data['version'] < version else 0
+            if since == 0:
+                data = {'version': 0, 'refreshed': 0.0, 'keys': {}, 'members': {}}
+            # Copied, so lookups on other threads never see a half-updated index
+            keys, members = dict(data['keys']), dict(data['members'])
+            rows = db.session.query(*MEMBER_COLUMNS).filter(User.id > since).order_by(User.id).yield_per(1000)
+            for row in rows:
+                members[row.id] = (row.name, row.membership_id)
+                keys[self._key(mobile_number=row.mobile_e164 or row.mobile_number)] = row.id
+                keys[self._key(membership_id=row.membership_id)] = row.id
+        finally:
+            db.session.remove()
+
+        self._locations[location] = {'version': version, 'refreshed': time.monotonic(),
+                                     'keys': keys, 'members': members}
+
+    def to_dict(self):
+        now = time.monotonic()
+        return {
+            location: {'members': len(data['members']), 'version': data['version'],
+                       'age_seconds': int(now - data['refreshed'])}
+            for location, data in self._locations.items()
+        }
+
+
+class CheckinJournal:
+    """
+    Append-only scan journal, one file per process
+    - journal-<pid>.jsonl is appended under an exclusive flock and fsync'd
+    - Replay renames a file to replaying-<id>.jsonl before reading it, so
+      new scans go to a fresh file and two workers never replay the same
+      file; a replay that fails leaves it as failed-<id>.jsonl for the next one
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _path(self):
+        return os.path.join(self.directory, f'journal-{os.getpid()}.jsonl')
+
+    def append(self, scan):
+        line = (json.dumps(scan) + '\n').encode()
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            while True:
+                fd = os.open(self._path(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                    # Renamed away by a replay between open() and flock(): start a new file
+                    if os.fstat(fd).st_ino != _inode(self._path()):
+                        continue
+                    os.write(fd, line)
+                    os.fsync(fd)
+                    return
+                finally:
+                    os.close(fd)
+
+    def _files(self, prefixes=('journal-', 'failed-')):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names if name.startswith(prefixes) and name.endswith('.jsonl'))
+
+    def pending(self):
+        """Scans waiting for replay"""
+        count = 0
+        for name in self._files(('journal-', 'failed-', 'replaying-')):
+            try:
+                with open(os.path.join(self.directory, name), 'rb') as f:
+                    count += sum(1 for _ in f)
+            except FileNotFoundError:
+                continue
+        return count
+
+    def claim(self):
+        """
+        Take every waiting file for replay
+
+        Returns:
+            list: Paths now named replaying-*.jsonl, owned by the caller
+        """
+        claimed = []
+        for name in self._files():
+            target = os.path.join(self.directory, f'replaying-{uuid.uuid4().hex}.jsonl')
+            try:
+                os.rename(os.path.join(self.directory, name), target)
+            except FileNotFoundError:
+                continue
+            # Wait for a write that opened the file before the rename
+            with open(target, 'rb') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            claimed.append(target)
+        return claimed
+
+    def release(self, path, done):
+        """Delete a replayed file, or keep it for the next replay"""
+        if done:
+            os.remove(path)
+        else:
+            os.rename(path, path.replace('replaying-', 'failed-'))
+
+
+def _inode(path):
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+class Fallback:
+    """Member index, journal and replay of one Flask app"""
+
+    def __init__(self, app):
+        self.app = app
+        self.index = MemberIndex(app, refresh_seconds=app.config.get('DB_FALLBACK_INDEX_SECONDS', 60))
+        self.journal = CheckinJournal(app.config.get('DB_FALLBACK_JOURNAL_DIR')
+                                      or os.path.join(app.instance_path, 'checkin_journal'))
+        self.accepted = 0
+        self.last_replay = None
+        self._lock = threading.Lock()
+        self._replaying = threading.Lock()
+        # (location, user_id, kind) scanned offline on `_day` by this process
+        self._day = None
+        self._scanned = set()
+
+    def scan(self, kind, mobile_number=None, membership_id=None):
+        """
+        Accept a check-in / exit from the member index and journal it
+
+        Returns:
+            tuple: (user_id, name, membership_id)
+
+        Raises:
+            ServiceError: Member unknown (or no index yet), or already scanned offline today
+        """
+        location = current_location()
+        member = self.index.lookup(mobile_number, membership_id, location)
+        if member is None:
+            if not self.index.loaded(location):
+                raise ServiceError('Check-in is temporarily unavailable. Please see the front desk.',
+                                   code='unavailable')
+            raise ServiceError('User Not Found / Not Registered. Please register first.',
+                               code='not_found')
+
+        user_id, name, _ = member
+        today = businessday.today()
+        with self._lock:
+            if self._day != today:
+                self._day, self._scanned = today, set()
+            if (location, user_id, kind) in self._scanned:
+                if kind == 'checkin':
+                    raise ServiceError(f'Already Checked In Today! Welcome back, {name}.',
+                                       category='warning', code='already_checked_in')
+                raise ServiceError(f'No open visit to close for {name}.',
+                                   category='warning', code='no_open_visit')
+            self._scanned.add((location, user_id, kind))
+
+        self.journal.append({
+            'id': uuid.uuid4().hex,
+            'location': location,
+            'user_id': user_id,
+            'kind': kind,
+            'scanned_at': int(time.time() * 1000),
+        })
+        with self._lock:
+            self.accepted += 1
+        return member
+
+    def replay(self):
+        """
+        Replay every journal file through kiosk.process_scans
+
+        Returns:
+            dict: scans, ok and rejected counts, files left for later
+        """
+        from kiosk import process_scans
+
+        if not self._replaying.acquire(blocking=False):
+            return {'scans': 0, 'ok': 0, 'rejected': 0, 'failed_files': 0, 'busy': True}
+        try:
+            counts = {'scans': 0, 'ok': 0, 'rejected': 0, 'failed_files': 0}
+            batch_size = self.app.config.get('KIOSK_MAX_BATCH', 200)
+            for path in self.journal.claim():
+                done = False
+                try:
+                    with open(path) as f:
+                        scans = [json.loads(line) for line in f if line.strip()]
+                    by_location = {}
+                    for scan in scans:
+                        by_location.setdefault(scan.get('location'), []).append(scan)
+                    for location, location_scans in by_location.items():
+                        with self.app.app_context(), use_location(location):
+                            for start in range(0, len(location_scans), batch_size):
+                                for result in process_scans(location_scans[start:start + batch_size]):
+                                    counts['ok' if result['status'] == 'ok' else 'rejected'] += 1
+                            db.session.remove()
+                    counts['scans'] += len(scans)
+                    done = True
+                except DB_ERRORS:
+                    counts['failed_files'] += 1
+                    self.app.logger.warning('Journal replay of %s stopped: database unavailable', path)
+                finally:
+                    self.journal.release(path, done)
+            self.last_replay = dict(counts, at=time.strftime('%Y-%m-%d %H:%M:%S'))
+            if counts['scans']:
+                self.app.logger.info('Replayed %d journaled scans (%d rejected)', counts['scans'], counts['rejected'])
+            return counts
+        finally:
+            self._replaying.release()
+
+    def replay_async(self, bind_key=None):
+        """Replay on a background thread (breaker recovery callback)"""
+        threading.Thread(target=self.replay, name='journal-replay', daemon=True).start()
+
+    def to_dict(self):
+        return {
+            'index': self.index.to_dict(),
+            'journal_pending': self.journal.pending(),
+            'accepted_offline': self.accepted,
+            'last_replay': self.last_replay,
+        }
+
+
+def init_fallback(app):
+    """Create the check-in fallback for an app (no-op unless DB_FALLBACK_ENABLED)"""
+    if not app.config.get('DB_FALLBACK_ENABLED', True):
+        return
+    fallback = app.extensions['fallback'] = Fallback(app)
+    health = app.extensions.get('dbhealth')
+    if health is not None:
+        health.on_recover(fallback.replay_async)
+
+
+def get_fallback():
+    """Check-in fallback of the current app, or None when it is off"""
+    return current_app.extensions.get('fallback')
+
+
+def offline_scan(kind, mobile_number=None, membership_id=None):
+    """
+    Journal a scan the database could not take (see Fallback.scan)
+
+    Raises:
+        ServiceError: Also when the fallback is off
+    """
+    fallback = get_fallback()
+    if fallback is None:
+        raise ServiceError('Check-in is temporarily unavailable. Please see the front desk.',
+                           code='unavailable')
+    return fallback.scan(kind, mobile_number, membership_id)
+
+
+def database_down():
+    """True while the current location's database has an open breaker (scans may be journaled)"""
+    health = current_app.extensions.get('dbhealth')
+    return health is not None and health.is_open(current_location())
+
+
+def refresh_index():
+    """Keep the current location's member index fresh (called on every scan; never blocks)"""
+    fallback = get_fallback()
+    if fallback is not None:
+        fallback.index.refresh_if_due()
+
+
+def main(args):
+    if args != ['replay']:
+        print(__doc__)
+        sys.exit(1)
+
+    from app import create_app
+
+    app = create_app(init_schema=False)
+    fallback = app.extensions.get('fallback') or Fallback(app)
+    counts = fallback.replay()
+    print(f'✓ Replayed {counts["scans"]} scans: {counts["ok"]} recorded, {counts["rejected"]} rejected'
+          + (f', {counts["failed_files"]} file(s) left for later' if counts['failed_files'] else ''))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
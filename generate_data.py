@@ -0,0 +1,312 @@
+"""
+Synthetic Data Generator
+========================
+
+Fill a database with realistic fake members and check-ins, to profile the
+admin views and statistics at many times the real size.
+
+Usage:
+    python generate_data.py <members> [months] [seed] [location]
+    python generate_data.py purge [location]
+
+    python generate_data.py 20000 12          # 20k members, a year of visits
+    python generate_data.py 200000 12 7 north
+
+- Deterministic: the same members / months / seed give the same members
+  and visits on a given day (ids continue after the highest existing
+  user id; today's visits stop at the current time)
+- Realistic shape: members join at a growing rate, 30% joined before the
+  window; each has a visit rate (casual / regular / devoted), weekday
+  weights (busy Mondays, quiet Sundays), morning and after-work peaks,
+  a visit length, and churns after an exponential lifetime
+- Synthetic members use SYN-<id> membership IDs and 5xxxxxxxxx mobile
+  numbers (real numbers start with 6-9), so purge removes only them
+- Written with batched executemany INSERTs on one connection (no ORM
+  objects); member_stats summaries are computed in the same pass
+"""
+import calendar
+import math
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from operator import itemgetter
+from types import SimpleNamespace
+
+from flask import current_app
+from sqlalchemy import text
+
+import businessday
+import phones
+from app import create_app
+from app.models import db, MemberStats, new_kiosk_ref
+from cache import get_cache
+from tenancy import use_location
+
+
+BATCH_SIZE = 20000
+MONTH_DAYS = 30.44
+
+# Check-ins per weekday, Mon..Sun
+WEEKDAY_WEIGHTS = (1.2, 1.1, 1.05, 1.0, 0.85, 0.75, 0.55)
+
+# Local check-in hour -> weight
+WEEKDAY_HOURS = {5: 3, 6: 8, 7: 9, 8: 6, 9: 3, 10: 2, 11: 2, 12: 2, 13: 2, 14: 1,
+                 15: 2, 16: 4, 17: 8, 18: 10, 19: 9, 20: 5, 21: 2}
+WEEKEND_HOURS = {6: 2, 7: 4, 8: 7, 9: 9, 10: 9, 11: 7, 12: 4, 13: 2, 14: 2, 15: 2,
+                 16: 3, 17: 4, 18: 4, 19: 3, 20: 1}
+
+# (share of members, mean visits per week)
+VISIT_PROFILES = ((0.3, 1.0), (0.5, 2.5), (0.2, 4.5))
+NO_SHOW_SHARE = 0.1
+CHURN_MONTHS = 8
+VISIT_MINUTES = (75, 25)  # mean, standard deviation
+
+FIRST_NAMES = ('Aarav', 'Aditi', 'Arjun', 'Ananya', 'Dev', 'Diya', 'Ishaan', 'Kavya', 'Karan',
+               'Meera', 'Neha', 'Nikhil', 'Priya', 'Rahul', 'Riya', 'Rohan', 'Sanjay', 'Sara',
+               'Vikram', 'Zara', 'John', 'Maria', 'David', 'Emma', 'Omar', 'Lina')
+LAST_NAMES = ('Sharma', 'Patel', 'Reddy', 'Iyer', 'Khan', 'Singh', 'Gupta', 'Nair', 'Das',
+              'Mehta', 'Joshi', 'Rao', 'Smith', 'Fernandes', 'Kapoor', 'Bose', 'Menon', 'Shah')
+
+USER_COLUMNS = ('id', 'name', 'age', 'mobile_number', 'mobile_e164', 'membership_id',
+                'registration_date', 'updated_at', 'registration_day', 'location', 'kiosk_ref')
+ENTRY_COLUMNS = ('user_id', 'entry_date', 'entry_time', 'exit_time', 'created_at', 'location')
+STATS_COLUMNS = ('user_id', 'total_visits', 'first_visit_date', 'last_visit_date',
+                 'current_streak', 'longest_streak', 'visits_this_month')
+
+
+def _insert(conn, table, columns, rows):
+    """executemany INSERT with the driver's placeholder style"""
+    if rows:
+        mark = '?' if conn.dialect.paramstyle == 'qmark' else '%s'
+        conn.exec_driver_sql(
+            f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join([mark] * len(columns))})',
+            rows
+        )
+        rows.clear()
+
+
+def _hour_table(weights):
+    """Flat lookup table: each hour repeated by its weight"""
+    return [hour for hour, weight in weights.items() for _ in range(weight)]
+
+
+def _visit_gap(rng, chance):
+    """Days until the next candidate visit day (geometric)"""
+    if chance >= 1:
+        return 1
+    return 1 + int(math.log(1.0 - rng.random()) / math.log(1.0 - chance))
+
+
+class Generator:
+    """Members and visits for one location, written in batches"""
+
+    def __init__(self, conn, members, months, seed, location):
+        self.conn = conn
+        self.members = members
+        self.rng = random.Random(seed)
+        self.location = location
+
+        self.now = datetime.utcnow().replace(microsecond=0)
+        self.now_ts = calendar.timegm(self.now.timetuple())
+        self.today = businessday.business_day(self.now)
+        self.first_day = self.today - timedelta(days=round(months * MONTH_DAYS))
+        self.rollover_hour = current_app.config.get('DAY_ROLLOVER_HOUR', 0)
+        # Day ordinal -> (date, ISO date, UTC epoch of its start, hour table)
+        self.days = {}
+
+        self.weekday_hours = _hour_table(WEEKDAY_HOURS)
+        self.weekend_hours = _hour_table(WEEKEND_HOURS)
+        self.max_weight = max(WEEKDAY_WEIGHTS)
+        self.mean_weight = sum(WEEKDAY_WEIGHTS) / 7
+
+        self.users, self.entries, self.stats = [], [], []
+        self.visit_count = 0
+
+    def _day(self, ordinal):
+        info = self.days.get(ordinal)
+        if info is None:
+            day = date.fromordinal(ordinal)
+            start = calendar.timegm(businessday.day_start(day).timetuple())
+            hours = self.weekend_hours if day.weekday() >= 5 else self.weekday_hours
+            info = self.days[ordinal] = (day, day.isoformat(), start, hours)
+        return info
+
+    def _moment(self, info):
+        """UTC epoch seconds on a business day at a weighted local hour"""
+        random = self.rng.random
+        hours = info[3]
+        hour = hours[int(random() * len(hours))]
+        return info[2] + (hour - self.rollover_hour) * 3600 + int(random() * 3600)
+
+    def _join_day(self):
+        rng = self.rng
+        window = (self.today - self.first_day).days
+        if rng.random() < 0.3:
+            return self.first_day - timedelta(days=rng.randrange(1, 366))
+        # Growing gym: more joins towards the end of the window
+        return self.first_day + timedelta(days=int(rng.triangular(0, window, window)))
+
+    def member(self, user_id):
+        rng = self.rng
+        joined = self._join_day()
+        registered_ts = min(self._moment(self._day(joined.toordinal())), self.now_ts)
+        registered_at = datetime.utcfromtimestamp(registered_ts)
+        mobile_number = f'5{user_id:09d}'
+
+        self.users.append((
+            user_id,
+            f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            int(rng.triangular(16, 65, 28)),
+            mobile_number,
+            phones.normalize_phone(mobile_number),
+            f'SYN-{user_id:07d}',
+            registered_at.isoformat(' '),
+            registered_at.isoformat(' '),
+            joined.isoformat(),
+            self.location,
+            new_kiosk_ref(),
+        ))
+
+        if rng.random() < NO_SHOW_SHARE:
+            return
+
+        pick, rate = rng.random(), VISIT_PROFILES[-1][1]
+        for share, mean_rate in VISIT_PROFILES:
+            if pick < share:
+                rate = mean_rate
+                break
+            pick -= share
+        rate = min(rng.gammavariate(4, rate / 4), 6.5)
+        chance = min(rate / 7 * self.max_weight / self.mean_weight, 1.0)
+
+        lifetime = int(rng.expovariate(1 / (CHURN_MONTHS * MONTH_DAYS)))
+        last_day = min(joined.toordinal() + lifetime, self.today.toordinal())
+        ordinal = max(joined.toordinal(), self.first_day.toordinal() - 1)
+
+        summary = SimpleNamespace(total_visits=0, first_visit_date=None, last_visit_date=None,
+                                  current_streak=0, longest_streak=0, visits_this_month=0)
+        stamp = datetime.utcfromtimestamp
+        while True:
+            ordinal += _visit_gap(rng, chance)
+            if ordinal > last_day:
+                break
+            # date.weekday() of an ordinal: day 1 (0001-01-01) was a Monday
+            if rng.random() * self.max_weight > WEEKDAY_WEIGHTS[(ordinal - 1) % 7]:
+                continue
+            info = self._day(ordinal)
+            entry_ts = self._moment(info)
+            if entry_ts > self.now_ts or entry_ts < registered_ts:
+                continue
+            exit_ts = entry_ts + max(20, int(rng.gauss(*VISIT_MINUTES))) * 60
+            entry_time = stamp(entry_ts).isoformat(' ')
+            self.entries.append((
+                user_id,
+                info[1],
+                entry_time,
+                stamp(exit_ts).isoformat(' ') if exit_ts <= self.now_ts else None,
+                entry_time,
+                self.location,
+            ))
+            MemberStats.record_visit(summary, info[0])
+
+        if summary.total_visits:
+            self.visit_count += summary.total_visits
+            self.stats.append((
+                user_id, summary.total_visits, summary.first_visit_date.isoformat(),
+                summary.last_visit_date.isoformat(), summary.current_streak,
+                summary.longest_streak, summary.visits_this_month,
+            ))
+
+    def flush(self):
+        # Parents first: entry_logs / member_stats reference users.
+        # Entries in time order append to the day / time indexes
+        self.entries.sort(key=itemgetter(2))
+        _insert(self.conn, 'users', USER_COLUMNS, self.users)
+        _insert(self.conn, 'entry_logs', ENTRY_COLUMNS, self.entries)
+        _insert(self.conn, 'member_stats', STATS_COLUMNS, self.stats)
+        self.conn.commit()
+
+    def run(self, first_id):
+        for user_id in range(first_id, first_id + self.members):
+            self.member(user_id)
+            if len(self.entries) >= BATCH_SIZE or len(self.users) >= BATCH_SIZE:
+                self.flush()
+        self.flush()
+
+
+def generate(conn, members, months, seed, location):
+    """
+    Insert synthetic members and visits
+
+    Returns:
+        int: Number of entry_logs rows written
+    """
+    existing = conn.execute(text(
+        "SELECT COUNT(*) FROM users WHERE membership_id LIKE 'SYN-%' AND location = :location"
+    ), {'location': location}).scalar()
+    if existing:
+        print(f'✗ {existing} synthetic members already in {location}; run "purge {location}" first')
+        sys.exit(1)
+
+    if conn.dialect.name == 'sqlite':
+        # Bulk load: no fsync per batch, room for the index pages
+        conn.exec_driver_sql('PRAGMA synchronous = OFF')
+        conn.exec_driver_sql('PRAGMA cache_size = -262144')
+
+    first_id = (conn.execute(text('SELECT MAX(id) FROM users')).scalar() or 0) + 1
+    generator = Generator(conn, members, months, seed, location)
+    generator.run(first_id)
+    return generator.visit_count
+
+
+def purge(conn, location):
+    """Delete the synthetic members of a location and their rows"""
+    synthetic = "SELECT id FROM users WHERE membership_id LIKE 'SYN-%' AND location = :location"
+    params = {'location': location}
+    for table in ('entry_logs', 'member_stats', 'subscriptions'):
+        conn.execute(text(f'DELETE FROM {table} WHERE user_id IN ({synthetic})'), params)
+    deleted = conn.execute(text(
+        "DELETE FROM users WHERE membership_id LIKE 'SYN-%' AND location = :location"
+    ), params).rowcount
+    conn.commit()
+    return deleted
+
+
+def main(args):
+    if not args or (args[0] != 'purge' and not args[0].isdigit()):
+        print(__doc__)
+        sys.exit(1)
+
+    app = create_app(init_schema=False)
+
+    with app.app_context():
+        if args[0] == 'purge':
+            location = args[1] if len(args) > 1 else app.config['DEFAULT_LOCATION']
+        else:
+            members = int(args[0])
+            months = int(args[1]) if len(args) > 1 else 12
+            seed = int(args[2]) if len(args) > 2 else 1
+            location = args[3] if len(args) > 3 else app.config['DEFAULT_LOCATION']
+
+        if location not in app.config['LOCATIONS']:
+            print(f'✗ Unknown location: {location}')
+            sys.exit(1)
+
+        with use_location(location), db.session.get_bind().connect() as conn:
+            started = time.perf_counter()
+            if args[0] == 'purge':
+                print(f'✓ Removed {purge(conn, location)} synthetic members from {location}')
+            else:
+                visits = generate(conn, members, months, seed, location)
+                elapsed = time.perf_counter() - started
+                print(f'✓ {members} members, {visits} check-ins over {months} months '
+                      f'in {location} ({elapsed:.1f}s, {(members + visits) / elapsed:,.0f} rows/s)')
+
+        # Cached dashboards / analytics were computed from the old data
+        get_cache().invalidate(f'dashboard:{location}')
+        get_cache().invalidate('analytics')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
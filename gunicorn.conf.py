@@ -0,0 +1,53 @@
+"""
+Gunicorn settings for the production server
+- gunicorn -c gunicorn.conf.py wsgi:app
+- Every value can be overridden from the environment (WEB_*)
+- Threaded workers: Server-Sent Events dashboards hold a thread each
+  for as long as they are open, so sync workers would starve
+- preload_app imports the application once in the master; workers fork
+  from it (faster boot, shared memory) and open their own DB connections
+- Graceful restart: `kill -HUP <master>` replaces workers after they
+  finish in-flight requests. With preload_app, new code needs a new
+  master: `kill -USR2 <master>` then `kill -QUIT <old master>`
+"""
+import multiprocessing
+import os
+
+
+bind = os.getenv('WEB_BIND', '0.0.0.0:8000')
+
+# Workers: CPU-bound share; threads: requests waiting on MySQL / SSE
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('WEB_THREADS', '4'))
+worker_class = 'gthread'
+
+preload_app = os.getenv('WEB_PRELOAD', '1') == '1'
+
+# Request deadline and shutdown grace period (seconds)
+timeout = int(os.getenv('WEB_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('WEB_KEEPALIVE', '5'))
+
+# Recycle workers periodically (bounded memory growth); jitter avoids
+# restarting every worker at once
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '5000'))
+max_requests_jitter = int(os.getenv('WEB_MAX_REQUESTS_JITTER', '500'))
+
+accesslog = os.getenv('WEB_ACCESS_LOG', '-')
+errorlog = os.getenv('WEB_ERROR_LOG', '-')
+loglevel = os.getenv('WEB_LOG_LEVEL', 'info')
+proc_name = 'gym-qr'
+
+
+def post_fork(server, worker):
+    """
+    Drop connections inherited from the master
+    - The preloaded app may have opened pools (one per location bind)
+      during startup; a socket shared by two processes corrupts both sessions
+    """
+    from wsgi import app
+    from models import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
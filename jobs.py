@@ -0,0 +1,445 @@
+"""
+Background jobs
+- Heavy admin operations (exports, backfills, QR batch rendering) run on
+  a small thread pool instead of inside a request handler
+- Every job is a row in the `jobs` table (status, progress, result), so
+  any worker can report on it
+- Concurrency limits: JOBS_MAX_WORKERS threads in total, JOB_LIMITS
+  running jobs per job name, JOBS_MAX_QUEUED unfinished jobs per location
+- Cancellation is cooperative: the job stops at its next progress() call
+"""
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app.models import db, Job, MemberStats
+from tenancy import current_location, use_location
+
+
+# Job name -> handler(ctx, **params)
+JOB_HANDLERS = {}
+
+
+def job(name, title=None):
+    """Register a function as a background job handler"""
+    def decorator(f):
+        f.job_title = title or name.replace('_', ' ').title()
+        JOB_HANDLERS[name] = f
+        return f
+    return decorator
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation was requested"""
+
+
+class JobError(Exception):
+    """Job could not be submitted (unknown name, queue full)"""
+
+
+class JobContext:
+    """
+    Handed to a running job
+    - progress() records progress and raises JobCancelled when the job
+      was cancelled (checked in memory, and in the database at most
+      once per second for cancellations from other workers)
+    """
+
+    def __init__(self, runner, job_id, result_dir):
+        self.runner = runner
+        self.job_id = job_id
+        self.result_dir = result_dir
+        self._last_check = 0.0
+
+    def progress(self, done, total=None, message=None):
+        """
+        Report progress
+
+        Args:
+            done (int): Units done (or a percentage when total is None)
+            total (int): Total units
+            message (str): Optional status line
+        """
+        percent = int(done * 100 / total) if total else int(done)
+        percent = min(max(percent, 0), 100)
+
+        values = {'progress': percent, 'updated_at': datetime.utcnow()}
+        if message is not None:
+            values['message'] = message[:255]
+
+        now = time.monotonic()
+        check_db = now - self._last_check >= 1.0
+        if check_db:
+            self._last_check = now
+        cancelled = self.runner.update_job(self.job_id, values, read_cancel=check_db)
+
+        if cancelled or self.runner.cancel_requested(self.job_id):
+            raise JobCancelled()
+
+    def result_file(self, filename):
+        """Path for a file produced by this job"""
+        os.makedirs(self.result_dir, exist_ok=True)
+        return os.path.join(self.result_dir, f'job{self.job_id}_{filename}')
+
+
+class JobRunner:
+    """
+    In-process job runner for one Flask app
+    - submit() persists the job and queues it on the thread pool
+    - Each job runs in its own app context, scoped to the location it
+      was submitted from
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config.get('JOBS_MAX_WORKERS', 2),
+            thread_name_prefix='job'
+        )
+        self._lock = threading.Lock()
+        self._cancelled = set()
+        self._futures = {}
+        self._limits = {}
+
+    def _limit(self, name):
+        with self._lock:
+            if name not in self._limits:
+                limit = self.app.config.get('JOB_LIMITS', {}).get(name, 1)
+                self._limits[name] = threading.BoundedSemaphore(limit)
+            return self._limits[name]
+
+    # ----- submission -----
+
+    def submit(self, name, params=None, created_by=None):
+        """
+        Persist and queue a job (call inside a request / app context)
+
+        Returns:
+            Job: The queued job
+
+        Raises:
+            JobError: Unknown job name or too many unfinished jobs
+        """
+        if name not in JOB_HANDLERS:
+            raise JobError(f'Unknown job: {name}')
+
+        max_queued = self.app.config.get('JOBS_MAX_QUEUED', 20)
+        unfinished = Job.query.filter(Job.status.in_(('queued', 'running'))).count()
+        if unfinished >= max_queued:
+            raise JobError(f'Too many unfinished jobs ({unfinished}); try again later')
+
+        new_job = Job(name=name, params=json.dumps(params or {}),
+                      status='queued', created_by=created_by)
+        db.session.add(new_job)
+        db.session.commit()
+
+        future = self.executor.submit(self._run, new_job.id, current_location())
+        with self._lock:
+            self._futures[new_job.id] = future
+        return new_job
+
+    def cancel(self, job_record):
+        """
+        Request cancellation
+        - Queued jobs in this process are dropped before they start
+        - Running jobs stop at their next progress() call
+        """
+        if job_record.is_finished:
+            return False
+
+        with self._lock:
+            self._cancelled.add(job_record.id)
+            future = self._futures.get(job_record.id)
+
+        if job_record.status == 'queued' and future is not None and future.cancel():
+            self._finish(job_record.id, 'cancelled', message='Cancelled before start')
+        else:
+            job_record.cancel_requested = True
+            db.session.commit()
+        return True
+
+    def cancel_requested(self, job_id):
+        with self._lock:
+            return job_id in self._cancelled
+
+    # ----- bookkeeping (own transactions, never the job's session) -----
+
+    def update_job(self, job_id, values, read_cancel=False):
+        """
+        Update a job row in a separate transaction
+
+        Returns:
+            bool: cancel_requested flag when read_cancel is set
+        """
+        table = Job.__table__
+        with db.session.get_bind(mapper=Job).begin() as conn:
+            conn.execute(table.update().where(table.c.id == job_id).values(**values))
+            if read_cancel:
+                return bool(conn.execute(
+                    db.select(table.c.cancel_requested).where(table.c.id == job_id)
+                ).scalar())
+        return False
+
+    def _update_if(self, job_id, condition, values):
+        """
+        Update a job row only while condition holds (separate transaction)
+
+        Returns:
+            bool: True if this call changed the row
+        """
+        table = Job.__table__
+        with db.session.get_bind(mapper=Job).begin() as conn:
+            changed = conn.execute(table.update().where(table.c.id == job_id, condition).values(**values))
+            return changed.rowcount == 1
+
+    def _finish(self, job_id, status, **values):
+        now = datetime.utcnow()
+        values.update(status=status, finished_at=now, updated_at=now)
+        if status == 'succeeded':
+            values['progress'] = 100
+        self.update_job(job_id, values)
+
+    # ----- execution -----
+
+    def _run(self, job_id, location):
+        with self.app.app_context(), use_location(location):
+            try:
+                self._execute(job_id)
+            finally:
+                db.session.remove()
+                with self._lock:
+                    self._futures.pop(job_id, None)
+                    self._cancelled.discard(job_id)
+
+    def _execute(self, job_id):
+        job_record = db.session.get(Job, job_id)
+        if job_record is None:
+            return
+        name = job_record.name
+        params = json.loads(job_record.params or '{}')
+        cancelled = job_record.cancel_requested
+        db.session.rollback()
+
+        if cancelled or self.cancel_requested(job_id):
+            self._finish(job_id, 'cancelled', message='Cancelled before start')
+            return
+
+        with self._limit(name):
+            now = datetime.utcnow()
+            # Claim: a job re-queued by recover_stale() runs only once
+            if not self._update_if(job_id, Job.__table__.c.status == 'queued',
+                                   {'status': 'running', 'started_at': now, 'updated_at': now}):
+                return
+            ctx = JobContext(self, job_id, self.app.config.get('JOBS_RESULT_DIR'))
+
+            try:
+                result = JOB_HANDLERS[name](ctx, **params) or {}
+                db.session.commit()
+            except JobCancelled:
+                db.session.rollback()
+                self._finish(job_id, 'cancelled', message='Cancelled')
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.exception('Job %s (%s) failed', job_id, name)
+                self._finish(job_id, 'failed', message=str(e)[:255],
+                             error=traceback.format_exc())
+            else:
+                result_path = result.pop('file', None)
+                self._finish(job_id, 'succeeded', message='Done',
+                             result=json.dumps(result, default=str),
+                             result_path=result_path)
+
+    def recover_stale(self):
+        """
+        Recover jobs abandoned by a stopped worker
+        - Running jobs whose progress was not updated for JOBS_STALE_SECONDS
+          are marked failed
+        - Queued jobs not started within JOBS_STALE_SECONDS (their worker
+          stopped before running them) are queued again in this process;
+          only one worker wins each job
+
+        Returns:
+            int: Jobs failed or re-queued
+        """
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=self.app.config.get('JOBS_STALE_SECONDS', 900))
+        stale = Job.query.filter(Job.status == 'running', Job.updated_at < cutoff).all()
+        for job_record in stale:
+            job_record.status = 'failed'
+            job_record.message = 'Interrupted (worker stopped)'
+            job_record.finished_at = now
+        if stale:
+            db.session.commit()
+
+        table = Job.__table__
+        waiting = Job.query.filter(Job.status == 'queued', Job.updated_at < cutoff).all()
+        db.session.rollback()
+        requeued = 0
+        for job_record in waiting:
+            with self._lock:
+                if job_record.id in self._futures:
+                    # Still waiting for a thread here
+                    continue
+            if self._update_if(job_record.id, (table.c.status == 'queued') & (table.c.updated_at < cutoff),
+                               {'updated_at': now, 'message': 'Re-queued (worker stopped)'}):
+                future = self.executor.submit(self._run, job_record.id, job_record.location)
+                with self._lock:
+                    self._futures[job_record.id] = future
+                requeued += 1
+        return len(stale) + requeued
+
+
+def init_jobs(app):
+    """Create the job runner for an app"""
+    if not app.config.get('JOBS_RESULT_DIR'):
+        app.config['JOBS_RESULT_DIR'] = os.path.join(app.instance_path, 'job_results')
+    app.extensions['jobs'] = JobRunner(app)
+
+
+def get_runner():
+    """Job runner of the current app"""
+    return current_app.extensions['jobs']
+
+
+# ============================================================
+# BUILT-IN JOBS
+# ============================================================
+
+@job('export_not_entered', 'Export inactive members (CSV)')
+def export_not_entered(ctx, days=1, age_min=None, age_max=None):
+    """CSV of members with no entry in the last N days"""
+    from reports import not_entered_query, stream_csv
+
+    query = not_entered_query(inactive_days=int(days or 1), age_min=age_min, age_max=age_max)
+    total = query.order_by(None).count()
+    path = ctx.result_file('not_entered.csv')
+
+    chunk_size = 1000
+    with open(path, 'w', newline='') as fh:
+        for done, chunk in enumerate(stream_csv(query, chunk_size=chunk_size), start=1):
+            fh.write(chunk)
+            ctx.progress(min(done * chunk_size, total), total, f'{min(done * chunk_size, total)} of {total} rows')
+
+    return {'rows': total, 'file': path}
+
+
+class _VisitCounters:
+    """
+    MemberStats attendance counters without ORM instrumentation
+    - Same record_visit(); days fed in order never query the database
+    """
+    record_visit = MemberStats.record_visit
+    reset_counters = MemberStats.reset_counters
+
+    def __init__(self):
+        self.reset_counters()
+
+
+@job('rebuild_member_stats', 'Rebuild member attendance summaries')
+def rebuild_member_stats(ctx, batch_size=500):
+    """
+    Recompute member_stats from entry_logs for every member
+    - One grouped pass over entry_logs (distinct user / day, in order)
+      folded into in-memory counters, then one query per batch to load
+      and update the stored rows
+    """
+    from app.models import User, EntryLog
+
+    summaries = {}
+    visit_days = db.session.query(EntryLog.user_id, EntryLog.entry_date).group_by(
+        EntryLog.user_id, EntryLog.entry_date
+    ).order_by(EntryLog.user_id, EntryLog.entry_date)
+    for user_id, visit_date in visit_days.yield_per(10000):
+        summary = summaries.get(user_id)
+        if summary is None:
+            summary = summaries[user_id] = _VisitCounters()
+        summary.record_visit(visit_date)
+
+    empty = _VisitCounters()
+    user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id)]
+    total = len(user_ids)
+
+    for start in range(0, total, batch_size):
+        batch = user_ids[start:start + batch_size]
+        stored = {stats.user_id: stats for stats in MemberStats.query.filter(MemberStats.user_id.in_(batch))}
+        for user_id in batch:
+            stats = stored.get(user_id)
+            if stats is None:
+                stats = MemberStats(user_id=user_id)
+                db.session.add(stats)
+            summary = summaries.get(user_id, empty)
+            for column in MemberStats.COUNTERS:
+                setattr(stats, column, getattr(summary, column))
+        db.session.commit()
+        done = min(start + batch_size, total)
+        ctx.progress(done, total, f'{done} of {total} members')
+
+    return {'members': total}
+
+
+@job('render_qr_codes', 'Render QR codes for every location (ZIP)')
+def render_qr_codes(ctx, base_url=None):
+    """ZIP of the registration, entry and exit QR codes as PNG files"""
+    import zipfile
+    from io import BytesIO
+    from utils import QRCodeGenerator
+
+    base_url = base_url or current_app.config['PUBLIC_URL']
+    kinds = (('registration', '/register/'), ('entry', '/entry/'), ('exit', '/entry/exit'))
+    locations = list(current_app.config.get('LOCATIONS', {}) or [current_location()])
+    total = len(locations) * len(kinds)
+    path = ctx.result_file('qr_codes.zip')
+    files = []
+
+    with zipfile.ZipFile(path, 'w') as archive:
+        for location in locations:
+            for kind, endpoint in kinds:
+                url = QRCodeGenerator.build_url(base_url, endpoint, location)
+                buffer = BytesIO()
+                QRCodeGenerator.generate_qr_code(url).save(buffer, format='PNG')
+                files.append(f'{kind}_qr_{location}.png')
+                archive.writestr(files[-1], buffer.getvalue())
+                ctx.progress(len(files), total, f'Rendered {kind} QR for {location}')
+
+    return {'files': files, 'file': path}
+
+
+@job('purge_audit_log', 'Purge audit events older than the retention period')
+def purge_audit_log(ctx, batch_size=5000):
+    """Delete audit events before today - AUDIT_RETENTION_DAYS, oldest day first"""
+    import businessday
+    from app.models import AuditEvent
+
+    retention = current_app.config.get('AUDIT_RETENTION_DAYS', 0)
+    if not retention:
+        return {'deleted': 0, 'message': 'AUDIT_RETENTION_DAYS is 0 (keep forever)'}
+
+    cutoff = businessday.today() - timedelta(days=retention)
+    total = AuditEvent.query.filter(AuditEvent.day < cutoff).count()
+    deleted = 0
+    while True:
+        ids = [row[0] for row in db.session.query(AuditEvent.id).filter(
+            AuditEvent.day < cutoff
+        ).order_by(AuditEvent.day).limit(batch_size)]
+        if not ids:
+            break
+        AuditEvent.query.filter(AuditEvent.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+        ctx.progress(deleted, total, f'{deleted} of {total} events')
+
+    return {'deleted': deleted, 'before': cutoff.isoformat()}
+
+
+@job('send_missed_visit_reminders', 'Send missed-visit reminders')
+def send_missed_visit_reminders(ctx, batch_size=None):
+    """Remind members with no visit in NOTIFY_INACTIVE_DAYS (once per absence, see notifications.py)"""
+    from notifications import send_reminders
+
+    return send_reminders(batch_size=batch_size, progress=ctx.progress)
@@ -0,0 +1,188 @@
+"""
+Offline kiosk support
+- Only kiosk devices (X-Kiosk-Token from KIOSK_TOKENS) and admin
+  sessions may download the snapshot or upload scans
+- The kiosk page keeps a local member snapshot: salted hashes of every
+  mobile number and membership ID -> the member's opaque kiosk_ref, so
+  scans are validated on the device while the network is down
+- The salt (KIOSK_HASH_SALT) is a server secret entered on the device
+  at setup; snapshots carry no salt, names or member ids
+- Mobile numbers are hashed in canonical form (mobile_e164); the kiosk
+  normalizes what is typed the same way (phones.normalize_phone)
+- Snapshots are versioned by the highest member id of the location;
+  kiosks ask for the members added since their version (delta) instead
+  of downloading the whole list again
+- Scans queued on the device are replayed in batches through
+  CheckinService, with the time they were scanned
+"""
+import hashlib
+import hmac
+import time
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, g, jsonify, request, session
+
+import audit
+import businessday
+from admin_auth import current_admin_valid
+from app.models import db, User
+from services import CheckinService, ServiceError
+
+
+# Members for snapshots (and the fallback member index)
+# Snapshot row: [kiosk_ref, mobile hash, membership ID hash]
+MEMBER_COLUMNS = (User.id, User.name, User.kiosk_ref, User.mobile_e164, User.mobile_number,
+                  User.membership_id)
+
+
+def kiosk_device():
+    """
+    Name of the kiosk making the request
+    - X-Kiosk-Token must match a KIOSK_TOKENS entry; without the header
+      a valid admin session qualifies ('admin:<username>')
+
+    Returns:
+        str: Device name, or None if the request is not authorized
+    """
+    token = request.headers.get('X-Kiosk-Token')
+    if token:
+        for device, expected in current_app.config.get('KIOSK_TOKENS', {}).items():
+            if hmac.compare_digest(token.encode(), expected.encode()):
+                return device
+        return None
+    if current_admin_valid():
+        return f'admin:{session.get("admin_username")}'
+    return None
+
+
+def kiosk_required(f):
+    """Decorator: 401 unless the request comes from a kiosk device or an admin"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.kiosk_device = kiosk_device()
+        if g.kiosk_device is None:
+            return jsonify({'error': 'Kiosk token or admin login required'}), 401
+        if not current_app.config.get('KIOSK_HASH_SALT'):
+            return jsonify({'error': 'Offline kiosk is not configured (KIOSK_HASH_SALT)'}), 503
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def member_hash(identifier, salt=None):
+    """
+    Hash a mobile number or membership ID the way the kiosk does
+    - Trimmed and upper-cased, SHA-256 of "<salt>:<identifier>",
+      first 16 hex characters
+    """
+    salt = current_app.config['KIOSK_HASH_SALT'] if salt is None else salt
+    normalized = (identifier or '').strip().upper()
+    return hashlib.sha256(f'{salt}:{normalized}'.encode()).hexdigest()[:16]
+
+
+def snapshot_version():
+    """Current snapshot version of the location (highest member id)"""
+    return db.session.query(db.func.max(User.id)).scalar() or 0
+
+
+def member_snapshot(since=0):
+    """
+    Members to send to a kiosk
+
+    Args:
+        since (int): Version the kiosk already holds (0 = none)
+
+    Returns:
+        tuple: (envelope dict, rows iterable, row serializer)
+            envelope: version, full (kiosk must drop its members first)
+    """
+    version = snapshot_version()
+    full = since <= 0 or since > version
+    salt = current_app.config['KIOSK_HASH_SALT']
+
+    query = db.session.query(*MEMBER_COLUMNS).filter(User.kiosk_ref.isnot(None))
+    if not full:
+        query = query.filter(User.id > since)
+    rows = query.order_by(User.id).yield_per(1000)
+
+    def serialize(row):
+        return [row.kiosk_ref,
+                member_hash(row.mobile_e164 or row.mobile_number, salt),
+                member_hash(row.membership_id, salt)]
+
+    return {'version': version, 'full': full}, rows, serialize
+
+
+def _scan_time(value, now, max_age):
+    """
+    Client epoch milliseconds -> (UTC datetime, business day of the scan)
+
+    Returns:
+        tuple or None: None when missing / malformed or older than max_age seconds
+    """
+    try:
+        timestamp = float(value) / 1000
+    except (TypeError, ValueError):
+        return None
+    if timestamp < now - max_age:
+        return None
+    # Clock drift on the device: never record a scan in the future
+    timestamp = min(timestamp, now)
+    at = datetime.utcfromtimestamp(timestamp)
+    return at, businessday.business_day(at)
+
+
+def process_scans(scans, key='user_id'):
+    """
+    Replay queued kiosk scans
+
+    Args:
+        scans (list): [{'id', key, 'kind': 'checkin'|'exit', 'scanned_at'}]
+            scanned_at is epoch milliseconds from the device clock
+        key (str): 'ref' for scans from kiosk devices (opaque kiosk_ref),
+            'user_id' for the server's own fallback journal
+
+    Returns:
+        list: [{'id', 'status': 'ok' or a ServiceError code, 'message'}],
+              one per scan in order (ok scans add the member's 'name');
+              every scan is final (the kiosk drops it)
+    """
+    now = time.time()
+    max_age = current_app.config.get('KIOSK_MAX_SCAN_AGE_HOURS', 12) * 3600
+
+    column, value_type = (User.kiosk_ref, str) if key == 'ref' else (User.id, int)
+    wanted = {scan.get(key) for scan in scans if isinstance(scan.get(key), value_type)}
+    users = {getattr(user, column.key): user for user in User.query.filter(column.in_(wanted))} if wanted else {}
+
+    results = []
+    for scan in scans:
+        result = {'id': scan.get('id'), 'status': 'ok', 'message': None}
+        results.append(result)
+
+        user = users.get(scan.get(key))
+        when = _scan_time(scan.get('scanned_at'), now, max_age)
+        kind = scan.get('kind', 'checkin')
+
+        rejected = 'exit_rejected' if kind == 'exit' else 'checkin_rejected'
+
+        if user is None:
+            result.update(status='not_found', message='User Not Found / Not Registered.')
+            subject = f'user #{scan.get(key)}' if key == 'user_id' else 'unknown kiosk member'
+            audit.record(rejected, reason='not_found', subject=subject)
+            continue
+        if when is None or kind not in ('checkin', 'exit'):
+            result.update(status='invalid', message='Scan is malformed or too old to record')
+            audit.record(rejected, user_id=user.id, reason='invalid')
+            continue
+
+        at, day = when
+        result['name'] = user.name
+        try:
+            if kind == 'checkin':
+                CheckinService.check_in(user, today=day, at=at)
+            else:
+                CheckinService.check_out(user, today=day, at=at)
+        except ServiceError as e:
+            result.update(status=e.code or 'error', message=e.message)
+
+    return results
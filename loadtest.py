@@ -0,0 +1,437 @@
+"""
+Check-in Load Test
+==================
+
+Start the application under gunicorn with several worker processes,
+fire concurrent check-in scans at /entry/, and verify the daily check-in
+rule ("one check-in per member per day") end to end.
+
+Usage:
+    python loadtest.py [options]
+
+    python loadtest.py                                  # temporary SQLite, 1-256 clients
+    python loadtest.py --workers 4 --threads 8 --clients 1,16,64
+    python loadtest.py --database-url mysql+pymysql://gym:pw@localhost/gym_load
+
+Options:
+    --clients 1,2,4,...     Concurrent clients per round (default 1,2,4,8,16,32,64,128,256)
+    --scans N               Distinct-member scans per round (default 400)
+    --bursts N              Duplicate bursts per round (default 20)
+    --workers N             gunicorn worker processes (default 4)
+    --threads N             Threads per worker (default 4)
+    --members N             Synthetic members to generate (default 8000)
+    --database-url URL      Use this (already migrated) stand-in database
+    --csv PATH              Also write the results as CSV
+    --keep                  Keep the temporary directory (database, server logs)
+
+Every round uses members that have not checked in today, in two phases:
+- distinct: `--scans` scans, each of a different member, spread over the
+  clients -> latency percentiles and throughput
+- duplicate: `--bursts` times, all clients scan the same member at once
+  (released together by a barrier, so the scans race on different
+  workers and threads)
+
+Checks, after all rounds:
+- every scanned member has exactly one entry_logs row for today (and no
+  member / day has two)
+- every member got exactly one "Entry Successful" response; the others
+  were told "Already Checked In"
+- no 5xx responses or connection errors
+
+Exit status 1 when a check fails.
+
+- Without --database-url a fresh SQLite database (WAL mode) is created
+  in a temporary directory, migrated and filled with generate_data.py
+  (one month of visits); members who already visited today are skipped
+- With --database-url the database must be migrated and hold enough
+  synthetic members (`python generate_data.py <members> 1`); the test
+  adds today's check-ins for them. Never point it at production
+- Rate limiting is off for the server under test; the client is a
+  threaded keep-alive HTTP client, so on a small machine it competes with
+  the server for CPU (see DEPLOYMENT.md, Throughput)
+"""
+import argparse
+import csv
+import http.client
+import os
+import secrets
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+from sqlalchemy import create_engine, text
+
+import businessday
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CLIENTS = '1,2,4,8,16,32,64,128,256'
+LOCATION = 'main'
+
+
+class Client:
+    """One keep-alive HTTP connection per client thread"""
+
+    def __init__(self, port, timeout=60):
+        self.port = port
+        self.timeout = timeout
+        self.conn = None
+
+    def post(self, path, form):
+        """
+        POST a form, reconnecting once if the server closed the connection
+
+        Returns:
+            tuple: (status, Set-Cookie header or '', seconds)
+        """
+        body = urlencode(form)
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=self.timeout)
+            started = time.perf_counter()
+            try:
+                self.conn.request('POST', path, body, headers)
+                response = self.conn.getresponse()
+                response.read()
+            except (ConnectionError, http.client.HTTPException):
+                # Keep-alive connection closed by the server between requests
+                self.close()
+                if attempt == 2:
+                    raise
+                continue
+            elapsed = time.perf_counter() - started
+            if response.getheader('Connection', '').lower() == 'close':
+                self.close()
+            return response.status, response.getheader('Set-Cookie') or '', elapsed
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class FlashReader:
+    """Read the flash message of a response from its session cookie"""
+
+    def __init__(self, secret_key):
+        app = Flask(__name__)
+        app.secret_key = secret_key
+        self.serializer = SecureCookieSessionInterface().get_signing_serializer(app)
+
+    def category(self, set_cookie):
+        """Flash category of a response ('success', 'warning', ...), or None"""
+        cookie = SimpleCookie()
+        cookie.load(set_cookie)
+        if 'session' not in cookie:
+            return None
+        flashes = self.serializer.loads(cookie['session'].value).get('_flashes') or []
+        return flashes[-1][0] if flashes else None
+
+
+class Server:
+    """gunicorn (gunicorn.conf.py, wsgi:app) on a free local port"""
+
+    def __init__(self, directory, database_url, secret_key, workers, threads):
+        self.directory = directory
+        self.port = _free_port()
+        self.env = dict(
+            os.environ,
+            APP_ENV='production',
+            DATABASE_URL=database_url,
+            SECRET_KEY=secret_key,
+            SESSION_COOKIE_SECURE='0',
+            RATELIMIT_ENABLED='0',
+            PROFILING_ENABLED='0',
+            DB_FALLBACK_JOURNAL_DIR=os.path.join(directory, 'checkin_journal'),
+            WEB_BIND=f'127.0.0.1:{self.port}',
+            WEB_WORKERS=str(workers),
+            WEB_THREADS=str(threads),
+            # Every request is a scan; recycling mid-round would skew latencies
+            WEB_MAX_REQUESTS='0',
+            WEB_ACCESS_LOG=os.path.join(directory, 'access.log'),
+            WEB_ERROR_LOG=os.path.join(directory, 'error.log'),
+            WEB_LOG_LEVEL='warning',
+        )
+        self.process = None
+
+    def start(self, wait_seconds=60):
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+            cwd=ROOT, env=self.env
+        )
+        deadline = time.monotonic() + wait_seconds
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'gunicorn exited ({self.process.returncode}); see {self.env["WEB_ERROR_LOG"]}')
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+                conn.request('GET', '/entry/')
+                if conn.getresponse().status == 200:
+                    conn.close()
+                    return
+                conn.close()
+            except OSError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f'gunicorn did not answer within {wait_seconds}s; see {self.env["WEB_ERROR_LOG"]}')
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _run(args, env):
+    subprocess.run([sys.executable] + args, cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def prepare_database(directory, members):
+    """Fresh SQLite database: migrated, WAL mode, synthetic members"""
+    database_url = f'sqlite:///{os.path.join(directory, "loadtest.db")}'
+    env = dict(os.environ, APP_ENV='development', DATABASE_URL=database_url)
+    _run(['migrations.py', 'upgrade'], env)
+    # Readers do not wait for the writer (as a production SQLite install would be set up)
+    engine = create_engine(database_url)
+    with engine.connect() as conn:
+        conn.exec_driver_sql('PRAGMA journal_mode = WAL')
+    engine.dispose()
+    _run(['generate_data.py', str(members), '1'], env)
+    return database_url
+
+
+def fresh_members(engine, today):
+    """Synthetic members without a check-in today, in id order"""
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT u.mobile_number FROM users u "
+            "WHERE u.membership_id LIKE 'SYN-%' AND u.location = :location "
+            "AND NOT EXISTS (SELECT 1 FROM entry_logs e WHERE e.user_id = u.id AND e.entry_date = :today) "
+            "ORDER BY u.id"
+        ), {'location': LOCATION, 'today': today}).fetchall()
+    return [row.mobile_number for row in rows]
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def summarize(clients, phase, results, elapsed):
+    """Latency / throughput row of one phase"""
+    latencies = sorted(seconds * 1000 for _, _, seconds in results)
+    statuses = Counter(status for _, status, _ in results)
+    return {
+        'clients': clients,
+        'phase': phase,
+        'requests': len(results),
+        'req_per_s': round(len(results) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(_percentile(latencies, 0.50), 1),
+        'p95_ms': round(_percentile(latencies, 0.95), 1),
+        'p99_ms': round(_percentile(latencies, 0.99), 1),
+        'max_ms': round(latencies[-1], 1) if latencies else 0.0,
+        'errors': sum(count for status, count in statuses.items() if status is None or status >= 500),
+    }
+
+
+class LoadTest:
+    """Rounds of distinct and duplicate scans against a running server"""
+
+    def __init__(self, port, flash_reader):
+        self.port = port
+        self.flash_reader = flash_reader
+        # mobile number -> flash categories of its responses
+        self.outcomes = {}
+        self.errors = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = Client(self.port)
+        return client
+
+    def scan(self, mobile_number):
+        """One check-in scan; returns (mobile_number, status or None, seconds)"""
+        try:
+            status, set_cookie, seconds = self._client().post('/entry/', {'mobile_number': mobile_number})
+        except OSError as e:
+            with self._lock:
+                self.errors.append(f'{mobile_number}: {e}')
+            return mobile_number, None, 0.0
+        category = self.flash_reader.category(set_cookie) if status == 302 else f'http {status}'
+        with self._lock:
+            self.outcomes.setdefault(mobile_number, []).append(category)
+        return mobile_number, status, seconds
+
+    def distinct(self, clients, members):
+        """Each member scanned once, `clients` scans in flight"""
+        with ThreadPoolExecutor(clients) as pool:
+            started = time.perf_counter()
+            results = list(pool.map(self.scan, members))
+            return results, time.perf_counter() - started
+
+    def duplicate(self, clients, members):
+        """For each member in turn, all clients scan it at the same moment"""
+        barrier = threading.Barrier(clients)
+        results = []
+
+        def client(member_list):
+            for mobile_number in member_list:
+                barrier.wait()
+                result = self.scan(mobile_number)
+                with self._lock:
+                    results.append(result)
+
+        threads = [threading.Thread(target=client, args=(members,)) for _ in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - started
+
+
+def verify(engine, today, load_test):
+    """
+    Check the daily check-in rule for every scanned member
+
+    Returns:
+        list: Failure descriptions (empty when everything holds)
+    """
+    failures = []
+    with engine.connect() as conn:
+        duplicates = conn.execute(text(
+            'SELECT user_id, entry_date, COUNT(*) AS n FROM entry_logs '
+            'GROUP BY user_id, entry_date HAVING COUNT(*) > 1'
+        )).fetchall()
+        rows = dict(conn.execute(text(
+            'SELECT u.mobile_number, COUNT(e.id) FROM users u '
+            'LEFT JOIN entry_logs e ON e.user_id = u.id AND e.entry_date = :today '
+            "WHERE u.membership_id LIKE 'SYN-%' AND u.location = :location "
+            'GROUP BY u.mobile_number'
+        ), {'location': LOCATION, 'today': today}).fetchall())
+
+    if duplicates:
+        failures.append(f'{len(duplicates)} member/day pairs with several entry_logs rows, '
+                        f'e.g. user {duplicates[0].user_id} on {duplicates[0].entry_date} x{duplicates[0].n}')
+    missing = [number for number in load_test.outcomes if rows.get(number, 0) != 1]
+    if missing:
+        failures.append(f'{len(missing)} scanned members without exactly one entry today, e.g. {missing[0]}')
+    told = {number: categories.count('success') for number, categories in load_test.outcomes.items()}
+    wrong = [number for number, successes in told.items() if successes != 1]
+    if wrong:
+        failures.append(f'{len(wrong)} members got {told[wrong[0]]} "Entry Successful" responses '
+                        f'(e.g. {wrong[0]}: {load_test.outcomes[wrong[0]]})')
+    if load_test.errors:
+        failures.append(f'{len(load_test.errors)} connection errors, e.g. {load_test.errors[0]}')
+    return failures
+
+
+COLUMNS = ('clients', 'phase', 'requests', 'req_per_s', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'errors')
+
+
+def print_row(row):
+    print('  '.join(f'{row[column]:>9}' for column in COLUMNS), flush=True)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Check-in load test (see module docstring)')
+    parser.add_argument('--clients', default=DEFAULT_CLIENTS)
+    parser.add_argument('--scans', type=int, default=400)
+    parser.add_argument('--bursts', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--members', type=int, default=8000)
+    parser.add_argument('--database-url')
+    parser.add_argument('--csv')
+    parser.add_argument('--keep', action='store_true')
+    options = parser.parse_args(argv)
+    levels = [int(value) for value in options.clients.split(',') if value.strip()]
+
+    directory = tempfile.mkdtemp(prefix='gym-loadtest-')
+    secret_key = secrets.token_hex(16)
+    server = None
+    try:
+        if options.database_url:
+            database_url = options.database_url
+        else:
+            print(f'Preparing SQLite database with {options.members} members in {directory} ...')
+            database_url = prepare_database(directory, options.members)
+
+        engine = create_engine(database_url)
+        today = businessday.business_day(datetime.utcnow())
+        members = fresh_members(engine, today)
+        needed = len(levels) * (options.scans + options.bursts)
+        if len(members) < needed:
+            print(f'✗ {len(members)} synthetic members without a check-in today, {needed} needed')
+            return 1
+
+        server = Server(directory, database_url, secret_key, options.workers, options.threads)
+        server.start()
+        print(f'gunicorn: {options.workers} workers × {options.threads} threads on port {server.port}\n')
+
+        load_test = LoadTest(server.port, FlashReader(secret_key))
+        rows = []
+        print_row({column: column for column in COLUMNS})
+        for clients in levels:
+            batch, members = members[:options.scans], members[options.scans:]
+            results, elapsed = load_test.distinct(clients, batch)
+            rows.append(summarize(clients, 'distinct', results, elapsed))
+            batch, members = members[:options.bursts], members[options.bursts:]
+            results, elapsed = load_test.duplicate(clients, batch)
+            rows.append(summarize(clients, 'duplicate', results, elapsed))
+            print_row(rows[-2])
+            print_row(rows[-1])
+
+        failures = verify(engine, today, load_test)
+        failures += [f'{row["errors"]} failed requests at {row["clients"]} clients ({row["phase"]})'
+                     for row in rows if row['errors']]
+        engine.dispose()
+
+        if options.csv:
+            with open(options.csv, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=COLUMNS)
+                writer.writeheader()
+                writer.writerows(rows)
+
+        scanned = len(load_test.outcomes)
+        if failures:
+            print(f'\n✗ Daily check-in rule violated ({scanned} members scanned):')
+            for failure in failures:
+                print(f'  - {failure}')
+            return 1
+        print(f'\n✓ {scanned} members scanned: one entry and one "Entry Successful" each, no errors')
+        return 0
+    finally:
+        if server is not None:
+            server.stop()
+        if options.keep:
+            print(f'Kept {directory}')
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
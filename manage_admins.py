@@ -0,0 +1,93 @@
+"""
+Admin Account Management
+========================
+
+Manage admin panel accounts (stored in the `admins` table with hashed passwords).
+
+Usage:
+    python manage_admins.py list
+    python manage_admins.py create <username> [owner|staff]
+    python manage_admins.py passwd <username>
+    python manage_admins.py disable <username>
+    python manage_admins.py enable <username>
+
+Changing a password or disabling an account ends all of its open sessions
+(within ADMIN_SESSION_CACHE_TTL seconds on other workers).
+"""
+import sys
+from getpass import getpass
+
+from app import create_app
+from app.models import db, Admin
+from admin_auth import session_cache
+
+
+def prompt_password():
+    password = getpass('Password: ')
+    if len(password) < 8:
+        print('✗ Password must be at least 8 characters')
+        sys.exit(1)
+    if password != getpass('Repeat password: '):
+        print('✗ Passwords do not match')
+        sys.exit(1)
+    return password
+
+
+def get_admin(username):
+    admin = Admin.query.filter_by(username=username).first()
+    if admin is None:
+        print(f'✗ Admin not found: {username}')
+        sys.exit(1)
+    return admin
+
+
+def main(args):
+    if not args:
+        print(__doc__)
+        sys.exit(1)
+
+    command = args[0]
+    app = create_app(init_schema=False)
+
+    with app.app_context():
+        if command == 'list':
+            for admin in Admin.query.order_by(Admin.username).all():
+                state = 'active' if admin.is_active else 'disabled'
+                print(f'{admin.username:<20} {admin.role:<8} {state}')
+
+        elif command == 'create' and len(args) >= 2:
+            role = args[2] if len(args) > 2 else 'staff'
+            if role not in Admin.ROLES:
+                print(f'✗ Role must be one of: {", ".join(Admin.ROLES)}')
+                sys.exit(1)
+            if Admin.query.filter_by(username=args[1]).first():
+                print(f'✗ Admin already exists: {args[1]}')
+                sys.exit(1)
+            admin = Admin(username=args[1], role=role, session_version=0)
+            admin.set_password(prompt_password())
+            db.session.add(admin)
+            db.session.commit()
+            print(f'✓ Created {role} account: {admin.username}')
+
+        elif command == 'passwd' and len(args) >= 2:
+            admin = get_admin(args[1])
+            admin.set_password(prompt_password())
+            db.session.commit()
+            session_cache.invalidate(admin.id)
+            print(f'✓ Password changed: {admin.username}')
+
+        elif command in ('disable', 'enable') and len(args) >= 2:
+            admin = get_admin(args[1])
+            admin.is_active = command == 'enable'
+            admin.session_version += 1
+            db.session.commit()
+            session_cache.invalidate(admin.id)
+            print(f'✓ Account {command}d: {admin.username}')
+
+        else:
+            print(__doc__)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,84 @@
+"""
+Membership plans and check-in eligibility
+- Plans define a validity window and an optional visit quota
+- Each member's current entitlement (valid from / until, visits left)
+  is denormalized into member_stats, which the check-in path already
+  loads by primary key: eligibility costs no extra query or join
+- The subscriptions table is only read when a member is denied
+  (to pick up a renewal) or when a plan is assigned
+"""
+from datetime import timedelta
+
+from flask import current_app
+
+import businessday
+from app.models import db, MemberStats, Subscription
+
+
+ELIGIBILITY_MESSAGES = {
+    'no_plan': 'No active membership plan. Please contact the front desk.',
+    'not_started': 'Your membership plan has not started yet.',
+    'expired': 'Your membership plan has expired. Please renew at the front desk.',
+    'no_visits': 'No visits left on your membership plan. Please renew at the front desk.',
+}
+
+
+def check_eligibility(stats, today=None):
+    """
+    Check whether a member may check in
+    
+    Args:
+        stats (MemberStats): The member's summary row
+        today (date): Day of the check-in
+    
+    Returns:
+        str: None if eligible, otherwise a message for the member
+    """
+    today = today or businessday.today()
+    require_plan = current_app.config.get('MEMBERSHIP_REQUIRED', False)
+
+    reason = stats.eligibility(today, require_plan=require_plan)
+    if reason is None:
+        return None
+
+    # Slow path: a renewal may have started since the row was written
+    if stats.refresh_entitlement(today) is not None:
+        reason = stats.eligibility(today, require_plan=require_plan)
+    return ELIGIBILITY_MESSAGES[reason] if reason else None
+
+
+def assign_plan(user_id, plan, start_date=None):
+    """
+    Subscribe a member to a plan
+    - Without a start date, a renewal starts the day after the current
+      subscription ends (or today if there is none)
+    
+    Args:
+        user_id (int): Member id
+        plan (Plan): Plan to subscribe to
+        start_date (date): First valid day
+    
+    Returns:
+        Subscription: The new subscription (not committed)
+    """
+    today = businessday.today()
+    stats = MemberStats.for_user(user_id)
+
+    if start_date is None:
+        start_date = today
+        if stats.valid_until and stats.valid_until >= today and stats.eligibility(today) is None:
+            start_date = stats.valid_until + timedelta(days=1)
+
+    subscription = Subscription(
+        user_id=user_id,
+        plan_id=plan.id,
+        start_date=start_date,
+        end_date=start_date + timedelta(days=plan.duration_days - 1),
+        visit_quota=plan.visit_quota,
+        visits_used=0
+    )
+    db.session.add(subscription)
+    db.session.flush()
+
+    stats.refresh_entitlement(today)
+    return subscription
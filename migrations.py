@@ -0,0 +1,357 @@
+"""
+Versioned database migrations
+==============================
+
+Schema changes are applied here instead of db.create_all() on every boot.
+Each migration runs once per database and is recorded in `schema_version`.
+
+Usage:
+    python migrations.py upgrade     # apply pending migrations
+    python migrations.py status      # show applied / pending versions
+
+Migrations are written to be safe on databases created by older versions
+of the app with db.create_all() (they check for existing tables, columns
+and indexes before changing anything).
+"""
+import sys
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from app.models import db
+
+
+# ============================================================
+# HELPERS
+# ============================================================
+
+def _has_column(conn, table, column):
+    return column in {c['name'] for c in inspect(conn).get_columns(table)}
+
+
+def _index(conn, table, name):
+    for index in inspect(conn).get_indexes(table):
+        if index['name'] == name:
+            return index
+    return None
+
+
+def _create_index(conn, table, name, columns, unique=False):
+    """Create an index unless one with the same name exists"""
+    if _index(conn, table, name) is None:
+        keyword = 'UNIQUE INDEX' if unique else 'INDEX'
+        conn.execute(text(f'CREATE {keyword} {name} ON {table} ({", ".join(columns)})'))
+
+
+def _as_datetime(value):
+    """DATETIME value from a raw SELECT (SQLite returns text)"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _drop_index(conn, table, name):
+    if _index(conn, table, name) is not None:
+        if conn.dialect.name == 'mysql':
+            conn.execute(text(f'DROP INDEX {name} ON {table}'))
+        else:
+            conn.execute(text(f'DROP INDEX {name}'))
+
+
+# ============================================================
+# MIGRATIONS
+# ============================================================
+
+def m0001_create_tables(conn):
+    """Create all tables that do not exist yet"""
+    db.metadata.create_all(conn, checkfirst=True)
+
+
+def m0002_location_columns(conn):
+    """Add the gym location (tenant) column to users and entry_logs"""
+    from config import APP_CONFIG
+    default = APP_CONFIG.DEFAULT_LOCATION
+
+    for table in ('users', 'entry_logs'):
+        if not _has_column(conn, table, 'location'):
+            conn.execute(text(
+                f"ALTER TABLE {table} ADD COLUMN location VARCHAR(20) NOT NULL DEFAULT '{default}'"
+            ))
+
+    _create_index(conn, 'users', 'idx_user_location', ['location'])
+    _create_index(conn, 'entry_logs', 'idx_location_date', ['location', 'entry_date'])
+
+
+def m0003_unique_daily_entry(conn):
+    """
+    Enforce one check-in per user per day in the database
+    - Replaces idx_user_date with a UNIQUE index on (user_id, entry_date)
+    """
+    index = _index(conn, 'entry_logs', 'idx_user_date')
+    if index is not None and index.get('unique'):
+        return
+
+    duplicates = conn.execute(text(
+        'SELECT COUNT(*) FROM (SELECT user_id, entry_date FROM entry_logs '
+        'GROUP BY user_id, entry_date HAVING COUNT(*) > 1) AS d'
+    )).scalar()
+    if duplicates:
+        raise RuntimeError(
+            f'{duplicates} user/day pairs have more than one entry; '
+            'remove the duplicates before running this migration'
+        )
+
+    if conn.dialect.name == 'mysql':
+        # Single statement: the index also backs the user_id foreign key
+        conn.execute(text(
+            'ALTER TABLE entry_logs DROP INDEX idx_user_date, '
+            'ADD UNIQUE INDEX idx_user_date (user_id, entry_date)'
+        ))
+    else:
+        _drop_index(conn, 'entry_logs', 'idx_user_date')
+        _create_index(conn, 'entry_logs', 'idx_user_date', ['user_id', 'entry_date'], unique=True)
+
+
+def m0004_admin_accounts(conn):
+    """Create the admins table for hashed multi-admin accounts"""
+    from app.models import Admin
+    Admin.__table__.create(conn, checkfirst=True)
+
+
+def m0005_membership_plans(conn):
+    """Create plans/subscriptions and add entitlement columns to member_stats"""
+    from app.models import Plan, Subscription
+    Plan.__table__.create(conn, checkfirst=True)
+    Subscription.__table__.create(conn, checkfirst=True)
+
+    columns = {
+        'subscription_id': 'INTEGER',
+        'valid_from': 'DATE',
+        'valid_until': 'DATE',
+        'visits_remaining': 'INTEGER',
+    }
+    for column, column_type in columns.items():
+        if not _has_column(conn, 'member_stats', column):
+            conn.execute(text(f'ALTER TABLE member_stats ADD COLUMN {column} {column_type} NULL'))
+
+
+def m0006_jobs(conn):
+    """Create the jobs table for the background job runner"""
+    from app.models import Job
+    Job.__table__.create(conn, checkfirst=True)
+
+
+def m0007_registration_day(conn):
+    """
+    Add users.registration_day (gym-local business day of registration)
+    - Backfilled in batches from registration_date; day filters then use
+      idx_user_registration_day instead of DATE(registration_date)
+    """
+    from businessday import business_day
+
+    if not _has_column(conn, 'users', 'registration_day'):
+        conn.execute(text('ALTER TABLE users ADD COLUMN registration_day DATE NULL'))
+
+    batch_size = 1000
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            'SELECT id, registration_date FROM users '
+            'WHERE registration_day IS NULL AND id > :last_id ORDER BY id LIMIT :limit'
+        ), {'last_id': last_id, 'limit': batch_size}).fetchall()
+        if not rows:
+            break
+        conn.execute(
+            text('UPDATE users SET registration_day = :day WHERE id = :id'),
+            [{'id': row[0], 'day': business_day(_as_datetime(row[1]))} for row in rows]
+        )
+        last_id = rows[-1][0]
+
+    _create_index(conn, 'users', 'idx_user_registration_day', ['location', 'registration_day'])
+
+
+def m0008_covering_indexes(conn):
+    """
+    Index the admin listings' sort orders
+    - users (location, registration_date) and (location, name);
+      entry_logs (location, entry_date, entry_time);
+      subscriptions (user_id, start_date)
+    - Drops the indexes these make redundant (created first, so the
+      subscriptions.user_id foreign key always keeps an index on MySQL)
+    """
+    _create_index(conn, 'users', 'idx_user_location_registered', ['location', 'registration_date'])
+    _create_index(conn, 'users', 'idx_user_location_name', ['location', 'name'])
+    _create_index(conn, 'entry_logs', 'idx_location_date_time', ['location', 'entry_date', 'entry_time'])
+    _create_index(conn, 'subscriptions', 'idx_subscription_user_start', ['user_id', 'start_date'])
+
+    _drop_index(conn, 'entry_logs', 'idx_location_date')
+    _drop_index(conn, 'subscriptions', 'idx_subscription_user_end')
+
+
+def m0009_mobile_e164(conn):
+    """
+    Add users.mobile_e164 (canonical mobile number, see phones.py)
+    - Backfilled in batches; numbers that normalize to one already taken
+      by an older member, or do not normalize, stay NULL and are listed
+      by `python phones.py report`
+    - UNIQUE index created after the backfill
+    """
+    import phones
+
+    if not _has_column(conn, 'users', 'mobile_e164'):
+        conn.execute(text('ALTER TABLE users ADD COLUMN mobile_e164 VARCHAR(16) NULL'))
+
+    phones.backfill(conn)
+    _create_index(conn, 'users', 'idx_user_mobile_e164', ['mobile_e164'], unique=True)
+
+
+def m0010_audit_events(conn):
+    """Create the audit_events table (append-only audit log, see audit.py)"""
+    from app.models import AuditEvent
+    AuditEvent.__table__.create(conn, checkfirst=True)
+
+
+def m0011_notifications(conn):
+    """Create the notifications table (missed-visit reminders, see notifications.py)"""
+    from app.models import Notification
+    Notification.__table__.create(conn, checkfirst=True)
+
+
+def m0012_subscription_plan_fk(conn):
+    """
+    Drop the subscriptions -> plans foreign key
+    - Plans are global (default database) while subscriptions are stored
+      in the member's location shard, so the key cannot hold on a shard
+    - SQLite does not enforce foreign keys here (no PRAGMA), nothing to do
+    """
+    if conn.dialect.name != 'mysql':
+        return
+    for fk in inspect(conn).get_foreign_keys('subscriptions'):
+        if fk['referred_table'] == 'plans' and fk.get('name'):
+            conn.execute(text(f'ALTER TABLE subscriptions DROP FOREIGN KEY {fk["name"]}'))
+
+
+def m0013_kiosk_ref(conn):
+    """
+    Add users.kiosk_ref (opaque member reference for kiosk snapshots)
+    - Backfilled in batches with random values; UNIQUE index created
+      after the backfill
+    """
+    from app.models import new_kiosk_ref
+
+    if not _has_column(conn, 'users', 'kiosk_ref'):
+        conn.execute(text('ALTER TABLE users ADD COLUMN kiosk_ref VARCHAR(16) NULL'))
+
+    batch_size = 1000
+    last_id = 0
+    while True:
+        ids = conn.execute(text(
+            'SELECT id FROM users WHERE kiosk_ref IS NULL AND id > :last_id ORDER BY id LIMIT :limit'
+        ), {'last_id': last_id, 'limit': batch_size}).scalars().all()
+        if not ids:
+            break
+        conn.execute(
+            text('UPDATE users SET kiosk_ref = :ref WHERE id = :id'),
+            [{'id': user_id, 'ref': new_kiosk_ref()} for user_id in ids]
+        )
+        last_id = ids[-1]
+
+    _create_index(conn, 'users', 'idx_user_kiosk_ref', ['kiosk_ref'], unique=True)
+
+
+# Ordered list of (version, migration function)
+MIGRATIONS = [
+    (1, m0001_create_tables),
+    (2, m0002_location_columns),
+    (3, m0003_unique_daily_entry),
+    (4, m0004_admin_accounts),
+    (5, m0005_membership_plans),
+    (6, m0006_jobs),
+    (7, m0007_registration_day),
+    (8, m0008_covering_indexes),
+    (9, m0009_mobile_e164),
+    (10, m0010_audit_events),
+    (11, m0011_notifications),
+    (12, m0012_subscription_plan_fk),
+    (13, m0013_kiosk_ref),
+]
+
+
+# ============================================================
+# RUNNER
+# ============================================================
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_version ('
+        'version INTEGER PRIMARY KEY, '
+        'description VARCHAR(200) NOT NULL, '
+        'applied_at DATETIME NOT NULL)'
+    ))
+
+
+def applied_versions(engine):
+    """Return the set of migration versions applied to a database"""
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        return {row[0] for row in conn.execute(text('SELECT version FROM schema_version'))}
+
+
+def pending_migrations(engine):
+    """Return the migrations not yet applied to a database"""
+    applied = applied_versions(engine)
+    return [(version, fn) for version, fn in MIGRATIONS if version not in applied]
+
+
+def upgrade(engine, verbose=False):
+    """
+    Apply all pending migrations to one database
+    - Each migration runs in its own transaction together with its
+      schema_version row
+
+    Returns:
+        list: Versions applied
+    """
+    applied = []
+    for version, fn in pending_migrations(engine):
+        with engine.begin() as conn:
+            fn(conn)
+            conn.execute(
+                text('INSERT INTO schema_version (version, description, applied_at) '
+                     'VALUES (:version, :description, :applied_at)'),
+                {'version': version, 'description': fn.__doc__.strip().splitlines()[0],
+                 'applied_at': datetime.utcnow()}
+            )
+        applied.append(version)
+        if verbose:
+            print(f'✓ Applied migration {version:04d}: {fn.__name__}')
+    return applied
+
+
+def upgrade_all(app, verbose=False):
+    """Apply pending migrations to the default database and every location shard"""
+    with app.app_context():
+        engines = [db.engine] + [
+            db.engines[key] for key in app.config.get('LOCATION_BINDS', {}).values()
+        ]
+        return [upgrade(engine, verbose=verbose) for engine in engines]
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'upgrade'
+    flask_app = create_app(init_schema=False)
+
+    if command == 'upgrade':
+        upgrade_all(flask_app, verbose=True)
+        print('✓ Database schema is up to date')
+    elif command == 'status':
+        with flask_app.app_context():
+            done = applied_versions(db.engine)
+        for version, fn in MIGRATIONS:
+            state = 'applied' if version in done else 'pending'
+            print(f'{version:04d} {fn.__name__:<32} {state}')
+    else:
+        print(f'Unknown command: {command} (use upgrade or status)')
+        sys.exit(1)
@@ -0,0 +1,6 @@
+"""
+SQLAlchemy database models for the Gym QR Application
+- The models live in app/models.py; this module re-exports them for the
+  top-level blueprints (routes_*.py) and scripts
+"""
+from app.models import db, User, EntryLog, MemberStats, Admin, Plan, Subscription, Job, AuditEvent, Notification  # noqa: F401
@@ -0,0 +1,453 @@
+"""
+Missed-visit reminders
+======================
+
+Members with no visit in the last NOTIFY_INACTIVE_DAYS days get a
+reminder ("we haven't seen you for 16 days"). A run walks the members of
+one location in id order, NOTIFY_BATCH_SIZE at a time, and for each batch:
+
+- selects the inactive members with the same anti-join as the "not
+  entered" report (no entry_logs row in the window, idx_user_date), plus
+  their last visit from member_stats (primary key lookup)
+- skips members already reminded about this absence: the notifications
+  table is UNIQUE on (user_id, kind, lapse_day), where lapse_day is the
+  last visit (or the registration day); a new visit starts a new absence
+- records the batch as 'pending' with one executemany INSERT, delivers
+  the messages on at most NOTIFY_CONCURRENCY threads (no database work
+  there), then records the outcome with one executemany UPDATE
+
+Transient delivery errors are retried NOTIFY_MAX_ATTEMPTS times with
+exponential backoff; a message still failing, or failing with an error
+that cannot be retried (refused recipient, 4xx response), stays 'failed'
+and is not retried by later runs. Messages left 'pending' by an interrupted run are
+sent by the next one. Run one reminder job at a time per location.
+
+Transports (NOTIFY_TRANSPORT):
+- file: one JSON line per message in NOTIFY_OUTBOX_DIR/outbox-<day>.jsonl
+  (default; a stand-in for development and for checking a run)
+- smtp: mail to <number>@NOTIFY_SMTP_DOMAIN (email-to-SMS gateways); for
+  local testing run a debug server, e.g.
+  `python -m aiosmtpd -n -l localhost:1025`
+- webhook: JSON POST {to, text, user_id, location} to NOTIFY_WEBHOOK_URL
+  (SMS provider); 429 and 5xx responses are retried
+Others can be added to TRANSPORTS.
+
+Runs as the send_missed_visit_reminders background job (/admin/jobs), or
+from cron for every location:
+
+Usage:
+    python notifications.py                  # inactive for NOTIFY_INACTIVE_DAYS
+    python notifications.py 30               # inactive for 30 days
+    python notifications.py 30 --dry-run     # count only, send nothing
+"""
+import json
+import os
+import smtplib
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.message import EmailMessage
+
+from flask import current_app
+from sqlalchemy import and_, bindparam, func
+from sqlalchemy.exc import IntegrityError
+
+import businessday
+from app.models import db, User, MemberStats, Notification
+from phones import normalize_phone
+from tenancy import current_location
+
+
+KIND = 'missed_visit'
+
+
+class TransportError(Exception):
+    """Delivery failed; retry is False when trying again cannot help"""
+
+    def __init__(self, message, retry=True):
+        super().__init__(message)
+        self.retry = retry
+
+
+# ============================================================
+# TRANSPORTS
+# ============================================================
+
+class FileTransport:
+    """Append messages as JSON lines to a daily outbox file"""
+
+    name = 'file'
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, app):
+        return cls(app.config.get('NOTIFY_OUTBOX_DIR') or os.path.join(app.instance_path, 'notifications'))
+
+    def send(self, message):
+        line = json.dumps(dict(message, sent_at=datetime.utcnow().isoformat(timespec='seconds')))
+        path = os.path.join(self.directory, f'outbox-{datetime.utcnow():%Y%m%d}.jsonl')
+        try:
+            with self._lock:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(path, 'a') as f:
+                    f.write(line + '\n')
+        except OSError as e:
+            raise TransportError(str(e))
+
+    def close(self):
+        pass
+
+
+class SMTPTransport:
+    """Mail each message to <number>@domain over one SMTP connection per thread"""
+
+    name = 'smtp'
+
+    def __init__(self, host, port, sender, domain, timeout=10.0):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.domain = domain
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    @classmethod
+    def from_config(cls, app):
+        config = app.config
+        return cls(config.get('NOTIFY_SMTP_HOST', 'localhost'), config.get('NOTIFY_SMTP_PORT', 1025),
+                   config.get('NOTIFY_SMTP_SENDER', 'gym@localhost'),
+                   config.get('NOTIFY_SMTP_DOMAIN', 'sms.localhost'),
+                   timeout=config.get('NOTIFY_TIMEOUT_SECONDS', 10.0))
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def send(self, message):
+        mail = EmailMessage()
+        mail['From'] = self.sender
+        mail['To'] = f'{message["to"].lstrip("+")}@{self.domain}'
+        mail['Subject'] = 'Gym reminder'
+        mail.set_content(message['text'])
+        try:
+            self._connection().send_message(mail)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise TransportError(f'Recipient refused: {mail["To"]}', retry=False) from e
+        except (smtplib.SMTPException, OSError) as e:
+            # Reconnect on the next attempt
+            self._local.conn = None
+            raise TransportError(str(e) or e.__class__.__name__) from e
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+
+
+class WebhookTransport:
+    """POST each message as JSON to an SMS provider endpoint"""
+
+    name = 'webhook'
+
+    def __init__(self, url, token=None, timeout=10.0):
+        if not url:
+            raise ValueError('NOTIFY_WEBHOOK_URL is not set')
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+
+    @classmethod
+    def from_config(cls, app):
+        return cls(app.config.get('NOTIFY_WEBHOOK_URL'), app.config.get('NOTIFY_WEBHOOK_TOKEN'),
+                   timeout=app.config.get('NOTIFY_TIMEOUT_SECONDS', 10.0))
+
+    def send(self, message):
+        request = urllib.request.Request(
+            self.url, data=json.dumps(message).encode(), method='POST',
+            headers={'Content-Type': 'application/json'}
+        )
+        if self.token:
+            request.add_header('Authorization', f'Bearer {self.token}')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            raise TransportError(f'HTTP {e.code}', retry=e.code == 429 or e.code >= 500) from e
+        except OSError as e:
+            raise TransportError(str(e)) from e
+
+    def close(self):
+        pass
+
+
+# NOTIFY_TRANSPORT -> transport class (from_config(app), send(message), close())
+TRANSPORTS = {
+    'file': FileTransport,
+    'smtp': SMTPTransport,
+    'webhook': WebhookTransport,
+}
+
+
+def get_transport(name=None):
+    """Transport selected by name or NOTIFY_TRANSPORT for the current app"""
+    name = name or current_app.config.get('NOTIFY_TRANSPORT', 'file')
+    if name not in TRANSPORTS:
+        raise ValueError(f'Unknown NOTIFY_TRANSPORT: {name} (expected one of {", ".join(TRANSPORTS)})')
+    return TRANSPORTS[name].from_config(current_app._get_current_object())
+
+
+def deliver(transport, message, max_attempts=3, retry_seconds=0.5):
+    """
+    Send one message, retrying transient errors with exponential backoff
+
+    Returns:
+        tuple: (attempts counted, error message or None); an error that
+               cannot be retried counts as max_attempts, so later runs
+               skip the message like an invalid number
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            transport.send(message)
+            return attempt, None
+        except TransportError as e:
+            if not e.retry:
+                return max_attempts, str(e)[:255]
+            if attempt == max_attempts:
+                return attempt, str(e)[:255]
+            time.sleep(retry_seconds * 2 ** (attempt - 1))
+    return 0, 'No attempts'
+
+
+# ============================================================
+# REMINDER RUN
+# ============================================================
+
+def _candidates(inactive_days, today):
+    """Inactive members of the current location with their lapse day, for keyset batches"""
+    from reports import not_entered_query
+
+    return not_entered_query(inactive_days=inactive_days, today=today).order_by(None).outerjoin(
+        MemberStats, MemberStats.user_id == User.id
+    ).add_columns(
+        User.mobile_e164,
+        func.coalesce(MemberStats.last_visit_date, User.registration_day).label('lapse_day')
+    )
+
+
+def _existing(user_ids):
+    """(user_id, lapse_day) -> (status, attempts) of earlier reminders for these members"""
+    rows = db.session.query(
+        Notification.user_id, Notification.lapse_day, Notification.status, Notification.attempts
+    ).filter(Notification.user_id.in_(user_ids), Notification.kind == KIND)
+    return {(row.user_id, row.lapse_day): (row.status, row.attempts) for row in rows}
+
+
+def _claim(rows):
+    """
+    Insert 'pending' rows for new reminders
+
+    Returns:
+        set: (user_id, lapse_day) keys inserted; a key inserted meanwhile
+             by another run is left to that run
+    """
+    table = Notification.__table__
+    try:
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+        return {(row['user_id'], row['lapse_day']) for row in rows}
+    except IntegrityError:
+        db.session.rollback()
+
+    claimed = set()
+    for row in rows:
+        try:
+            db.session.execute(table.insert(), row)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            continue
+        claimed.add((row['user_id'], row['lapse_day']))
+    return claimed
+
+
+def _record(outcomes):
+    """Store delivery outcomes (one executemany UPDATE on the unique key)"""
+    table = Notification.__table__
+    db.session.execute(
+        table.update().where(and_(
+            table.c.user_id == bindparam('b_user_id'),
+            table.c.kind == KIND,
+            table.c.lapse_day == bindparam('b_lapse_day')
+        )).values(
+            status=bindparam('status'),
+            attempts=table.c.attempts + bindparam('tries'),
+            transport=bindparam('transport'),
+            recipient=bindparam('recipient'),
+            error=bindparam('error'),
+            sent_at=bindparam('sent_at')
+        ),
+        outcomes
+    )
+    db.session.commit()
+
+
+def send_reminders(inactive_days=None, today=None, transport=None, batch_size=None,
+                   dry_run=False, progress=None):
+    """
+    Remind the current location's members with no visit in the last N days
+
+    Args:
+        inactive_days (int): N (defaults to NOTIFY_INACTIVE_DAYS, at least 2)
+        today (date): Reference business day (defaults to today)
+        transport: Transport instance (defaults to NOTIFY_TRANSPORT)
+        batch_size (int): Members per batch (defaults to NOTIFY_BATCH_SIZE)
+        dry_run (bool): Count the messages that would be sent; write and send nothing
+        progress (callable): progress(done, total, message) after each batch
+
+    Returns:
+        dict: inactive, sent, failed, skipped (already reminded) counts
+    """
+    config = current_app.config
+    inactive_days = max(int(inactive_days or config.get('NOTIFY_INACTIVE_DAYS', 14)), 2)
+    today = today or businessday.today()
+    batch_size = batch_size or config.get('NOTIFY_BATCH_SIZE', 500)
+    max_attempts = config.get('NOTIFY_MAX_ATTEMPTS', 3)
+    retry_seconds = config.get('NOTIFY_RETRY_SECONDS', 0.5)
+    template = config.get('NOTIFY_MESSAGE')
+    location = current_location()
+
+    owned_transport = transport is None and not dry_run
+    if owned_transport:
+        transport = get_transport()
+    executor = None if dry_run else ThreadPoolExecutor(
+        max_workers=config.get('NOTIFY_CONCURRENCY', 8), thread_name_prefix='notify'
+    )
+
+    counts = {'inactive': 0, 'sent': 0, 'failed': 0, 'skipped': 0}
+    query = _candidates(inactive_days, today)
+    max_id = db.session.query(func.max(User.id)).scalar() or 0
+    last_id = 0
+    started = time.monotonic()
+    try:
+        while True:
+            batch = query.filter(User.id > last_id).order_by(User.id).limit(batch_size).all()
+            db.session.rollback()
+            if not batch:
+                break
+            last_id = batch[-1].id
+            counts['inactive'] += len(batch)
+
+            existing = _existing([row.id for row in batch])
+            due = []
+            for row in batch:
+                status, attempts = existing.get((row.id, row.lapse_day), (None, 0))
+                if status == 'sent' or (status == 'failed' and attempts >= max_attempts):
+                    counts['skipped'] += 1
+                else:
+                    due.append((row, status))
+
+            if dry_run:
+                counts['sent'] += len(due)
+            elif due:
+                _send_batch(due, transport, executor, counts, today, template, location,
+                            max_attempts, retry_seconds)
+
+            if progress:
+                progress(last_id, max_id, f'{counts["sent"]} sent, {counts["failed"]} failed, '
+                                          f'{counts["skipped"]} already reminded')
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+        if owned_transport:
+            transport.close()
+
+    counts.update(days=inactive_days, dry_run=dry_run,
+                  seconds=round(time.monotonic() - started, 1))
+    return counts
+
+
+def _send_batch(due, transport, executor, counts, today, template, location,
+                max_attempts, retry_seconds):
+    now = datetime.utcnow()
+    new = [{
+        'location': location, 'user_id': row.id, 'kind': KIND, 'lapse_day': row.lapse_day,
+        'status': 'pending', 'attempts': 0, 'created_at': now,
+    } for row, status in due if status is None]
+    claimed = _claim(new) if new else set()
+
+    messages, outcomes = [], []
+    for row, status in due:
+        key = (row.id, row.lapse_day)
+        if status is None and key not in claimed:
+            counts['skipped'] += 1
+            continue
+        outcome = {'b_user_id': row.id, 'b_lapse_day': row.lapse_day, 'transport': transport.name,
+                   'tries': 0, 'error': None, 'sent_at': None}
+        recipient = row.mobile_e164 or normalize_phone(row.mobile_number)
+        outcome['recipient'] = recipient
+        if recipient is None:
+            outcome.update(status='failed', tries=max_attempts, error='invalid_mobile')
+            outcomes.append(outcome)
+            continue
+        outcomes.append(outcome)
+        messages.append({
+            'user_id': row.id,
+            'location': location,
+            'to': recipient,
+            'text': template.format(name=row.name, first_name=row.name.split()[0] if row.name else '',
+                                    days=(today - row.lapse_day).days),
+        })
+
+    sending = [outcome for outcome in outcomes if 'status' not in outcome]
+    results = executor.map(
+        lambda message: deliver(transport, message, max_attempts, retry_seconds), messages
+    )
+    for outcome, (tries, error) in zip(sending, results):
+        outcome.update(tries=tries, error=error, status='failed' if error else 'sent',
+                       sent_at=None if error else datetime.utcnow())
+
+    for outcome in outcomes:
+        counts['failed' if outcome['status'] == 'failed' else 'sent'] += 1
+    _record(outcomes)
+
+
+def main(args):
+    dry_run = '--dry-run' in args
+    args = [arg for arg in args if arg != '--dry-run']
+    if len(args) > 1 or (args and not args[0].isdigit()):
+        print(__doc__)
+        sys.exit(1)
+
+    from app import create_app
+    from tenancy import use_location
+
+    app = create_app(init_schema=False)
+    with app.app_context():
+        for code in app.config.get('LOCATIONS', {}):
+            with use_location(code):
+                result = send_reminders(inactive_days=int(args[0]) if args else None, dry_run=dry_run)
+            verb = 'would send' if dry_run else 'sent'
+            print(f'✓ {code}: {result["inactive"]} inactive for {result["days"]}+ days, '
+                  f'{verb} {result["sent"]}, failed {result["failed"]}, '
+                  f'already reminded {result["skipped"]} ({result["seconds"]}s)')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
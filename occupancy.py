@@ -0,0 +1,124 @@
+"""
+Live occupancy counter
+- Members currently on the floor, per gym location
+- Kept in memory: +1 on check-in, -1 on exit, for live scans only (this
+  business day, inside the OPEN_VISIT_MAX_MINUTES window); backdated
+  kiosk scans and journal replays are left to reconciliation
+- Reconciled from the database on startup (init_occupancy, every
+  location), at the start of each day and every
+  OCCUPANCY_RECONCILE_SECONDS (catches members who never scan out and
+  check-ins handled by other workers); the interval is checked on read,
+  and every check-in / exit reads the counter for its live update
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+import businessday
+from app.models import db, EntryLog
+from tenancy import current_location, use_location
+
+
+def _max_visit():
+    return timedelta(minutes=current_app.config.get('OPEN_VISIT_MAX_MINUTES', 240))
+
+
+def count_open_visits(today=None, now=None):
+    """
+    COUNT query behind the counter
+    - Today's entries without exit_time that started less than
+      OPEN_VISIT_MAX_MINUTES ago (older ones are assumed to have left)
+    """
+    today = today or businessday.today()
+    now = now or datetime.utcnow()
+    max_visit = _max_visit()
+
+    return db.session.query(db.func.count(EntryLog.id)).filter(
+        EntryLog.entry_date == today,
+        EntryLog.exit_time.is_(None),
+        EntryLog.entry_time > now - max_visit
+    ).scalar()
+
+
+class OccupancyCounter:
+    """In-memory occupancy per location with periodic reconciliation"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._lock = threading.Lock()
+        # location -> [count, day, reconciled_at]
+        self._state = {}
+
+    def _needs_reconcile(self, location, today, interval):
+        state = self._state.get(location)
+        return (
+            state is None
+            or state[1] != today
+            or self.clock() - state[2] >= interval
+        )
+
+    def reconcile(self, location=None, loader=count_open_visits):
+        """Reset the counter from the database"""
+        location = location or current_location()
+        today = businessday.today()
+        count = loader(today=today)
+        with self._lock:
+            self._state[location] = [count, today, self.clock()]
+        return count
+
+    def current(self, location=None):
+        """
+        Members on the floor now
+        - No query unless the counter is due for reconciliation
+        """
+        location = location or current_location()
+        interval = current_app.config.get('OCCUPANCY_RECONCILE_SECONDS', 300)
+        with self._lock:
+            due = self._needs_reconcile(location, businessday.today(), interval)
+            if not due:
+                return self._state[location][0]
+        return self.reconcile(location)
+
+    def _adjust(self, location, amount, today=None, times=()):
+        location = location or current_location()
+        business_today = businessday.today()
+        # Scan of another day or outside the open-visit window (backdated
+        # kiosk scan, journal replay): count_open_visits decides instead
+        if today is not None and today != business_today:
+            return
+        oldest = datetime.utcnow() - _max_visit()
+        if any(at is not None and at <= oldest for at in times):
+            return
+        with self._lock:
+            state = self._state.get(location)
+            # Not seeded yet (or new day): the next read reconciles instead
+            if state is not None and state[1] == business_today:
+                state[0] = max(state[0] + amount, 0)
+
+    def entered(self, location=None, today=None, at=None):
+        """Record a check-in of business day `today` at `at` (UTC; defaults to now)"""
+        self._adjust(location, 1, today, (at,))
+
+    def exited(self, location=None, today=None, at=None, entry_time=None):
+        """Record an exit at `at` closing a visit that started at `entry_time`"""
+        self._adjust(location, -1, today, (at, entry_time))
+
+
+# Shared counter for the whole process
+occupancy = OccupancyCounter()
+
+
+def init_occupancy(app):
+    """Seed the counter of every location (after migrations; skipped while the database is down)"""
+    with app.app_context():
+        for code in app.config.get('LOCATIONS', {}):
+            try:
+                with use_location(code):
+                    occupancy.reconcile(code)
+            except SQLAlchemyError as e:
+                app.logger.warning('Occupancy for %s not reconciled on startup: %s', code, e)
+            finally:
+                db.session.remove()
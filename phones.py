@@ -0,0 +1,215 @@
+"""
+Phone number normalization
+==========================
+
+Members type mobile numbers in many formats ("+91 98765 43210",
+"098765-43210", "9876543210"). All of them are reduced to one canonical
+E.164 form (+<country code><number>), stored in users.mobile_e164
+(UNIQUE), and every equality lookup (registration duplicate check,
+check-in, kiosk, plan assignment) goes through that column.
+
+- Numbers without a country code use PHONE_COUNTRY_CODE and must have
+  PHONE_NATIONAL_DIGITS digits (a leading trunk 0 is dropped)
+- "+" or "00" starts an international number (8-14 digits)
+- users.mobile_number keeps the number for display: national digits
+  for home-country numbers, E.164 otherwise
+
+Usage:
+    python phones.py backfill    # fill mobile_e164 for rows that lack it
+    python phones.py report      # duplicate and invalid numbers
+(each runs on every database: the default one and each location bind)
+
+Legacy rows whose canonical number already belongs to an older member
+keep mobile_e164 NULL (the older member wins lookups); `report` lists
+them so staff can merge or correct the records.
+"""
+import re
+import sys
+
+from flask import current_app, has_app_context
+from sqlalchemy import bindparam, text
+
+from config import APP_CONFIG
+
+
+BATCH_SIZE = 1000
+
+_SEPARATORS = re.compile(r'[\s\-./()]')
+
+
+def _setting(name):
+    if has_app_context():
+        return current_app.config.get(name, getattr(APP_CONFIG, name))
+    return getattr(APP_CONFIG, name)
+
+
+def normalize_phone(value):
+    """
+    Canonical E.164 form of a phone number
+
+    Args:
+        value (str): Number as typed
+
+    Returns:
+        str: '+<digits>', or None when it is not a valid phone number
+    """
+    value = _SEPARATORS.sub('', value or '')
+    if value.startswith('+'):
+        international, digits = True, value[1:]
+    elif value.startswith('00'):
+        international, digits = True, value[2:]
+    else:
+        international, digits = False, value
+
+    if not digits.isdigit():
+        return None
+    if international:
+        return f'+{digits}' if 8 <= len(digits) <= 14 and digits[0] != '0' else None
+
+    country = str(_setting('PHONE_COUNTRY_CODE'))
+    national = _setting('PHONE_NATIONAL_DIGITS')
+    if len(digits) == national + 1 and digits[0] == '0':
+        digits = digits[1:]
+    elif len(digits) == len(country) + national and digits.startswith(country):
+        digits = digits[len(country):]
+    if len(digits) != national or digits[0] == '0':
+        return None
+    return f'+{country}{digits}'
+
+
+def display_phone(e164):
+    """Number for display / users.mobile_number: national digits at home, E.164 abroad"""
+    country = f'+{_setting("PHONE_COUNTRY_CODE")}'
+    if e164.startswith(country) and len(e164) == len(country) + _setting('PHONE_NATIONAL_DIGITS'):
+        return e164[len(country):]
+    return e164
+
+
+# ============================================================
+# BACKFILL AND REPORT (chunked, raw SQL on one connection)
+# ============================================================
+
+def backfill(conn, batch_size=BATCH_SIZE):
+    """
+    Fill users.mobile_e164 where it is NULL, in id order
+    - A number already owned by another member stays NULL (duplicate)
+
+    Returns:
+        tuple: (rows filled, rows left NULL)
+    """
+    filled = skipped = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            'SELECT id, mobile_number FROM users '
+            'WHERE mobile_e164 IS NULL AND id > :last_id ORDER BY id LIMIT :limit'
+        ), {'last_id': last_id, 'limit': batch_size}).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        keys = {row[0]: normalize_phone(row[1]) for row in rows}
+        wanted = sorted({key for key in keys.values() if key})
+        taken = set()
+        if wanted:
+            taken = {row[0] for row in conn.execute(
+                text('SELECT mobile_e164 FROM users WHERE mobile_e164 IN :keys').bindparams(
+                    bindparam('keys', expanding=True)),
+                {'keys': wanted}
+            )}
+
+        updates = []
+        for user_id, key in keys.items():
+            if key and key not in taken:
+                taken.add(key)
+                updates.append({'id': user_id, 'key': key})
+        if updates:
+            conn.execute(text('UPDATE users SET mobile_e164 = :key WHERE id = :id'), updates)
+        filled += len(updates)
+        skipped += len(rows) - len(updates)
+
+    return filled, skipped
+
+
+def duplicate_report(conn, batch_size=BATCH_SIZE):
+    """
+    Members without a canonical number, in chunks
+
+    Yields:
+        dict: id, name, mobile_number, location, e164 (None = invalid),
+              owner (id, name, mobile_number) of the member holding the number
+    """
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            'SELECT id, name, mobile_number, location FROM users '
+            'WHERE mobile_e164 IS NULL AND id > :last_id ORDER BY id LIMIT :limit'
+        ), {'last_id': last_id, 'limit': batch_size}).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+
+        keys = {row[0]: normalize_phone(row[2]) for row in rows}
+        wanted = sorted({key for key in keys.values() if key})
+        owners = {}
+        if wanted:
+            owners = {row[0]: row[1:] for row in conn.execute(
+                text('SELECT mobile_e164, id, name, mobile_number FROM users '
+                     'WHERE mobile_e164 IN :keys').bindparams(bindparam('keys', expanding=True)),
+                {'keys': wanted}
+            )}
+
+        for user_id, name, mobile_number, location in rows:
+            key = keys[user_id]
+            yield {
+                'id': user_id,
+                'name': name,
+                'mobile_number': mobile_number,
+                'location': location,
+                'e164': key,
+                'owner': owners.get(key),
+            }
+
+
+def _print_report(conn, location):
+    duplicates = invalid = 0
+    for row in duplicate_report(conn):
+        member = f'#{row["id"]} {row["name"]} ({row["mobile_number"]}, {row["location"]})'
+        if row['e164'] is None:
+            invalid += 1
+            print(f'INVALID    {member}')
+        elif row['owner']:
+            duplicates += 1
+            owner_id, owner_name, owner_mobile = row['owner']
+            print(f'DUPLICATE  {member} -> same number as #{owner_id} {owner_name} ({owner_mobile})')
+        else:
+            print(f'UNFILLED   {member} (run "backfill")')
+    print(f'{location}: {duplicates} duplicate, {invalid} invalid')
+
+
+def main(args):
+    command = args[0] if args else ''
+    if command not in ('backfill', 'report'):
+        print(__doc__)
+        sys.exit(1)
+
+    from app import create_app
+    from app.models import db, User
+    from tenancy import location_databases, use_location
+
+    app = create_app(init_schema=False)
+    with app.app_context():
+        # Every database: locations with their own bind keep members there
+        for location in location_databases():
+            with use_location(location), db.session.get_bind(mapper=User).connect() as conn:
+                if command == 'backfill':
+                    filled, skipped = backfill(conn)
+                    conn.commit()
+                    print(f'✓ {location}: filled {filled} canonical numbers '
+                          f'({skipped} duplicate or invalid, see "report")')
+                else:
+                    _print_report(conn, location)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
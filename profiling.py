@@ -0,0 +1,243 @@
+"""
+Request profiling (opt-in, PROFILING_ENABLED)
+- Every request records the time spent rendering each template (Flask's
+  before_render_template / template_rendered signals) and running SQL
+  (cursor execute events), so a slow page splits into database,
+  template and everything else; also sent as a Server-Timing header
+- SQL run while a template renders (lazy-loaded relationships) counts
+  as database time and is shown per template, not as template time
+- Per-template and per-endpoint totals are kept in memory (per worker)
+- A sample of requests (PROFILE_SAMPLE_RATE, or ?profile=1 from a
+  logged-in admin) runs under cProfile; stats are written to PROFILE_DIR
+  as <time>-<endpoint>.prof (pstats / snakeviz) with a .json summary
+- Browse both at /admin/profiling
+- Streamed responses are timed until the response object is returned,
+  not until the last chunk is sent
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+from datetime import datetime
+
+from flask import before_render_template, current_app, g, has_request_context, request, session
+from flask import template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class Profiler:
+    """In-memory timing totals and the on-disk cProfile dumps"""
+
+    def __init__(self, directory, sample_rate=0.01, keep=200):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self._lock = threading.Lock()
+        # name -> [renders, total seconds, SQL seconds inside, max seconds]
+        self._templates = {}
+        # endpoint -> [requests, total, db, template, max] (seconds)
+        self._endpoints = {}
+
+    def record_template(self, name, elapsed, db_time):
+        with self._lock:
+            totals = self._templates.setdefault(name, [0, 0.0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += elapsed
+            totals[2] += db_time
+            totals[3] = max(totals[3], elapsed)
+
+    def record_request(self, endpoint, total, db_time, template_time):
+        with self._lock:
+            totals = self._endpoints.setdefault(endpoint, [0, 0.0, 0.0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += total
+            totals[2] += db_time
+            totals[3] += template_time
+            totals[4] = max(totals[4], total)
+
+    def template_stats(self):
+        """Per-template rows (ms, render time including SQL), slowest total first"""
+        with self._lock:
+            rows = [
+                {'template': name, 'renders': count, 'total_ms': total * 1000,
+                 'avg_ms': total * 1000 / count, 'avg_db_ms': db_time * 1000 / count,
+                 'max_ms': peak * 1000}
+                for name, (count, total, db_time, peak) in self._templates.items()
+            ]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def endpoint_stats(self):
+        """Per-endpoint rows (ms averages), slowest total first"""
+        with self._lock:
+            rows = [
+                {'endpoint': name, 'requests': count, 'total_ms': total * 1000,
+                 'avg_ms': total * 1000 / count, 'avg_db_ms': db_time * 1000 / count,
+                 'avg_template_ms': template_time * 1000 / count, 'max_ms': peak * 1000}
+                for name, (count, total, db_time, template_time, peak) in self._endpoints.items()
+            ]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._templates.clear()
+            self._endpoints.clear()
+
+    # ----- cProfile dumps -----
+
+    def save(self, profile, summary):
+        """Write a request's cProfile stats and its summary, then prune old dumps"""
+        os.makedirs(self.directory, exist_ok=True)
+        now = datetime.utcnow()
+        name = f'{now:%Y%m%d-%H%M%S}-{now.microsecond // 1000:03d}-{summary["endpoint"]}'
+        profile.dump_stats(os.path.join(self.directory, f'{name}.prof'))
+        with open(os.path.join(self.directory, f'{name}.json'), 'w') as f:
+            json.dump(dict(summary, name=name, recorded_at=now.isoformat(timespec='seconds')), f)
+        self._prune()
+
+    def _prune(self):
+        names = sorted(f[:-5] for f in os.listdir(self.directory) if f.endswith('.json'))
+        for name in names[:-self.keep] if self.keep else []:
+            for suffix in ('.prof', '.json'):
+                try:
+                    os.remove(os.path.join(self.directory, name + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def dumps(self):
+        """Summaries of the saved dumps, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        summaries = []
+        for filename in sorted(os.listdir(self.directory), reverse=True):
+            if filename.endswith('.json'):
+                try:
+                    with open(os.path.join(self.directory, filename)) as f:
+                        summaries.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return summaries
+
+    def dump_path(self, name):
+        """Path of a saved .prof file, or None (name must be a listed dump)"""
+        if os.sep in name or name.startswith('.'):
+            return None
+        path = os.path.join(self.directory, f'{name}.prof')
+        return path if os.path.exists(path) else None
+
+    def report(self, name, sort='cumulative', limit=60):
+        """pstats text of a saved dump, or None"""
+        path = self.dump_path(name)
+        if path is None:
+            return None
+        out = io.StringIO()
+        stats = pstats.Stats(path, stream=out)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+# ============================================================
+# REQUEST HOOKS
+# ============================================================
+
+def _start_request():
+    g.profile_start = time.perf_counter()
+    g.profile_db = 0.0
+    g.profile_templates = 0.0
+    g.profile_render_starts = []
+
+    profiler = current_app.extensions['profiler']
+    wanted = request.args.get('profile') == '1' and session.get('admin_logged_in')
+    if request.endpoint != 'static' and (wanted or random.random() < profiler.sample_rate):
+        g.cprofile = cProfile.Profile()
+        g.cprofile.enable()
+
+
+def _finish_request(response):
+    start = g.pop('profile_start', None)
+    if start is None:
+        return response
+    total = time.perf_counter() - start
+    profile = g.pop('cprofile', None)
+    if profile is not None:
+        profile.disable()
+
+    endpoint = request.endpoint or 'unmatched'
+    db_time, template_time = g.profile_db, g.profile_templates
+    profiler = current_app.extensions['profiler']
+    profiler.record_request(endpoint, total, db_time, template_time)
+
+    if profile is not None:
+        profiler.save(profile, {
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'db_ms': round(db_time * 1000, 1),
+            'template_ms': round(template_time * 1000, 1),
+        })
+
+    response.headers['Server-Timing'] = (
+        f'db;dur={db_time * 1000:.1f}, tpl;dur={template_time * 1000:.1f}, '
+        f'total;dur={total * 1000:.1f}'
+    )
+    return response
+
+
+def _before_render(sender, template, context, **extra):
+    if 'profile_render_starts' in g:
+        g.profile_render_starts.append((time.perf_counter(), g.profile_db))
+
+
+def _rendered(sender, template, context, **extra):
+    if g.get('profile_render_starts'):
+        started, db_before = g.profile_render_starts.pop()
+        elapsed = time.perf_counter() - started
+        db_time = g.profile_db - db_before
+        g.profile_templates += elapsed - db_time
+        sender.extensions['profiler'].record_template(template.name or '<string>', elapsed, db_time)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'profile_db' in g:
+        conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('profile_query_start')
+    if starts and has_request_context() and 'profile_db' in g:
+        g.profile_db += time.perf_counter() - starts.pop()
+
+
+def init_profiling(app):
+    """Register the profiling hooks on a Flask app (no-op unless PROFILING_ENABLED)"""
+    if not app.config.get('PROFILING_ENABLED'):
+        return
+
+    directory = app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+    app.extensions['profiler'] = Profiler(
+        directory,
+        sample_rate=app.config.get('PROFILE_SAMPLE_RATE', 0.01),
+        keep=app.config.get('PROFILE_KEEP', 200)
+    )
+
+    # Registered before the other extensions: first before_request hook,
+    # last after_request hook, so the totals include them
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def get_profiler():
+    """Profiler of the current app, or None when profiling is off"""
+    return current_app.extensions.get('profiler')
@@ -0,0 +1,225 @@
+"""
+Request rate limiting
+- Sliding window counter per key (e.g. per IP, per username, per member)
+- In-memory backend by default, pluggable shared backend (Redis) for
+  multi-worker / multi-server deployments
+- Rejections return 429 before the view runs, so no SQL is executed
+"""
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+from phones import normalize_phone
+
+
+class MemoryBackend:
+    """
+    Per-process window counters
+    - Two counters per key (current and previous window)
+    - Stale keys are pruned when the table grows past max_keys
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def hit(self, key, window, period):
+        """
+        Count one request in the given window
+
+        Args:
+            key (str): Rate limit key
+            window (int): Window number (time // period)
+            period (int): Window length in seconds
+
+        Returns:
+            tuple: (previous window count, current window count)
+        """
+        with self._lock:
+            entry = self._counters.get(key)
+            if entry is None:
+                if len(self._counters) >= self.max_keys:
+                    self._prune(window)
+                entry = self._counters[key] = [window, 0, 0]
+            elif entry[0] != window:
+                # Roll forward: the current window becomes the previous one
+                entry[2] = entry[1] if entry[0] == window - 1 else 0
+                entry[1] = 0
+                entry[0] = window
+            entry[1] += 1
+            return entry[2], entry[1]
+
+    def _prune(self, window):
+        """Drop keys that have no hits in the current or previous window"""
+        stale = [key for key, entry in self._counters.items() if entry[0] < window - 1]
+        for key in stale:
+            del self._counters[key]
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class RedisBackend:
+    """
+    Shared window counters in Redis (or any Redis-protocol server)
+    - One INCR per request; keys expire after two windows
+    """
+
+    def __init__(self, url, prefix='ratelimit'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('A redis:// RATELIMIT_STORAGE_URL needs the redis package (pip install redis)')
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def hit(self, key, window, period):
+        current_key = f'{self.prefix}:{key}:{window}'
+        previous_key = f'{self.prefix}:{key}:{window - 1}'
+
+        pipe = self.client.pipeline()
+        pipe.incr(current_key)
+        pipe.expire(current_key, period * 2)
+        pipe.get(previous_key)
+        current, _, previous = pipe.execute()
+        return int(previous or 0), int(current)
+
+    def reset(self):
+        for key in self.client.scan_iter(f'{self.prefix}:*'):
+            self.client.delete(key)
+
+
+class RateLimiter:
+    """
+    Sliding window rate limiter
+    - Estimated count = previous window weighted by overlap + current window
+    - O(1) memory per key regardless of request volume
+    """
+
+    def __init__(self, backend=None, clock=time.time):
+        self.backend = backend or MemoryBackend()
+        self.clock = clock
+
+    def hit(self, key, limit, period):
+        """
+        Record a request and check it against the limit
+
+        Args:
+            key (str): Rate limit key
+            limit (int): Allowed requests per period
+            period (int): Window length in seconds
+
+        Returns:
+            tuple: (allowed, retry_after_seconds)
+        """
+        now = self.clock()
+        window = int(now // period)
+        elapsed = (now % period) / period
+
+        previous, current = self.backend.hit(key, window, period)
+
+        estimated = previous * (1 - elapsed) + current
+        if estimated <= limit:
+            return True, 0
+
+        # Time until the weighted previous window has decayed enough
+        if previous:
+            wait = (estimated - limit) / previous * period
+        else:
+            wait = (1 - elapsed) * period
+        return False, max(1, math.ceil(min(wait, period)))
+
+
+def parse_limit(value):
+    """
+    Parse a limit string such as "5/minute" or "100/hour"
+
+    Returns:
+        tuple: (limit, period_seconds)
+    """
+    periods = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+    count, _, unit = value.partition('/')
+    return int(count), periods[unit.strip().rstrip('s')]
+
+
+def client_ip():
+    """Remote address of the client (honours X-Forwarded-For behind a proxy)"""
+    forwarded = request.headers.get('X-Forwarded-For', '')
+    if forwarded and current_app.config.get('RATELIMIT_TRUST_PROXY', False):
+        return forwarded.split(',')[0].strip()
+    return request.remote_addr or 'unknown'
+
+
+def _identifier():
+    """Identifier submitted with the request (mobile, membership ID or username)"""
+    data = request.form if request.form else (request.get_json(silent=True) or {})
+    for field in ('username', 'identifier', 'mobile_number', 'membership_id', 'mobile'):
+        value = (data.get(field) or '').strip()
+        if value:
+            # One bucket per number whatever its format
+            return (normalize_phone(value) or value).lower()
+    return None
+
+
+# Built-in key functions
+KEY_FUNCS = {
+    'ip': client_ip,
+    'identifier': _identifier,
+}
+
+
+def _too_many_requests(retry_after):
+    message = f'Too many requests. Please try again in {retry_after} seconds.'
+    if request.is_json or '/api/' in request.path:
+        response = jsonify({'error': message})
+    else:
+        response = current_app.response_class(message, mimetype='text/plain')
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limit(name, methods=('POST',)):
+    """
+    Decorator applying the configured limits for a named rule
+
+    The rule is read from config RATELIMITS[name], a list of
+    (key_func_name, "count/period") pairs, e.g.:
+        'login': [('ip', '20/minute'), ('identifier', '5/minute')]
+
+    Args:
+        name (str): Rule name
+        methods (tuple): HTTP methods that are limited
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method in methods and current_app.config.get('RATELIMIT_ENABLED', True):
+                limiter = current_app.extensions['ratelimiter']
+                for key_name, limit in current_app.config.get('RATELIMITS', {}).get(name, []):
+                    value = KEY_FUNCS[key_name]()
+                    if value is None:
+                        continue
+                    count, period = parse_limit(limit)
+                    allowed, retry_after = limiter.hit(f'{name}:{key_name}:{value}', count, period)
+                    if not allowed:
+                        return _too_many_requests(retry_after)
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+def init_rate_limiting(app):
+    """Create the limiter for an app from RATELIMIT_STORAGE_URL"""
+    storage_url = app.config.get('RATELIMIT_STORAGE_URL', 'memory://')
+    if storage_url.startswith(('redis://', 'rediss://')):
+        backend = RedisBackend(storage_url)
+    else:
+        backend = MemoryBackend()
+    app.extensions['ratelimiter'] = RateLimiter(backend)
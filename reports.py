@@ -0,0 +1,96 @@
+"""
+Attendance report queries shared by the admin blueprints
+- Members not entered (today or for the last N days)
+- Computed as a LEFT JOIN anti-join on (user_id, entry_date), which uses
+  idx_user_date instead of a NOT IN (subquery) plan
+- Returns lean column rows instead of full User objects
+"""
+import csv
+from io import StringIO
+from datetime import timedelta
+
+import businessday
+from app.models import db, User, EntryLog
+
+
+# Columns loaded for each report row
+REPORT_COLUMNS = (
+    User.id,
+    User.name,
+    User.age,
+    User.mobile_number,
+    User.membership_id,
+    User.registration_date,
+)
+
+
+def not_entered_query(inactive_days=1, today=None, age_min=None, age_max=None):
+    """
+    Build the "members not entered" anti-join query
+
+    Args:
+        inactive_days (int): Members with no entry in the last N days
+            (1 = not entered today)
+        today (date): Reference day (defaults to today)
+        age_min (int): Optional minimum age (inclusive)
+        age_max (int): Optional maximum age (inclusive)
+
+    Returns:
+        Query: Lean rows ordered by name
+    """
+    today = today or businessday.today()
+    inactive_days = max(inactive_days or 1, 1)
+    since = today - timedelta(days=inactive_days - 1)
+
+    query = db.session.query(*REPORT_COLUMNS).outerjoin(
+        EntryLog,
+        db.and_(
+            EntryLog.user_id == User.id,
+            EntryLog.entry_date >= since,
+            EntryLog.entry_date <= today
+        )
+    ).filter(
+        EntryLog.id.is_(None)
+    )
+
+    # A member who joined inside the window has not been inactive for N days
+    if inactive_days > 1:
+        query = query.filter(User.registration_day < since)
+
+    if age_min is not None:
+        query = query.filter(User.age >= age_min)
+    if age_max is not None:
+        query = query.filter(User.age <= age_max)
+
+    return query.order_by(User.name, User.id)
+
+
+def stream_csv(query, chunk_size=1000):
+    """
+    Stream report rows as CSV without loading the whole result
+
+    Args:
+        query (Query): Query built by not_entered_query()
+        chunk_size (int): Rows fetched per database round trip
+
+    Yields:
+        str: CSV text chunks
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['name', 'age', 'mobile_number', 'membership_id', 'registration_date'])
+
+    for count, row in enumerate(query.yield_per(chunk_size), start=1):
+        writer.writerow([
+            row.name,
+            row.age,
+            row.mobile_number,
+            row.membership_id,
+            row.registration_date.strftime('%Y-%m-%d')
+        ])
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
@@ -5,12 +5,39 @@ Admin Blueprint
 - View entry logs with daily statistics
 - Filter by date
 - Dashboard with key metrics
+- Membership plans and subscriptions
+- Background jobs for heavy operations (/admin/jobs)
+- Request profiling results (/admin/profiling, when enabled)
+- Database circuit breakers and check-in fallback (/admin/db-health)
+- Dashboard, statistics and analytics fall back to their last good data
+  while the database is unavailable
 """
-from flask import Blueprint, render_template, request, session, redirect, url_for, flash, jsonify
-from models import db, User, EntryLog
-from datetime import datetime, date, timedelta
+from flask import Blueprint, render_template, request, session, redirect, url_for, flash, jsonify, Response, stream_with_context, send_file
+from models import db, User, EntryLog, MemberStats, Plan, Subscription, Job, Admin, AuditEvent
+from events import broker, format_sse
+from tenancy import current_location
+from ratelimit import rate_limit
+from reports import not_entered_query, stream_csv
+from analytics import analytics_summary
+from occupancy import occupancy
+from memberships import assign_plan
+from datetime import datetime, timedelta
+import businessday
 from config import APP_CONFIG
+from cache import get_cache
+from services import StatsService
+from serializers import entry_history_query, entry_row, stream_json
+from sqlalchemy.orm import joinedload
+from jobs import JOB_HANDLERS, JobError, get_runner
+from admin_auth import authenticate, login_admin, logout_admin, current_admin_valid, has_role
+from profiling import get_profiler
+from dbhealth import get_health, stale_fallback
+from fallback import get_fallback
+import audit
+from phones import normalize_phone
 from functools import wraps
+import inspect
+import os
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -18,10 +45,12 @@ admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 def login_required(f):
     """
     Decorator to check if user is authenticated as admin
+    - Session is validated against the admin account (cached, see admin_auth)
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'admin_logged_in' not in session:
+        if not current_admin_valid():
+            session.clear()
             flash('Please login first', 'error')
             return redirect(url_for('admin.login'))
         return f(*args, **kwargs)
@@ -29,24 +58,24 @@ def login_required(f):
 
 
 @admin_bp.route('/login', methods=['GET', 'POST'])
+@rate_limit('login')
 def login():
     """
     Admin login page
     - Session-based authentication
-    - Credentials stored in config (should be environment variables in production)
+    - Admin accounts with hashed passwords (admins table); the config
+      credentials only bootstrap the first owner account
     """
     if request.method == 'POST':
         username = request.form.get('username', '').strip()
         password = request.form.get('password', '').strip()
         
-        # Validate credentials against config
-        if (username == APP_CONFIG.ADMIN_USERNAME and 
-            password == APP_CONFIG.ADMIN_PASSWORD):
+        # Validate credentials against the admin accounts
+        admin = authenticate(username, password)
+        if admin:
             
             # Create session
-            session['admin_logged_in'] = True
-            session['admin_username'] = username
-            session.permanent = True
+            login_admin(admin)
             
             flash('Login successful!', 'success')
             return redirect(url_for('admin.dashboard'))
@@ -63,7 +92,7 @@ def logout():
     Admin logout
     - Clear session
     """
-    session.clear()
+    logout_admin()
     flash('You have been logged out', 'success')
     return redirect(url_for('admin.login'))
 
@@ -79,35 +108,70 @@ def dashboard():
     - Users entered today
     - Users not entered today
     """
-    # Get statistics
-    total_users = User.query.count()
+    today = businessday.today()
     
-    today = date.today()
-    users_entered_today = db.session.query(User).join(EntryLog).filter(
-        EntryLog.entry_date == today
-    ).count()
-    
-    users_not_entered_today = total_users - users_entered_today
-    
-    # Get recent registrations (last 5)
-    recent_registrations = User.query.order_by(User.registration_date.desc()).limit(5).all()
+    def build():
+        # Statistics (cached until the next registration / check-in)
+        counts = StatsService.dashboard_counts(today)
+        
+        # Recent registrations (last 5) and today's entries (members loaded
+        # in the same query), as plain rows so they can be kept for an outage
+        return {
+            'counts': counts,
+            'recent_registrations': [
+                {'name': user.name, 'membership_id': user.membership_id,
+                 'mobile_number': user.mobile_number, 'age': user.age,
+                 'registration_date': user.registration_date}
+                for user in StatsService.recent_registrations(limit=5)
+            ],
+            'today_entries': [
+                {'user': {'name': entry.user.name, 'membership_id': entry.user.membership_id},
+                 'entry_time': entry.entry_time}
+                for entry in StatsService.entries_query(today)
+            ],
+        }
     
-    # Get today's entries
-    today_entries = EntryLog.query.filter(
-        EntryLog.entry_date == today
-    ).order_by(EntryLog.entry_time.desc()).all()
+    # Last good copy, marked stale, while the database is unavailable
+    data = stale_fallback('dashboard', build)
+    counts = data['counts']
     
     stats = {
-        'total_users': total_users,
-        'users_entered_today': users_entered_today,
-        'users_not_entered_today': users_not_entered_today,
-        'today_entry_count': len(today_entries)
+        'total_users': counts['total_users'],
+        'users_entered_today': counts['entries'],
+        'users_not_entered_today': counts['total_users'] - counts['entries'],
+        'today_entry_count': len(data['today_entries']),
+        'occupancy': occupancy.current()
     }
     
     return render_template('admin_dashboard.html',
                          stats=stats,
-                         recent_registrations=recent_registrations,
-                         today_entries=today_entries)
+                         recent_registrations=data['recent_registrations'],
+                         today_entries=data['today_entries'])
+
+
+@admin_bp.route('/stream')
+@login_required
+def stream():
+    """
+    Server-Sent Events feed for the dashboard
+    - Pushes check-in and registration events
+    - Each event carries the incremental counters
+    """
+    location = current_location()
+    counters = broker.ensure_counters(StatsService.live_counters, channel=location)
+    subscriber = broker.subscribe(channel=location)
+    initial = format_sse('counters', {'counters': counters})
+    # The stream lives as long as the dashboard is open: give the pooled
+    # connection (login check, counter seed) back before streaming
+    db.session.remove()
+
+    response = Response(
+        stream_with_context(broker.stream(subscriber, initial=initial)),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @admin_bp.route('/users')
@@ -155,7 +219,7 @@ def view_entries():
     page = request.args.get('page', 1, type=int)
     date_filter = request.args.get('date', '').strip()
     
-    query = EntryLog.query
+    query = EntryLog.query.options(joinedload(EntryLog.user))
     
     # Date filter
     if date_filter:
@@ -166,7 +230,7 @@ def view_entries():
             flash('Invalid date format. Use YYYY-MM-DD', 'error')
     else:
         # Default: show today's entries
-        filter_date = date.today()
+        filter_date = businessday.today()
         query = query.filter(EntryLog.entry_date == filter_date)
     
     # Pagination
@@ -177,7 +241,7 @@ def view_entries():
     
     return render_template('admin_entries.html',
                          entries=entries,
-                         date_filter=date_filter or date.today().strftime('%Y-%m-%d'))
+                         date_filter=date_filter or businessday.today().strftime('%Y-%m-%d'))
 
 
 @admin_bp.route('/entries-today-not-entered')
@@ -185,20 +249,45 @@ def view_entries():
 def view_users_not_entered():
     """
     View users who have NOT entered today
+    - LEFT JOIN anti-join returning lean rows
+    - Pagination support, or streamed CSV with ?format=csv
+    - Optional filters: inactive for N days, age range
     """
-    today = date.today()
+    today = businessday.today()
+    page = request.args.get('page', 1, type=int)
+    inactive_days = request.args.get('days', 1, type=int)
+    age_min = request.args.get('age_min', type=int)
+    age_max = request.args.get('age_max', type=int)
     
-    # Get users who haven't entered today using subquery
-    users_entered_today = db.session.query(EntryLog.user_id).filter(
-        EntryLog.entry_date == today
-    ).distinct()
+    query = not_entered_query(
+        inactive_days=inactive_days,
+        today=today,
+        age_min=age_min,
+        age_max=age_max
+    )
     
-    users_not_entered = User.query.filter(
-        ~User.id.in_(users_entered_today)
-    ).order_by(User.name).all()
+    # Export for re-engagement calls
+    if request.args.get('format') == 'csv':
+        filename = f'not_entered_{today.strftime("%Y%m%d")}.csv'
+        audit.record('export', subject=filename)
+        return Response(
+            stream_with_context(stream_csv(query)),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+    
+    users_not_entered = query.paginate(
+        page=page,
+        per_page=APP_CONFIG.ITEMS_PER_PAGE
+    )
     
     return render_template('admin_not_entered.html',
                          users_not_entered=users_not_entered,
+                         filters={
+                             'days': max(inactive_days, 1),
+                             'age_min': age_min,
+                             'age_max': age_max
+                         },
                          date=today.strftime('%Y-%m-%d'))
 
 
@@ -212,55 +301,475 @@ def statistics():
     - Top entry days
     """
     # Get last 7 days of data
-    today = date.today()
+    today = businessday.today()
     seven_days_ago = today - timedelta(days=7)
     
-    # Daily entry counts for last 7 days
-    daily_stats = db.session.query(
-        EntryLog.entry_date,
-        db.func.count(EntryLog.id).label('entry_count')
-    ).filter(
-        EntryLog.entry_date >= seven_days_ago
-    ).group_by(
-        EntryLog.entry_date
-    ).order_by(
-        EntryLog.entry_date.desc()
-    ).all()
-    
-    # Registration stats for last 7 days
-    registration_stats = db.session.query(
-        db.func.date(User.registration_date).label('reg_date'),
-        db.func.count(User.id).label('count')
-    ).filter(
-        User.registration_date >= seven_days_ago
-    ).group_by(
-        db.func.date(User.registration_date)
-    ).order_by(
-        db.func.date(User.registration_date).desc()
-    ).all()
+    # Daily entry and registration counts for the last 7 days
+    # (last good copy while the database is unavailable)
+    daily_stats, registration_stats = stale_fallback('statistics', lambda: (
+        [tuple(row) for row in StatsService.daily_entry_counts(seven_days_ago)],
+        [tuple(row) for row in StatsService.daily_registration_counts(seven_days_ago)]
+    ))
     
     return render_template('admin_statistics.html',
                          daily_stats=daily_stats,
                          registration_stats=registration_stats)
 
 
+@admin_bp.route('/statistics/peak-times')
+@login_required
+def peak_times():
+    """
+    Hourly analytics page
+    - Hour-of-day x day-of-week heatmap
+    - Live estimated occupancy
+    - Daily counts with 7-day rolling average
+    """
+    days = min(max(request.args.get('days', 365, type=int), 7), 730)
+    return render_template('admin_analytics.html',
+                         analytics=stale_fallback(f'analytics:{days}', lambda: analytics_summary(days=days)))
+
+
+@admin_bp.route('/api/analytics')
+@login_required
+def analytics_api():
+    """
+    JSON version of the hourly analytics
+    - ?days=N look-back window for the heatmap (default 365)
+    """
+    days = min(max(request.args.get('days', 365, type=int), 7), 730)
+    return jsonify(stale_fallback(f'analytics:{days}', lambda: analytics_summary(days=days)))
+
+
+@admin_bp.route('/plans', methods=['GET', 'POST'])
+@login_required
+def plans():
+    """
+    Membership plans
+    - GET: List plans and the assign-plan form
+    - POST: Create a plan (owner only)
+    """
+    if request.method == 'POST':
+        if not has_role('owner'):
+            flash('Only owners can create plans', 'error')
+            return redirect(url_for('admin.plans'))
+        
+        name = request.form.get('name', '').strip()
+        duration_days = request.form.get('duration_days', type=int)
+        visit_quota = request.form.get('visit_quota', type=int)
+        price = request.form.get('price', type=float)
+        
+        if not name or not duration_days or duration_days < 1:
+            flash('Plan name and a duration of at least 1 day are required', 'error')
+            return redirect(url_for('admin.plans'))
+        
+        if visit_quota is not None and visit_quota < 1:
+            flash('Visit quota must be at least 1 (leave empty for unlimited)', 'error')
+            return redirect(url_for('admin.plans'))
+        
+        if Plan.query.filter_by(name=name).first():
+            flash(f'Plan "{name}" already exists', 'error')
+            return redirect(url_for('admin.plans'))
+        
+        db.session.add(Plan(name=name, duration_days=duration_days,
+                            visit_quota=visit_quota, price=price))
+        db.session.commit()
+        flash(f'Plan "{name}" created', 'success')
+        return redirect(url_for('admin.plans'))
+    
+    return render_template('admin_plans.html',
+                         plans=Plan.query.order_by(Plan.duration_days).all())
+
+
+@admin_bp.route('/plans/assign', methods=['POST'])
+@login_required
+def assign_member_plan():
+    """
+    Subscribe a member to a plan
+    - Member by membership ID or mobile number
+    - Renewals start when the current subscription ends
+    """
+    identifier = request.form.get('identifier', '').strip()
+    plan = db.session.get(Plan, request.form.get('plan_id', type=int) or 0)
+    start_date = request.form.get('start_date', '').strip()
+    
+    mobile_e164 = normalize_phone(identifier)
+    if mobile_e164:
+        user = User.query.filter_by(mobile_e164=mobile_e164).first()
+    else:
+        user = User.query.filter(
+            (User.membership_id == identifier) | (User.mobile_number == identifier)
+        ).first() if identifier else None
+    
+    if not user:
+        flash('Member not found', 'error')
+        return redirect(url_for('admin.plans'))
+    
+    if not plan or not plan.is_active:
+        flash('Please select an active plan', 'error')
+        return redirect(url_for('admin.plans'))
+    
+    try:
+        start = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+    except ValueError:
+        flash('Invalid start date format', 'error')
+        return redirect(url_for('admin.plans'))
+    
+    subscription = assign_plan(user.id, plan, start_date=start)
+    db.session.commit()
+    audit.record('plan_assigned', user_id=user.id, subject=plan.name)
+    
+    flash(f'{user.name} subscribed to {plan.name} '
+          f'({subscription.start_date:%Y-%m-%d} to {subscription.end_date:%Y-%m-%d})', 'success')
+    return redirect(url_for('admin.plans'))
+
+
+# ============= BACKGROUND JOBS =============
+
+def job_params(name, data):
+    """
+    Keyword arguments for a job handler from submitted form / JSON data
+    - Only parameters the handler accepts; empty values are dropped
+    - Numeric strings are converted to int
+    """
+    accepted = set(inspect.signature(JOB_HANDLERS[name]).parameters) - {'ctx'}
+    params = {}
+    for key in accepted:
+        value = data.get(key)
+        if value is None or value == '':
+            continue
+        if isinstance(value, str) and value.strip().lstrip('-').isdigit():
+            value = int(value)
+        params[key] = value
+    return params
+
+
+@admin_bp.route('/jobs', methods=['GET', 'POST'])
+@login_required
+def jobs():
+    """
+    Background jobs
+    - GET: Recent jobs (HTML, or JSON with ?format=json)
+    - POST: Submit a job (form or JSON: name + job parameters),
+      returns 202 with the job for JSON requests
+    """
+    runner = get_runner()
+    
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or request.form
+        name = data.get('name', '')
+        
+        try:
+            if name not in JOB_HANDLERS:
+                raise JobError(f'Unknown job: {name}')
+            new_job = runner.submit(name, job_params(name, data),
+                                    created_by=session.get('admin_username'))
+        except JobError as e:
+            if request.is_json:
+                return jsonify({'error': str(e)}), 400
+            flash(str(e), 'error')
+            return redirect(url_for('admin.jobs'))
+        audit.record('job_submitted', subject=f'#{new_job.id} {name}')
+        
+        if request.is_json:
+            return jsonify(new_job.to_dict()), 202
+        flash(f'Job #{new_job.id} queued: {JOB_HANDLERS[name].job_title}', 'success')
+        return redirect(url_for('admin.jobs'))
+    
+    runner.recover_stale()
+    recent_jobs = Job.query.order_by(Job.created_at.desc()).limit(50).all()
+    
+    if request.args.get('format') == 'json':
+        return jsonify({'jobs': [job_record.to_dict() for job_record in recent_jobs]})
+    
+    return render_template('admin_jobs.html',
+                         jobs=recent_jobs,
+                         job_types={name: handler.job_title for name, handler in JOB_HANDLERS.items()})
+
+
+@admin_bp.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    """Status and progress of one job (JSON)"""
+    job_record = db.session.get(Job, job_id)
+    if not job_record:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_record.to_dict())
+
+
+@admin_bp.route('/jobs/<int:job_id>/result')
+@login_required
+def job_result(job_id):
+    """
+    Result of a finished job
+    - Download of the produced file, or the JSON result
+    """
+    job_record = db.session.get(Job, job_id)
+    if not job_record:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    if job_record.status != 'succeeded':
+        return jsonify({'error': f'Job is {job_record.status}', 'job': job_record.to_dict()}), 409
+    
+    if job_record.result_path:
+        if not os.path.exists(job_record.result_path):
+            return jsonify({'error': 'Result file is no longer available'}), 410
+        audit.record('export', subject=f'#{job_record.id} {os.path.basename(job_record.result_path)}')
+        return send_file(job_record.result_path, as_attachment=True,
+                         download_name=os.path.basename(job_record.result_path))
+    
+    return jsonify(job_record.to_dict()['result'])
+
+
+@admin_bp.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job(job_id):
+    """Request cancellation of a queued or running job"""
+    job_record = db.session.get(Job, job_id)
+    if not job_record:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    cancelled = get_runner().cancel(job_record)
+    
+    if request.is_json:
+        db.session.refresh(job_record)
+        return jsonify(job_record.to_dict()), (202 if cancelled else 409)
+    
+    if cancelled:
+        flash(f'Cancellation requested for job #{job_id}', 'success')
+    else:
+        flash(f'Job #{job_id} has already finished', 'warning')
+    return redirect(url_for('admin.jobs'))
+
+
+@admin_bp.route('/api/cache')
+@login_required
+def cache_stats():
+    """Cache hit/miss counters per namespace (this worker)"""
+    cache = get_cache()
+    return jsonify({
+        'backend': type(cache.backend).__name__,
+        'namespaces': cache.stats()
+    })
+
+
+# ============= DATABASE HEALTH =============
+
+@admin_bp.route('/db-health', methods=['GET', 'POST'])
+@login_required
+def db_health():
+    """
+    Database circuit breakers and the check-in fallback of this worker (owner only)
+    - GET: HTML, or JSON with ?format=json (metrics)
+    - POST: replay journaled check-ins now
+    """
+    if not has_role('owner'):
+        flash('Only owners can view database health', 'error')
+        return redirect(url_for('admin.dashboard'))
+    
+    fallback = get_fallback()
+    if fallback is not None and request.method == 'POST':
+        counts = fallback.replay()
+        flash(f'Replayed {counts["scans"]} journaled scans ({counts["rejected"]} rejected)'
+              + (f', {counts["failed_files"]} file(s) left for later' if counts['failed_files'] else ''),
+              'warning' if counts['failed_files'] else 'success')
+        return redirect(url_for('admin.db_health'))
+    
+    health = dict(get_health().to_dict(), fallback=fallback.to_dict() if fallback else None)
+    if request.args.get('format') == 'json':
+        return jsonify(health)
+    return render_template('admin_db_health.html', health=health)
+
+
+# ============= PROFILING =============
+
+@admin_bp.route('/profiling', methods=['GET', 'POST'])
+@login_required
+def profiling():
+    """
+    Request profiling (owner only, PROFILING_ENABLED)
+    - Per-endpoint and per-template timings of this worker
+    - Sampled cProfile dumps; add ?profile=1 to any page to record one
+    - POST: reset the in-memory timings
+    """
+    if not has_role('owner'):
+        flash('Only owners can view profiling data', 'error')
+        return redirect(url_for('admin.dashboard'))
+    
+    profiler = get_profiler()
+    if profiler is not None and request.method == 'POST':
+        profiler.reset()
+        flash('Profiling timings reset', 'success')
+        return redirect(url_for('admin.profiling'))
+    
+    return render_template('admin_profiling.html',
+                         profiler=profiler,
+                         endpoints=profiler.endpoint_stats() if profiler else [],
+                         templates=profiler.template_stats() if profiler else [],
+                         dumps=profiler.dumps()[:100] if profiler else [])
+
+
+@admin_bp.route('/profiling/<name>')
+@login_required
+def profiling_dump(name):
+    """
+    One sampled request as pstats text
+    - ?sort=cumulative (default) or tottime; ?download=1 for the .prof file
+    """
+    profiler = get_profiler()
+    if not has_role('owner') or profiler is None or profiler.dump_path(name) is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    
+    if request.args.get('download') == '1':
+        return send_file(profiler.dump_path(name), as_attachment=True,
+                         download_name=f'{name}.prof')
+    
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime'):
+        sort = 'cumulative'
+    return Response(profiler.report(name, sort=sort), mimetype='text/plain')
+
+
+# ============= AUDIT LOG =============
+
+@admin_bp.route('/audit')
+@login_required
+def audit_log():
+    """
+    Audit log (owner only)
+    - Check-ins and exits with reject reasons, registrations, admin
+      logins, exports
+    - Filter by gym-local time range (default: last 24 hours) and event
+    - Paginated, or JSON with ?format=json
+    """
+    if not has_role('owner'):
+        flash('Only owners can view the audit log', 'error')
+        return redirect(url_for('admin.dashboard'))
+    
+    page = request.args.get('page', 1, type=int)
+    event = request.args.get('event', '').strip()
+    now = businessday.local_time(datetime.utcnow()).replace(second=0, microsecond=0)
+    
+    try:
+        start = datetime.strptime(request.args.get('start') or f'{now - timedelta(days=1):%Y-%m-%dT%H:%M}',
+                                  '%Y-%m-%dT%H:%M')
+        end = datetime.strptime(request.args.get('end') or f'{now + timedelta(minutes=1):%Y-%m-%dT%H:%M}',
+                                '%Y-%m-%dT%H:%M')
+    except ValueError:
+        flash('Invalid time range', 'error')
+        return redirect(url_for('admin.audit_log'))
+    if event not in AuditEvent.EVENTS:
+        event = ''
+    
+    # This worker's queued events first, so the page is up to date
+    writer = audit.get_writer()
+    if writer is not None:
+        writer.flush()
+    
+    query = audit.events_query(businessday.utc_time(start), businessday.utc_time(end),
+                               events=[event] if event else None)
+    events = query.paginate(page=page, per_page=APP_CONFIG.ITEMS_PER_PAGE)
+    
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'events': [row.to_dict() for row in events.items],
+            'page': events.page,
+            'pages': events.pages,
+            'total': events.total
+        })
+    
+    # Names for the ids on this page (two small lookups)
+    user_ids = {row.user_id for row in events.items if row.user_id}
+    members = dict(db.session.query(User.id, User.name).filter(User.id.in_(user_ids))) if user_ids else {}
+    admins = dict(db.session.query(Admin.id, Admin.username))
+    
+    return render_template('admin_audit.html',
+                         events=events,
+                         event_names=list(AuditEvent.EVENTS),
+                         members=members,
+                         admins=admins,
+                         writer=writer,
+                         local_time=businessday.local_time,
+                         filters={
+                             'start': f'{start:%Y-%m-%dT%H:%M}',
+                             'end': f'{end:%Y-%m-%dT%H:%M}',
+                             'event': event
+                         })
+
+
 @admin_bp.route('/api/user/<int:user_id>')
 @login_required
 def get_user_details(user_id):
     """
-    API endpoint to get user details with entry history
+    API endpoint to get user details with attendance summary
+    - Counters come from the precomputed member_stats row
+    - Includes the first page of entry history
     """
-    user = User.query.get(user_id)
+    user = db.session.get(User, user_id)
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    # Get all entries for this user
-    entries = EntryLog.query.filter_by(user_id=user_id).order_by(
-        EntryLog.entry_date.desc()
-    ).all()
+    stats = db.session.get(MemberStats, user_id)
+    if stats is None:
+        # One-time backfill for members who checked in before summaries existed
+        stats = MemberStats.rebuild(user_id)
+        db.session.commit()
+    
+    entries = user_entries_page(user_id, page=1)
+    subscriptions = Subscription.query.filter_by(user_id=user_id).order_by(
+        Subscription.start_date.desc()
+    ).limit(5).all()
     
     return jsonify({
         'user': user.to_dict(),
-        'entries': [entry.to_dict() for entry in entries],
-        'total_entries': len(entries)
+        'summary': stats.to_dict(),
+        'subscriptions': [subscription.to_dict() for subscription in subscriptions],
+        'entries': [entry_row(row) for row in entries.items],
+        'total_entries': stats.total_visits,
+        'has_more': entries.has_next
+    })
+
+
+@admin_bp.route('/api/user/<int:user_id>/entries')
+@login_required
+def get_user_entries(user_id):
+    """
+    API endpoint for a member's paginated entry history
+    - ?page=N, newest first
+    """
+    page = request.args.get('page', 1, type=int)
+    entries = user_entries_page(user_id, page=page)
+    
+    return jsonify({
+        'entries': [entry_row(row) for row in entries.items],
+        'page': entries.page,
+        'pages': entries.pages,
+        'total': entries.total,
+        'has_more': entries.has_next
     })
+
+
+@admin_bp.route('/api/user/<int:user_id>/history')
+@login_required
+def get_user_history(user_id):
+    """
+    API endpoint for a member's complete entry history
+    - Streamed as it is read, so memory stays flat for long histories
+    """
+    if db.session.get(User, user_id) is None:
+        return jsonify({'error': 'User not found'}), 404
+    
+    rows = entry_history_query(user_id).yield_per(1000)
+    return Response(
+        stream_with_context(stream_json({'user_id': user_id}, 'entries', rows, entry_row)),
+        mimetype='application/json'
+    )
+
+
+def user_entries_page(user_id, page=1):
+    """One page of a member's entries as lean rows, served by idx_user_date"""
+    return entry_history_query(user_id).paginate(
+        page=page,
+        per_page=APP_CONFIG.ITEMS_PER_PAGE,
+        error_out=False
+    )
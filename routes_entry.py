@@ -3,16 +3,27 @@ Entry/Check-in Blueprint
 - Handles user check-in via QR code
 - Validates users against registration database
 - Enforces one check-in per day limit
+- Exit scanning closes today's open entry (live occupancy)
+- Offline-capable kiosk page with member snapshot sync and batch scans
 - CRITICAL: No entry without prior registration
 """
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
-from models import db, User, EntryLog
-from datetime import datetime, date
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app, stream_with_context
+from models import db
+from tenancy import current_location
+from ratelimit import rate_limit
+from occupancy import occupancy
+from cache import get_cache
+from services import CheckinService, ServiceError
+from serializers import stream_json
+from kiosk import kiosk_required, member_snapshot, process_scans
+from dbhealth import DB_ERRORS
+from fallback import database_down, offline_scan, refresh_index
 
 entry_bp = Blueprint('entry', __name__)
 
 
 @entry_bp.route('/', methods=['GET', 'POST'])
+@rate_limit('checkin')
 def verify_entry():
     """
     Handle user entry/check-in verification
@@ -22,9 +33,12 @@ def verify_entry():
     CRITICAL VALIDATION:
     - User must exist in registered users table
     - User can only check in once per day
+    - User must hold a valid membership plan (when subscribed)
     - Mobile number OR Membership ID required
     """
     if request.method == 'POST':
+        # Keep the offline member index loaded (background refresh, never blocks)
+        refresh_index()
         try:
             # Extract form data - User provides either mobile or membership ID
             mobile_number = request.form.get('mobile_number', '').strip()
@@ -39,60 +53,201 @@ def verify_entry():
             
             # ============= DATABASE LOOKUP =============
             
-            # Search for user in database
-            user = None
-            
-            if mobile_number:
-                # Search by mobile number
-                user = User.query.filter_by(mobile_number=mobile_number).first()
-            elif membership_id:
-                # Search by membership ID
-                user = User.query.filter_by(membership_id=membership_id).first()
-            
             # CRITICAL: If user not found, reject entry
-            if not user:
-                flash('User Not Found / Not Registered. Please register first.', 'error')
-                return redirect(url_for('entry.verify_entry'))
-            
-            # ============= DAILY CHECK-IN LIMIT =============
-            
-            # Check if user already checked in today
-            today = date.today()
-            existing_entry = EntryLog.query.filter(
-                EntryLog.user_id == user.id,
-                EntryLog.entry_date == today
-            ).first()
-            
-            if existing_entry:
-                flash(f'Already Checked In Today! Welcome back, {user.name}.', 'warning')
-                return redirect(url_for('entry.verify_entry'))
-            
-            # ============= CREATE ENTRY LOG =============
-            
-            # Create new entry log record
-            entry_log = EntryLog(
-                user_id=user.id,
-                entry_date=today,
-                entry_time=datetime.utcnow()
+            user = CheckinService.require_member(
+                CheckinService.find_member(mobile_number, membership_id),
+                identifier=mobile_number or membership_id
             )
             
-            # Add to database and commit
-            db.session.add(entry_log)
-            db.session.commit()
+            # ============= CHECK-IN =============
+            
+            # Daily limit, membership eligibility, entry log and live updates
+            CheckinService.check_in(user)
             
             # Success response
             flash(f'✓ Entry Successful! Welcome {user.name}. Membership: {user.membership_id}', 'success')
             return redirect(url_for('entry.verify_entry'))
         
-        except Exception as e:
+        except ServiceError as e:
+            flash(e.message, e.category)
+            return redirect(url_for('entry.verify_entry'))
+        
+        except DB_ERRORS as e:
+            # ============= DATABASE UNAVAILABLE =============
+            
+            # Breaker still closed: nothing would replay a journal, so 503
+            if not database_down():
+                raise
+            
+            # Member index + local journal, replayed once the database is back
             db.session.rollback()
-            flash(f'Entry failed: {str(e)}', 'error')
+            current_app.logger.warning('Check-in journaled, database unavailable: %s', e)
+            try:
+                _, name, membership = offline_scan('checkin', mobile_number, membership_id)
+            except ServiceError as offline_error:
+                flash(offline_error.message, offline_error.category)
+            else:
+                flash(f'✓ Entry Successful! Welcome {name}. Membership: {membership}', 'success')
             return redirect(url_for('entry.verify_entry'))
     
     # GET request - display entry verification form
     return render_template('entry.html')
 
 
+@entry_bp.route('/exit', methods=['GET', 'POST'])
+@rate_limit('checkin')
+def verify_exit():
+    """
+    Handle member exit scan
+    - GET: Display exit form
+    - POST: Close the member's open entry for today (sets exit_time)
+    """
+    if request.method == 'POST':
+        refresh_index()
+        try:
+            mobile_number = request.form.get('mobile_number', '').strip()
+            membership_id = request.form.get('membership_id', '').strip()
+            
+            if not mobile_number and not membership_id:
+                flash('Please enter either Mobile Number or Membership ID', 'error')
+                return redirect(url_for('entry.verify_exit'))
+            
+            user = CheckinService.require_member(
+                CheckinService.find_member(mobile_number, membership_id),
+                identifier=mobile_number or membership_id, event='exit'
+            )
+            
+            # Close today's open entry (idx_user_date lookup)
+            CheckinService.check_out(user)
+            
+            flash(f'✓ Goodbye {user.name}! See you next time.', 'success')
+            return redirect(url_for('entry.verify_exit'))
+        
+        except ServiceError as e:
+            flash(e.message, e.category)
+            return redirect(url_for('entry.verify_exit'))
+        
+        except DB_ERRORS as e:
+            if not database_down():
+                raise
+            db.session.rollback()
+            current_app.logger.warning('Exit journaled, database unavailable: %s', e)
+            try:
+                _, name, _ = offline_scan('exit', mobile_number, membership_id)
+            except ServiceError as offline_error:
+                flash(offline_error.message, offline_error.category)
+            else:
+                flash(f'✓ Goodbye {name}! See you next time.', 'success')
+            return redirect(url_for('entry.verify_exit'))
+    
+    return render_template('exit.html')
+
+
+# ============= OFFLINE KIOSK =============
+
+@entry_bp.route('/kiosk/')
+def kiosk():
+    """
+    Kiosk check-in page
+    - Works offline: validates scans against a local member snapshot and
+      queues them until the server is reachable again
+    - Falls back to the plain check-in form on browsers without service
+      workers / IndexedDB
+    """
+    return render_template('kiosk.html',
+                         location=current_location(),
+                         sync_seconds=current_app.config.get('KIOSK_SYNC_SECONDS', 60),
+                         max_batch=current_app.config.get('KIOSK_MAX_BATCH', 200),
+                         phone_country_code=current_app.config['PHONE_COUNTRY_CODE'],
+                         phone_national_digits=current_app.config['PHONE_NATIONAL_DIGITS'])
+
+
+@entry_bp.route('/kiosk/sw.js')
+def kiosk_service_worker():
+    """Service worker for the kiosk page (scope /entry/kiosk/)"""
+    response = current_app.response_class(
+        render_template('kiosk_sw.js'),
+        mimetype='application/javascript'
+    )
+    # Browsers check for a new worker on every visit
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@entry_bp.route('/kiosk/members')
+@rate_limit('kiosk_members', methods=('GET',))
+@kiosk_required
+def kiosk_members():
+    """
+    Member snapshot for kiosks (device token or admin session)
+    - Rows are [kiosk_ref, mobile hash, membership ID hash]
+    - ?since=<version>: only members added after that version (delta)
+    - full=true in the response means the kiosk must drop its copy first
+    """
+    envelope, rows, serialize = member_snapshot(since=request.args.get('since', 0, type=int))
+    return current_app.response_class(
+        stream_with_context(stream_json(envelope, 'members', rows, serialize)),
+        mimetype='application/json'
+    )
+
+
+@entry_bp.route('/kiosk/scans', methods=['POST'])
+@rate_limit('kiosk_scans')
+@kiosk_required
+def kiosk_scans():
+    """
+    Batch endpoint for scans queued on a kiosk (device token or admin session)
+    - Body: {"scans": [{"id", "ref", "kind", "scanned_at"}, ...]}
+    - Returns one result per scan; the kiosk drops every answered scan
+    """
+    data = request.get_json(silent=True) or {}
+    scans = data.get('scans')
+    max_batch = current_app.config.get('KIOSK_MAX_BATCH', 200)
+    
+    if not isinstance(scans, list) or not all(isinstance(scan, dict) for scan in scans):
+        return jsonify({'error': 'scans must be a list of objects'}), 400
+    if len(scans) > max_batch:
+        return jsonify({'error': f'At most {max_batch} scans per batch'}), 413
+    
+    return jsonify({
+        'results': process_scans(scans, key='ref'),
+        'occupancy': occupancy.current()
+    })
+
+
+@entry_bp.route('/api/occupancy')
+def occupancy_status():
+    """
+    Live occupancy for the front desk
+    - Served from the in-memory counter (no COUNT query per refresh)
+    """
+    return jsonify({
+        'location': current_location(),
+        'occupancy': occupancy.current()
+    })
+
+
+@entry_bp.route('/exit/qr')
+def exit_qr_display():
+    """
+    Display exit QR code
+    - Permanent, points to the exit endpoint
+    """
+    from utils import QRCodeGenerator
+    
+    location = current_location()
+    qr_code = get_cache().get_or_set(
+        'qr', f'exit:{location}',
+        lambda: QRCodeGenerator.generate_exit_qr(current_app.config['PUBLIC_URL'], location=location),
+        ttl=current_app.config.get('QR_CACHE_SECONDS')
+    )
+    
+    return render_template('qr_display.html',
+                         qr_code=qr_code,
+                         qr_type='Exit',
+                         description='Scan this QR code when leaving the gym')
+
+
 @entry_bp.route('/qr')
 def qr_display():
     """
@@ -104,7 +259,12 @@ def qr_display():
     from utils import QRCodeGenerator
     
     # Generate QR code for entry endpoint
-    qr_code = QRCodeGenerator.generate_entry_qr('http://localhost:5000')
+    location = current_location()
+    qr_code = get_cache().get_or_set(
+        'qr', f'entry:{location}',
+        lambda: QRCodeGenerator.generate_entry_qr(current_app.config['PUBLIC_URL'], location=location),
+        ttl=current_app.config.get('QR_CACHE_SECONDS')
+    )
     
     return render_template('qr_display.html',
                          qr_code=qr_code,
@@ -113,6 +273,7 @@ def qr_display():
 
 
 @entry_bp.route('/api/check-duplicate', methods=['POST'])
+@rate_limit('check_duplicate')
 def check_duplicate():
     """
     API endpoint to check if a user exists (used for form validation)
@@ -122,19 +283,11 @@ def check_duplicate():
     mobile_number = data.get('mobile_number', '').strip()
     membership_id = data.get('membership_id', '').strip()
     
-    user = None
-    if mobile_number:
-        user = User.query.filter_by(mobile_number=mobile_number).first()
-    elif membership_id:
-        user = User.query.filter_by(membership_id=membership_id).first()
+    user = CheckinService.find_member(mobile_number, membership_id)
     
     if user:
         # Check if already entered today
-        today = date.today()
-        already_entered = EntryLog.query.filter(
-            EntryLog.user_id == user.id,
-            EntryLog.entry_date == today
-        ).first()
+        already_entered = CheckinService.entered_today(user.id)
         
         return jsonify({
             'exists': True,
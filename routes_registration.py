@@ -4,29 +4,16 @@ Registration Blueprint
 - Prevents duplicate mobile numbers
 - Auto-generates unique membership IDs
 """
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
-from models import db, User
-from datetime import datetime
-import secrets
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, current_app
+from models import db
+from tenancy import current_location
+from cache import get_cache
+from services import RegistrationService, ServiceError
+from dbhealth import DB_ERRORS
 
 registration_bp = Blueprint('registration', __name__)
 
 
-def generate_membership_id():
-    """
-    Generate unique membership ID in format: MEM-XXXXX
-    - Checks database to ensure uniqueness
-    """
-    while True:
-        # Generate 5-digit random number
-        random_id = secrets.randbelow(100000)
-        membership_id = f'MEM-{random_id:05d}'
-        
-        # Check if ID already exists in database
-        if not User.query.filter_by(membership_id=membership_id).first():
-            return membership_id
-
-
 @registration_bp.route('/', methods=['GET', 'POST'])
 def register():
     """
@@ -46,60 +33,25 @@ def register():
             age_str = request.form.get('age', '').strip()
             mobile_number = request.form.get('mobile_number', '').strip()
             
-            # ============= VALIDATION =============
-            
-            # Validate name
-            if not name or len(name) < 2:
-                flash('Name must be at least 2 characters long', 'error')
-                return redirect(url_for('registration.register'))
-            
-            # Validate age
-            if not age_str or not age_str.isdigit():
-                flash('Age must be a valid number', 'error')
-                return redirect(url_for('registration.register'))
-            
-            age = int(age_str)
-            if age < 10 or age > 120:
-                flash('Age must be between 10 and 120', 'error')
-                return redirect(url_for('registration.register'))
+            # ============= VALIDATION & USER CREATION =============
             
-            # Validate mobile number
-            if not mobile_number or len(mobile_number) < 10:
-                flash('Mobile number must be at least 10 digits', 'error')
-                return redirect(url_for('registration.register'))
-            
-            # CRITICAL: Check if mobile number already exists
-            # This ensures no duplicate registrations with same phone
-            existing_user = User.query.filter_by(mobile_number=mobile_number).first()
-            if existing_user:
-                flash('This mobile number is already registered. Please use a different number.', 'error')
-                return redirect(url_for('registration.register'))
-            
-            # ============= USER CREATION =============
-            
-            # Generate unique membership ID
-            membership_id = generate_membership_id()
-            
-            # Create new user object
-            new_user = User(
-                name=name,
-                age=age,
-                mobile_number=mobile_number,
-                membership_id=membership_id,
-                registration_date=datetime.utcnow()
-            )
-            
-            # Add to database and commit
-            db.session.add(new_user)
-            db.session.commit()
+            # Validates fields, rejects duplicate mobile numbers and
+            # generates the unique membership ID
+            new_user = RegistrationService.register(name, age_str, mobile_number)
             
             # Success response
-            flash(f'Registration successful! Your Membership ID: {membership_id}', 'success')
+            flash(f'Registration successful! Your Membership ID: {new_user.membership_id}', 'success')
+            return redirect(url_for('registration.register'))
+        
+        except ServiceError as e:
+            flash(e.message, e.category)
             return redirect(url_for('registration.register'))
         
-        except Exception as e:
+        except DB_ERRORS as e:
+            # Duplicate checks need the database: no offline registration
             db.session.rollback()
-            flash(f'Registration failed: {str(e)}', 'error')
+            current_app.logger.warning('Registration failed, database unavailable: %s', e)
+            flash('Registration is temporarily unavailable. Please try again in a few minutes.', 'error')
             return redirect(url_for('registration.register'))
     
     # GET request - display registration form
@@ -115,10 +67,14 @@ def qr_display():
     - Multiple users can scan it
     """
     from utils import QRCodeGenerator
-    from config import APP_CONFIG
     
-    # Generate QR code for registration endpoint
-    qr_code = QRCodeGenerator.generate_registration_qr('http://localhost:5000')
+    # Generate QR code for registration endpoint (cached, it never changes)
+    location = current_location()
+    qr_code = get_cache().get_or_set(
+        'qr', f'registration:{location}',
+        lambda: QRCodeGenerator.generate_registration_qr(current_app.config['PUBLIC_URL'], location=location),
+        ttl=current_app.config.get('QR_CACHE_SECONDS')
+    )
     
     return render_template('qr_display.html', 
                          qr_code=qr_code,
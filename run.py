@@ -1,7 +1,9 @@
-import qrcode
 import os
 import socket
+import sys
 from app import create_app
+from config import APP_CONFIG
+from utils import QRCodeGenerator
 
 app = create_app()
 
@@ -18,31 +20,58 @@ def get_local_ip():
     except Exception:
         return "127.0.0.1"
 
-def generate_qr_codes():
-    """Generates the two permanent QR codes"""
-    local_ip = get_local_ip()
-    base_url = f"http://{local_ip}:5000"
+def qr_filename(kind, location):
+    """Static file name of a QR code; the default location keeps the plain name"""
+    if location == APP_CONFIG.DEFAULT_LOCATION:
+        return f"{kind}_qr.png"
+    return f"{kind}_qr_{location}.png"
+
+def generate_qr_codes(base_url=None):
+    """
+    Generates the permanent QR codes for every gym location
+    - base_url: public address of the site (PUBLIC_URL); defaults to this
+      machine's LAN address for local testing
+    """
+    if not base_url:
+        base_url = os.getenv('PUBLIC_URL') or f"http://{get_local_ip()}:5000"
+        print("IMPORTANT: Your mobile and computer must be on the SAME WiFi network.")
+    base_url = base_url.rstrip('/')
     
     print(f"Creating QR codes linked to: {base_url}")
-    print("IMPORTANT: Your mobile and computer must be on the SAME WiFi network.")
-    
-    # 1. Registration QR
-    reg_url = f"{base_url}/register"
-    qr_reg = qrcode.make(reg_url)
-    qr_reg.save("app/static/registration_qr.png")
-    print(f"Generated Registration QR: app/static/registration_qr.png -> {reg_url}")
     
-    # 2. Check-In QR
-    checkin_url = f"{base_url}/checkin"
-    qr_checkin = qrcode.make(checkin_url)
-    qr_checkin.save("app/static/entry_qr.png")
-    print(f"Generated Entry QR: app/static/entry_qr.png -> {checkin_url}")
+    for location in APP_CONFIG.LOCATIONS:
+        # Only non-default locations need the ?location= parameter
+        code = None if location == APP_CONFIG.DEFAULT_LOCATION else location
+        
+        # 1. Registration QR
+        reg_url = QRCodeGenerator.build_url(base_url, "/register", code)
+        reg_file = f"app/static/{qr_filename('registration', location)}"
+        QRCodeGenerator.generate_qr_code(reg_url).save(reg_file)
+        print(f"Generated Registration QR: {reg_file} -> {reg_url}")
+        
+        # 2. Check-In QR
+        checkin_url = QRCodeGenerator.build_url(base_url, "/checkin", code)
+        checkin_file = f"app/static/{qr_filename('entry', location)}"
+        QRCodeGenerator.generate_qr_code(checkin_url).save(checkin_file)
+        print(f"Generated Entry QR: {checkin_file} -> {checkin_url}")
+        
+        # 3. Check-Out QR
+        checkout_url = QRCodeGenerator.build_url(base_url, "/checkout", code)
+        checkout_file = f"app/static/{qr_filename('exit', location)}"
+        QRCodeGenerator.generate_qr_code(checkout_url).save(checkout_file)
+        print(f"Generated Exit QR: {checkout_file} -> {checkout_url}")
 
 if __name__ == "__main__":
-    # Always regenerate QRs on startup to ensure IP is correct if network changed
+    # Deploy step: `python run.py generate-qr [base_url]` writes the PNGs once.
+    # Production serves them as static files (gunicorn -c gunicorn.conf.py wsgi:app)
+    if len(sys.argv) > 1 and sys.argv[1] == "generate-qr":
+        generate_qr_codes(sys.argv[2] if len(sys.argv) > 2 else None)
+        sys.exit(0)
+    
+    # Development: regenerate so the QR follows this machine's current IP
     print("Generating QR Codes...")
     generate_qr_codes()
         
     print("Starting Flask Server...")
     # NOTE: Run with host='0.0.0.0' to allow access from other devices (like mobile phones)
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(debug=app.config.get('DEBUG', False), host='0.0.0.0', port=5000)
@@ -0,0 +1,90 @@
+"""
+JSON fast path for the admin APIs
+- Member history endpoints select only the columns they return (no ORM
+  objects, no relationship loads)
+- Dates are formatted with isoformat(), which produces the same text as
+  the strftime() patterns in the models' to_dict() at a fraction of the cost
+- Long arrays are written with an incremental encoder, one chunk of rows
+  at a time, instead of building a list of dicts for jsonify()
+"""
+import json
+
+from app.models import db, EntryLog
+
+
+# Columns loaded for each entry history row
+ENTRY_COLUMNS = (
+    EntryLog.id,
+    EntryLog.user_id,
+    EntryLog.location,
+    EntryLog.entry_date,
+    EntryLog.entry_time,
+    EntryLog.exit_time,
+)
+
+# Compact separators; keys are written in a fixed order, no sorting
+_encoder = json.JSONEncoder(separators=(',', ':'), default=str)
+
+
+def format_date(value):
+    """date -> 'YYYY-MM-DD' (None stays None)"""
+    return value.isoformat() if value is not None else None
+
+
+def format_datetime(value):
+    """datetime -> 'YYYY-MM-DD HH:MM:SS' (None stays None)"""
+    return value.isoformat(sep=' ', timespec='seconds') if value is not None else None
+
+
+def entry_history_query(user_id):
+    """A member's entries as lean rows, newest first (idx_user_date)"""
+    return db.session.query(*ENTRY_COLUMNS).filter(
+        EntryLog.user_id == user_id
+    ).order_by(
+        EntryLog.entry_date.desc()
+    )
+
+
+def entry_row(row):
+    """
+    Serialize an entry history row
+    - Same keys and formats as EntryLog.to_dict(include_user=False)
+    """
+    return {
+        'id': row.id,
+        'user_id': row.user_id,
+        'location': row.location,
+        'entry_date': format_date(row.entry_date),
+        'entry_time': format_datetime(row.entry_time),
+        'exit_time': format_datetime(row.exit_time)
+    }
+
+
+def stream_json(envelope, key, rows, serialize, chunk_size=500):
+    """
+    Stream a JSON object whose last member is a long array
+
+    Args:
+        envelope (dict): Leading members of the object (small)
+        key (str): Name of the array member
+        rows (iterable): Rows to serialize (e.g. query.yield_per(n))
+        serialize (callable): Row -> JSON-compatible dict
+        chunk_size (int): Rows encoded per yielded chunk
+
+    Yields:
+        str: JSON text chunks; joined they form one valid document
+    """
+    head = _encoder.encode(envelope)[:-1]
+    yield f'{head}{"," if envelope else ""}{_encoder.encode(key)}:['
+
+    encode = _encoder.encode
+    chunk = []
+    separator = ''
+    for row in rows:
+        chunk.append(encode(serialize(row)))
+        if len(chunk) >= chunk_size:
+            yield separator + ','.join(chunk)
+            separator = ','
+            chunk = []
+
+    yield (separator + ','.join(chunk) if chunk else '') + ']}'
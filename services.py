@@ -0,0 +1,450 @@
+"""
+Service layer shared by both web stacks
+- CheckinService: member lookup, check-in and exit scans
+- RegistrationService: validation, membership IDs, member creation
+- StatsService: dashboard counters, entry lists and daily statistics
+- The top-level blueprints (routes_*.py) and the app/ package blueprints
+  only parse the request and render; queries, caching, occupancy and
+  live events live here, so both stacks run the same hot path
+- Business rule violations raise ServiceError with the message to show
+- Check-ins, exits and registrations are recorded in the audit log,
+  rejections with their ServiceError code
+"""
+import secrets
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+
+import audit
+import businessday
+from app.models import db, User, EntryLog, MemberStats
+from cache import get_cache
+from events import broker
+from memberships import check_eligibility
+from occupancy import occupancy
+from phones import display_phone, normalize_phone
+from tenancy import current_location, location_databases, use_location
+
+
+class ServiceError(Exception):
+    """
+    Business rule violation
+    - message: text for the member / admin
+    - category: flash category ('error' or 'warning')
+    - code: machine-readable reason
+    """
+
+    def __init__(self, message, category='error', code=None):
+        super().__init__(message)
+        self.message = message
+        self.category = category
+        self.code = code
+
+
+def _invalidate_dashboard():
+    get_cache().invalidate(f'dashboard:{current_location()}')
+
+
+def _member_exists(**filters):
+    """
+    True if a member matching filters exists in any location
+    - Queries each location database once (all_locations=True only lifts
+      the location filter inside the current database)
+    """
+    for location in location_databases():
+        with use_location(location):
+            if User.query.execution_options(all_locations=True).filter_by(**filters).first():
+                return True
+    return False
+
+
+def _audited(event):
+    """
+    Record the outcome of a service call in the audit log
+    - `event` on success, `<event>_rejected` with the ServiceError code
+    - Member: the User argument, or the User returned (registration)
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(cls, *args, **kwargs):
+            member = args[0] if args and isinstance(args[0], User) else None
+            try:
+                result = f(cls, *args, **kwargs)
+            except ServiceError as e:
+                audit.record(f'{event}_rejected', user_id=member.id if member else None,
+                             reason=e.code, at=kwargs.get('at'))
+                raise
+            if isinstance(result, User):
+                member = result
+            audit.record(event, user_id=member.id if member else None, at=kwargs.get('at'))
+            return result
+        return wrapper
+    return decorator
+
+
+# ============================================================
+# CHECK-IN
+# ============================================================
+
+class CheckinService:
+    """Member lookup, check-in and exit"""
+
+    @staticmethod
+    def find_member(mobile_number=None, membership_id=None):
+        """
+        Look up a registered member by mobile number or membership ID
+        - Mobile number takes precedence when both are given; any format
+          ("+91 98765 43210", "09876543210") matches via mobile_e164
+        - identifier -> user id is cached, so repeat scans load the member
+          by primary key
+        """
+        if mobile_number:
+            e164 = normalize_phone(mobile_number)
+            # Numbers that do not normalize can only be legacy rows
+            field, value = ('mobile_e164', e164) if e164 else ('mobile_number', mobile_number)
+        elif membership_id:
+            field, value = 'membership_id', membership_id
+        else:
+            return None
+
+        cache = get_cache()
+        namespace = f'members:{current_location()}'
+        found, user_id = cache.get(namespace, f'{field}:{value}')
+        if found:
+            user = db.session.get(User, user_id)
+            if user is not None:
+                return user
+
+        user = User.query.filter_by(**{field: value}).first()
+        if user is not None:
+            cache.set(namespace, f'{field}:{value}', user.id,
+                      ttl=current_app.config.get('MEMBER_LOOKUP_CACHE_SECONDS'))
+        return user
+
+    @classmethod
+    def find_by_identifier(cls, identifier):
+        """Look up a member by a single field holding a mobile number or membership ID"""
+        identifier = (identifier or '').strip()
+        if not identifier:
+            return None
+        return cls.find_member(mobile_number=identifier) or cls.find_member(membership_id=identifier)
+
+    @staticmethod
+    def require_member(user, identifier=None, event='checkin'):
+        """
+        Raise the standard "not registered" error for a failed lookup
+        - Recorded as a rejected `event` ('checkin' or 'exit') with the
+          identifier that was typed
+        """
+        if user is None:
+            audit.record(f'{event}_rejected', reason='not_found', subject=identifier)
+            raise ServiceError('User Not Found / Not Registered. Please register first.',
+                               code='not_found')
+        return user
+
+    @staticmethod
+    def entered_today(user_id, today=None):
+        """Today's entry of a member, or None (idx_user_date lookup)"""
+        return EntryLog.query.filter(
+            EntryLog.user_id == user_id,
+            EntryLog.entry_date == (today or businessday.today())
+        ).first()
+
+    @classmethod
+    @_audited('checkin')
+    def check_in(cls, user, today=None, at=None):
+        """
+        Record a member's daily check-in
+
+        - One check-in per member per day (also enforced by the UNIQUE
+          index on user_id, entry_date)
+        - Membership eligibility is read from the member's summary row
+        - Updates attendance counters, occupancy, dashboard caches and
+          pushes a 'checkin' event
+
+        Args:
+            user (User): Member checking in
+            today (date): Business day of the check-in (defaults to the
+                          business day of `at`)
+            at (datetime): Scan time in UTC (queued kiosk scans); defaults to now
+
+        Returns:
+            EntryLog: The new entry
+
+        Raises:
+            ServiceError: Already checked in, or no valid membership
+        """
+        at = at or datetime.utcnow()
+        today = today or businessday.business_day(at)
+
+        if cls.entered_today(user.id, today):
+            raise ServiceError(f'Already Checked In Today! Welcome back, {user.name}.',
+                               category='warning', code='already_checked_in')
+
+        stats = MemberStats.for_user(user.id)
+        denied = check_eligibility(stats, today)
+        if denied:
+            # Keep a refreshed entitlement / new summary row
+            db.session.commit()
+            raise ServiceError(f'{denied} ({user.name})', code='not_eligible')
+
+        entry_log = EntryLog(user_id=user.id, entry_date=today, entry_time=at)
+        db.session.add(entry_log)
+        stats.record_visit(today)
+        stats.use_visit()
+
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Concurrent scan already created today's entry
+            db.session.rollback()
+            raise ServiceError(f'Already Checked In Today! Welcome back, {user.name}.',
+                               category='warning', code='already_checked_in')
+
+        occupancy.entered(today=today, at=at)
+        _invalidate_dashboard()
+
+        broker.publish('checkin', {
+            'name': user.name,
+            'mobile_number': user.mobile_number,
+            'membership_id': user.membership_id,
+            'entry_time': entry_log.entry_time.strftime('%H:%M:%S'),
+            'occupancy': occupancy.current()
+        }, increments={'entries_today': 1}, today=today, channel=current_location())
+
+        return entry_log
+
+    @classmethod
+    @_audited('exit')
+    def check_out(cls, user, today=None, at=None):
+        """
+        Close a member's open entry for today (exit scan)
+        - at: scan time in UTC (queued kiosk scans); defaults to now
+
+        Returns:
+            EntryLog: The closed entry
+
+        Raises:
+            ServiceError: No open check-in today
+        """
+        at = at or datetime.utcnow()
+        today = today or businessday.business_day(at)
+
+        entry_log = EntryLog.query.filter(
+            EntryLog.user_id == user.id,
+            EntryLog.entry_date == today,
+            EntryLog.exit_time.is_(None)
+        ).first()
+
+        if not entry_log:
+            raise ServiceError(f'No open check-in found for today, {user.name}.',
+                               category='warning', code='no_open_visit')
+
+        entry_log.exit_time = at
+        db.session.commit()
+        occupancy.exited(today=today, at=at, entry_time=entry_log.entry_time)
+
+        broker.publish('exit', {
+            'name': user.name,
+            'membership_id': user.membership_id,
+            'exit_time': entry_log.exit_time.strftime('%H:%M:%S'),
+            'occupancy': occupancy.current()
+        }, today=today, channel=current_location())
+
+        return entry_log
+
+
+# ============================================================
+# REGISTRATION
+# ============================================================
+
+class RegistrationService:
+    """Member registration"""
+
+    @staticmethod
+    def validate(name, age, mobile_number):
+        """
+        Validate registration input
+
+        Returns:
+            tuple: (name, age, mobile_e164) cleaned, mobile number in
+                   canonical form (phones.normalize_phone)
+
+        Raises:
+            ServiceError: First invalid field
+        """
+        name = (name or '').strip()
+        age = str(age if age is not None else '').strip()
+        mobile_number = (mobile_number or '').strip()
+
+        if len(name) < 2:
+            raise ServiceError('Name must be at least 2 characters long', code='invalid_name')
+
+        if not age.isdigit():
+            raise ServiceError('Age must be a valid number', code='invalid_age')
+        age = int(age)
+        if age < 10 or age > 120:
+            raise ServiceError('Age must be between 10 and 120', code='invalid_age')
+
+        mobile_e164 = normalize_phone(mobile_number)
+        if mobile_e164 is None:
+            raise ServiceError(
+                f'Enter a valid mobile number ({current_app.config["PHONE_NATIONAL_DIGITS"]} digits, '
+                'or + and the country code)',
+                code='invalid_mobile'
+            )
+
+        return name, age, mobile_e164
+
+    @staticmethod
+    def generate_membership_id():
+        """
+        Generate unique membership ID in format: MEM-XXXXX
+        - Checks database to ensure uniqueness (across all locations)
+        """
+        while True:
+            membership_id = f'MEM-{secrets.randbelow(100000):05d}'
+            if not _member_exists(membership_id=membership_id):
+                return membership_id
+
+    @classmethod
+    @_audited('registration')
+    def register(cls, name, age, mobile_number):
+        """
+        Register a new member
+
+        - Mobile number must be unique across all locations, in any
+          format (compared in canonical form)
+        - Pushes a 'registration' event and invalidates dashboard caches
+
+        Returns:
+            User: The new member
+
+        Raises:
+            ServiceError: Invalid input or mobile number already registered
+        """
+        name, age, mobile_e164 = cls.validate(name, age, mobile_number)
+
+        duplicate = ServiceError(
+            'This mobile number is already registered. Please use a different number.',
+            code='duplicate_mobile'
+        )
+        if _member_exists(mobile_e164=mobile_e164):
+            raise duplicate
+
+        registered_at = datetime.utcnow()
+        new_user = User(
+            name=name,
+            age=age,
+            mobile_number=display_phone(mobile_e164),
+            mobile_e164=mobile_e164,
+            membership_id=cls.generate_membership_id(),
+            registration_date=registered_at,
+            registration_day=businessday.business_day(registered_at)
+        )
+        db.session.add(new_user)
+
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Concurrent registration with the same mobile number
+            db.session.rollback()
+            raise duplicate
+
+        _invalidate_dashboard()
+
+        broker.publish('registration', {
+            'name': new_user.name,
+            'membership_id': new_user.membership_id,
+            'mobile_number': new_user.mobile_number,
+            'age': new_user.age,
+            'registration_date': new_user.registration_date.strftime('%Y-%m-%d %H:%M')
+        }, increments={'total_users': 1, 'registrations_today': 1}, channel=current_location())
+
+        return new_user
+
+
+# ============================================================
+# STATISTICS
+# ============================================================
+
+class StatsService:
+    """Dashboard counters and attendance lists"""
+
+    @staticmethod
+    def dashboard_counts(day=None):
+        """
+        Member and entry counts for a day
+        - Cached per location until the next registration / check-in
+
+        Returns:
+            dict: total_users, entries (one per member per day, so this is
+                  also the number of members who entered)
+        """
+        day = day or businessday.today()
+        total_users, entries = get_cache().get_or_set(
+            f'dashboard:{current_location()}', f'counts:{day}',
+            lambda: (
+                User.query.count(),
+                EntryLog.query.filter(EntryLog.entry_date == day).count()
+            ),
+            ttl=current_app.config.get('DASHBOARD_CACHE_SECONDS')
+        )
+        return {'total_users': total_users, 'entries': entries}
+
+    @staticmethod
+    def live_counters():
+        """
+        Count queries used to seed the live dashboard counters
+        - Runs once per EVENTS_RESEED_SECONDS per process while dashboards
+          are open, not once per open dashboard
+        """
+        today = businessday.today()
+        return {
+            'total_users': User.query.count(),
+            'entries_today': EntryLog.query.filter(EntryLog.entry_date == today).count(),
+            'registrations_today': User.query.filter(User.registration_day == today).count()
+        }
+
+    @staticmethod
+    def entries_query(day=None):
+        """Entries of a day, newest first, with members loaded in the same query"""
+        return EntryLog.query.options(joinedload(EntryLog.user)).filter(
+            EntryLog.entry_date == (day or businessday.today())
+        ).order_by(EntryLog.entry_time.desc())
+
+    @staticmethod
+    def recent_registrations(limit=5):
+        """Newest members"""
+        return User.query.order_by(User.registration_date.desc()).limit(limit).all()
+
+    @staticmethod
+    def daily_entry_counts(since):
+        """(entry_date, entry_count) rows since a day, newest first"""
+        return db.session.query(
+            EntryLog.entry_date,
+            db.func.count(EntryLog.id).label('entry_count')
+        ).filter(
+            EntryLog.entry_date >= since
+        ).group_by(
+            EntryLog.entry_date
+        ).order_by(
+            EntryLog.entry_date.desc()
+        ).all()
+
+    @staticmethod
+    def daily_registration_counts(since):
+        """(reg_date, count) rows since a business day, newest first (idx_user_registration_day)"""
+        return db.session.query(
+            User.registration_day.label('reg_date'),
+            db.func.count(User.id).label('count')
+        ).filter(
+            User.registration_day >= since
+        ).group_by(
+            User.registration_day
+        ).order_by(
+            User.registration_day.desc()
+        ).all()
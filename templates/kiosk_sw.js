@@ -0,0 +1,52 @@
+// Kiosk service worker
+// - Keeps the kiosk page and stylesheet available offline
+// - Page: network first, cached copy when the network is down
+// - Member snapshot / scan uploads are never cached (the page handles them)
+var CACHE = 'gym-kiosk-v2';
+var KIOSK_URL = {{ url_for('entry.kiosk')|tojson }};
+var ASSETS = [KIOSK_URL, {{ url_for('static', filename='style.css')|tojson }}];
+
+self.addEventListener('install', function (event) {
+    event.waitUntil(
+        caches.open(CACHE).then(function (cache) { return cache.addAll(ASSETS); })
+            .then(function () { return self.skipWaiting(); })
+    );
+});
+
+self.addEventListener('activate', function (event) {
+    event.waitUntil(
+        caches.keys().then(function (keys) {
+            return Promise.all(keys.filter(function (key) {
+                return key.indexOf('gym-kiosk-') === 0 && key !== CACHE;
+            }).map(function (key) { return caches.delete(key); }));
+        }).then(function () { return self.clients.claim(); })
+    );
+});
+
+self.addEventListener('fetch', function (event) {
+    var request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+
+    if (request.mode === 'navigate') {
+        event.respondWith(
+            fetch(request).then(function (response) {
+                if (response.ok) {
+                    var copy = response.clone();
+                    caches.open(CACHE).then(function (cache) { cache.put(KIOSK_URL, copy); });
+                }
+                return response;
+            }).catch(function () {
+                return caches.match(KIOSK_URL);
+            })
+        );
+        return;
+    }
+
+    if (ASSETS.indexOf(new URL(request.url).pathname) !== -1) {
+        event.respondWith(
+            caches.match(request).then(function (cached) { return cached || fetch(request); })
+        );
+    }
+});
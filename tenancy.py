@@ -0,0 +1,184 @@
+"""
+Multi-location (tenant) support
+- Every member and entry belongs to a gym location
+- The current location is resolved per request (QR link, header or session)
+- ORM queries on location-scoped models are filtered automatically
+- ShardedSession routes a location's tenant tables to its own database
+  bind when configured; global tables (admins, plans, jobs) always stay
+  in the default database
+"""
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Column, String, event
+from sqlalchemy.orm import with_loader_criteria
+
+from config import APP_CONFIG
+
+
+class LocationMixin:
+    """
+    Adds the location (tenant) column to a model
+    - Defaults to the current location on insert
+    - Stored in the location's shard (see ShardedSession)
+    """
+    __sharded__ = True
+
+    location = Column(
+        String(20),
+        nullable=False,
+        default=lambda: current_location(),
+        server_default=APP_CONFIG.DEFAULT_LOCATION
+    )
+
+
+def current_location():
+    """
+    Get the active location code
+
+    Returns:
+        str: Location resolved for this request / app context,
+             or the configured default
+    """
+    if has_app_context():
+        location = g.get('location')
+        if location:
+            return location
+        return current_app.config.get('DEFAULT_LOCATION', APP_CONFIG.DEFAULT_LOCATION)
+    return APP_CONFIG.DEFAULT_LOCATION
+
+
+def resolve_location():
+    """
+    before_request hook: pick the location for this request
+    Priority: ?location= (from the per-location QR code), X-Gym-Location
+    header, then the location remembered in the session
+    """
+    locations = current_app.config.get('LOCATIONS', {})
+    requested = request.args.get('location') or request.headers.get('X-Gym-Location')
+
+    if requested in locations:
+        session['location'] = requested
+        g.location = requested
+    elif session.get('location') in locations:
+        g.location = session['location']
+    else:
+        g.location = current_app.config.get('DEFAULT_LOCATION', APP_CONFIG.DEFAULT_LOCATION)
+
+
+@contextmanager
+def use_location(code):
+    """
+    Scope ORM queries to a location outside a request (scripts, jobs)
+    Requires an active app context
+    """
+    previous = g.get('location')
+    g.location = code
+    try:
+        yield
+    finally:
+        g.location = previous
+
+
+def location_databases():
+    """
+    One location code per database: a location without its own bind
+    (the default database) first, then one per location bind
+    - Checks that must hold across all locations (membership IDs, mobile
+      numbers) run once in each: all_locations=True only lifts the
+      location filter within the current database
+    Requires an active app context
+    """
+    config = current_app.config
+    binds = config.get('LOCATION_BINDS', {})
+    codes = [code for code in config.get('LOCATIONS', {}) if code not in binds][:1]
+    seen = set()
+    for code, bind_key in binds.items():
+        if bind_key not in seen:
+            seen.add(bind_key)
+            codes.append(code)
+    return codes or [current_location()]
+
+
+def init_tenancy(app):
+    """Register location resolution on a Flask app"""
+    app.before_request(resolve_location)
+
+    @app.context_processor
+    def inject_location():
+        return {
+            'current_location': current_location(),
+            'locations': app.config.get('LOCATIONS', {})
+        }
+
+
+class ShardedSession(Session):
+    """
+    Session that sends each location's tenant tables to its database bind
+    - LOCATION_BINDS maps location code -> SQLALCHEMY_BINDS key
+    - Tenant tables: models with __sharded__ = True (LocationMixin models,
+      and member-owned rows keyed by the shard's user ids)
+    - Every other mapped table (admins, plans, jobs) uses the default
+      database, whatever the location
+    - Statements without a mapped table (text(), get_bind()) follow the
+      location: they are member data queries
+    - Unmapped locations use the default database
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            bind_key = current_app.config.get('LOCATION_BINDS', {}).get(current_location())
+            if bind_key and self._sharded(mapper, clause):
+                return self._db.engines[bind_key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _sharded(self, mapper, clause):
+        if mapper is not None:
+            return getattr(getattr(mapper, 'class_', mapper), '__sharded__', False)
+        table = getattr(clause, 'table', None)
+        tables = [table] if table is not None else getattr(clause, 'get_final_froms', list)()
+        names = {getattr(table, 'name', None) for table in tables} - {None}
+        if not names:
+            return True
+        return not names <= self._global_tables()
+
+    def _global_tables(self):
+        """Names of the tables of models without __sharded__"""
+        tables = getattr(self._db, '_global_tables', None)
+        if tables is None:
+            tables = self._db._global_tables = frozenset(
+                mapper.local_table.name for mapper in self._db.Model.registry.mappers
+                if not getattr(mapper.class_, '__sharded__', False)
+            )
+        return tables
+
+
+@event.listens_for(ShardedSession, 'do_orm_execute')
+def _scope_to_location(execute_state):
+    """
+    Add "location = :current" to every ORM query on LocationMixin models
+    - Only applies once a location has been resolved (request or use_location)
+    - Opt out with .execution_options(all_locations=True); that covers the
+      current database only, use location_databases() to reach the others
+    """
+    if (
+        not execute_state.is_select
+        or execute_state.is_column_load
+        or execute_state.is_relationship_load
+        or execute_state.execution_options.get('all_locations', False)
+        or not has_app_context()
+    ):
+        return
+
+    location = g.get('location')
+    if not location:
+        return
+
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(
+            LocationMixin,
+            lambda cls: cls.location == location,
+            include_aliases=True
+        )
+    )
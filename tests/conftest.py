@@ -0,0 +1,51 @@
+"""
+Shared test setup
+- Makes the top-level modules (app.py, services.py, ...) importable
+- Selects TestingConfig (APP_ENV=testing) before config is imported
+- make_app builds either stack on its own SQLite file:
+  'top' = app.py + routes_*.py, 'package' = the app/ package
+"""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('APP_ENV', 'testing')
+
+from config import APP_CONFIG  # noqa: E402
+
+
+def _top_level_module():
+    """app.py (shadowed on sys.path by the app/ package)"""
+    module = sys.modules.get('gym_top_level_app')
+    if module is None:
+        spec = importlib.util.spec_from_file_location('gym_top_level_app', os.path.join(ROOT, 'app.py'))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[spec.name] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+def build_app(stack, directory, monkeypatch, name=None):
+    """Migrated app of one stack on <directory>/<name>.db"""
+    name = name or stack
+    monkeypatch.setattr(APP_CONFIG, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{directory / name}.db')
+    monkeypatch.setattr(APP_CONFIG, 'DB_FALLBACK_JOURNAL_DIR', str(directory / f'{name}_journal'))
+    if stack == 'top':
+        flask_app = _top_level_module().create_app(APP_CONFIG)
+    else:
+        from app import create_app
+        flask_app = create_app()
+    flask_app.config['JOBS_RESULT_DIR'] = str(directory / f'{name}_jobs')
+    return flask_app
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Factory: make_app('top' | 'package', name=...) -> migrated Flask app"""
+    def factory(stack, name=None):
+        return build_app(stack, tmp_path, monkeypatch, name)
+    return factory
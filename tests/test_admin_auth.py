@@ -0,0 +1,26 @@
+"""
+First owner login: the public default password only bootstraps an owner
+in development / testing
+"""
+from app.models import Admin
+
+
+def login(flask_app, password):
+    client = flask_app.test_client()
+    client.post('/admin/login', data={'username': 'admin', 'password': password})
+    with flask_app.app_context():
+        return Admin.query.count()
+
+
+def test_default_password_refused_in_production(make_app):
+    flask_app = make_app('top')
+    flask_app.config['ADMIN_ALLOW_DEFAULT_PASSWORD'] = False
+    assert login(flask_app, 'admin@123') == 0
+
+
+def test_configured_password_creates_owner(make_app):
+    flask_app = make_app('top')
+    flask_app.config.update(ADMIN_ALLOW_DEFAULT_PASSWORD=False, ADMIN_PASSWORD='s3cret-owner')
+    assert login(flask_app, 's3cret-owner') == 1
+    with flask_app.app_context():
+        assert Admin.query.one().role == 'owner'
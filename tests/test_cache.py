@@ -0,0 +1,89 @@
+"""
+Cache tests against a local Redis stand-in (no server needed)
+"""
+import threading
+import time
+
+from cache import Cache, RedisBackend
+
+
+class FakeRedis:
+    """In-memory stand-in for the redis client calls RedisBackend makes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.data = {}
+
+    def get(self, key):
+        with self._lock:
+            return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+
+    def delete(self, key):
+        with self._lock:
+            self.data.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self.data.get(key, b'0')) + 1
+            self.data[key] = str(value).encode()
+            return value
+
+    def scan_iter(self, pattern):
+        prefix = pattern.rstrip('*')
+        with self._lock:
+            return [key for key in self.data if key.startswith(prefix)]
+
+
+def make_cache(client):
+    return Cache(RedisBackend(prefix='test', client=client), default_ttl=60)
+
+
+def test_invalidate_bumps_version_for_every_process():
+    client = FakeRedis()
+    writer, reader = make_cache(client), make_cache(client)
+
+    writer.set('dashboard:main', 'counts', {'today': 1})
+    assert reader.get('dashboard:main', 'counts') == (True, {'today': 1})
+
+    reader.invalidate('dashboard:main')
+    assert writer.get('dashboard:main', 'counts') == (False, None)
+    assert client.get('test:__version__:dashboard:main') == b'1'
+
+    # Other namespaces keep their entries
+    writer.set('qr', 'MEM-00001', b'png')
+    writer.invalidate('dashboard:main')
+    assert reader.get('qr', 'MEM-00001') == (True, b'png')
+
+
+def test_cached_none_is_a_hit():
+    cache = make_cache(FakeRedis())
+    cache.set('lookup', 'missing', None)
+    assert cache.get('lookup', 'missing') == (True, None)
+
+
+def test_get_or_set_is_single_flight():
+    cache = make_cache(FakeRedis())
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'value'
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_set('analytics', 'curve', compute)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ['value'] * 8
+    assert cache.stats()['analytics']['hits'] >= 1
@@ -0,0 +1,123 @@
+"""
+Check-ins while the database fails: journaled only while the breaker is
+open, so the journal is always replayed when the breaker closes again
+"""
+import sqlite3
+import time
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from app.models import db, EntryLog
+from fallback import get_fallback
+from services import RegistrationService
+from tenancy import use_location
+
+CHECKIN = {
+    'top': ('/entry/', {'mobile_number': '9876543210'}),
+    'package': ('/checkin', {'identifier': '9876543210'}),
+}
+
+
+@pytest.fixture(params=list(CHECKIN))
+def stack(request, make_app):
+    flask_app = make_app(request.param)
+    with flask_app.app_context(), use_location(flask_app.config['DEFAULT_LOCATION']):
+        RegistrationService.register('Asha Rao', '30', '9876543210')
+        get_fallback().index.refresh()
+    return request.param, flask_app
+
+
+class Outage:
+    """Every statement on the app's default engine fails (by default like a dropped connection)"""
+
+    EVENTS = ('do_execute', 'do_execute_no_params', 'do_executemany')
+
+    def __init__(self, flask_app, error=None):
+        with flask_app.app_context():
+            self.engine = db.engine
+        # SQLite's disconnect error (SQLiteDialect.is_disconnect)
+        self.error = error or sqlite3.ProgrammingError('Cannot operate on a closed database.')
+
+    def fail(self, *args):
+        raise self.error
+
+    def __enter__(self):
+        for name in self.EVENTS:
+            event.listen(self.engine, name, self.fail)
+        return self
+
+    def __exit__(self, *exc):
+        for name in self.EVENTS:
+            event.remove(self.engine, name, self.fail)
+
+
+def entries(flask_app):
+    with flask_app.app_context():
+        count = EntryLog.query.execution_options(all_locations=True).count()
+        db.session.remove()
+    return count
+
+
+def post(stack):
+    name, flask_app = stack
+    url, data = CHECKIN[name]
+    client = flask_app.test_client()
+    response = client.post(url, data=data)
+    with client.session_transaction() as session:
+        flashes = session.pop('_flashes', [])
+    return response.status_code, flashes
+
+
+def test_transient_error_with_breaker_closed_is_not_journaled(stack):
+    _, flask_app = stack
+    breaker = flask_app.extensions['dbhealth'].breaker(None)
+
+    with Outage(flask_app):
+        status, flashes = post(stack)
+
+    assert breaker.state == breaker.CLOSED
+    assert status == 503
+    assert flashes == []
+    assert flask_app.extensions['fallback'].journal.pending() == 0
+    assert entries(flask_app) == 0
+
+
+def test_lock_contention_is_not_an_outage(stack):
+    _, flask_app = stack
+    breaker = flask_app.extensions['dbhealth'].breaker(None)
+    breaker.failure_threshold = 1
+
+    # The server answered: normal error path (not a 503), breaker untouched, nothing journaled
+    with Outage(flask_app, sqlite3.OperationalError('database is locked')):
+        with pytest.raises(OperationalError, match='database is locked'):
+            post(stack)
+
+    assert not breaker.is_open and breaker.failures == 0
+    assert flask_app.extensions['fallback'].journal.pending() == 0
+
+
+def test_scan_journaled_while_open_is_replayed_on_recovery(stack):
+    _, flask_app = stack
+    breaker = flask_app.extensions['dbhealth'].breaker(None)
+    fallback = flask_app.extensions['fallback']
+    breaker.failure_threshold = 1
+
+    with Outage(flask_app):
+        status, flashes = post(stack)
+
+    assert breaker.is_open
+    assert status == 302
+    assert [category for category, _ in flashes] == ['success']
+    assert fallback.journal.pending() == 1
+
+    # The next query probes, closes the breaker and starts the replay
+    breaker.reset_seconds = 0
+    assert entries(flask_app) == 0
+    assert not breaker.is_open
+    deadline = time.monotonic() + 5
+    while fallback.journal.pending() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert fallback.journal.pending() == 0
+    assert entries(flask_app) == 1
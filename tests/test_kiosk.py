@@ -0,0 +1,81 @@
+"""
+Offline kiosk endpoints: device tokens / admin sessions, snapshot contents
+"""
+import time
+
+import pytest
+
+from app.models import User
+from kiosk import member_hash
+from ratelimit import parse_limit
+from services import RegistrationService
+
+SALT = 'test-kiosk-salt'
+TOKEN = {'X-Kiosk-Token': 'frontdesk-token'}
+
+
+@pytest.fixture
+def kiosk_app(make_app):
+    flask_app = make_app('top')
+    flask_app.config.update(KIOSK_TOKENS={'frontdesk': 'frontdesk-token'}, KIOSK_HASH_SALT=SALT)
+    with flask_app.app_context():
+        RegistrationService.register('Asha Rao', '30', '9876543210')
+    return flask_app
+
+
+def scan(ref=None, **extra):
+    return dict({'id': 's1', 'ref': ref, 'kind': 'checkin', 'scanned_at': time.time() * 1000}, **extra)
+
+
+@pytest.mark.parametrize('headers', [{}, {'X-Kiosk-Token': 'wrong'}])
+def test_requires_device_token_or_admin(kiosk_app, headers):
+    client = kiosk_app.test_client()
+    assert client.get('/entry/kiosk/members', headers=headers).status_code == 401
+    response = client.post('/entry/kiosk/scans', json={'scans': [scan(user_id=1)]}, headers=headers)
+    assert response.status_code == 401
+
+
+def test_disabled_without_salt(kiosk_app):
+    kiosk_app.config['KIOSK_HASH_SALT'] = ''
+    assert kiosk_app.test_client().get('/entry/kiosk/members', headers=TOKEN).status_code == 503
+
+
+def test_snapshot_has_only_refs_and_hashes(kiosk_app):
+    body = kiosk_app.test_client().get('/entry/kiosk/members', headers=TOKEN).get_json()
+    with kiosk_app.app_context():
+        user = User.query.one()
+        expected = [user.kiosk_ref, member_hash('+919876543210', SALT), member_hash(user.membership_id, SALT)]
+
+    assert set(body) == {'version', 'full', 'members'}
+    assert body['members'] == [expected]
+    assert SALT not in str(body) and 'Asha' not in str(body)
+
+
+def test_scans_resolve_refs_only(kiosk_app):
+    client = kiosk_app.test_client()
+    with kiosk_app.app_context():
+        user = User.query.one()
+        user_id, ref = user.id, user.kiosk_ref
+
+    # Member ids are not accepted from devices
+    results = client.post('/entry/kiosk/scans', json={'scans': [scan(user_id=user_id)]},
+                          headers=TOKEN).get_json()['results']
+    assert results[0]['status'] == 'not_found'
+
+    results = client.post('/entry/kiosk/scans', json={'scans': [scan(ref)]}, headers=TOKEN).get_json()['results']
+    assert results == [{'id': 's1', 'status': 'ok', 'message': None, 'name': 'Asha Rao'}]
+
+
+def test_admin_session(kiosk_app):
+    client = kiosk_app.test_client()
+    client.post('/admin/login', data={'username': 'admin', 'password': 'admin@123'})
+    assert client.get('/entry/kiosk/members').status_code == 200
+
+
+def test_snapshot_is_rate_limited(kiosk_app):
+    kiosk_app.config['RATELIMIT_ENABLED'] = True
+    (_, limit), = kiosk_app.config['RATELIMITS']['kiosk_members']
+    count, _ = parse_limit(limit)
+    client = kiosk_app.test_client()
+    statuses = [client.get('/entry/kiosk/members', headers=TOKEN).status_code for _ in range(count + 1)]
+    assert statuses == [200] * count + [429]
@@ -0,0 +1,36 @@
+"""
+Live occupancy counter: only live scans move it, older ones are left to
+reconciliation (count_open_visits)
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import User
+from occupancy import occupancy
+from services import CheckinService, RegistrationService
+from tenancy import use_location
+
+
+@pytest.fixture
+def members(make_app):
+    flask_app = make_app('top')
+    with flask_app.app_context(), use_location(flask_app.config['DEFAULT_LOCATION']):
+        for name, mobile in (('Asha Rao', '9876543210'), ('Ravi Kumar', '9876543211')):
+            RegistrationService.register(name, '30', mobile)
+        occupancy.reconcile()
+        yield User.query.order_by(User.id).all()
+
+
+def test_backdated_checkin_is_not_counted(members):
+    late = datetime.utcnow() - timedelta(hours=5)
+    CheckinService.check_in(members[0], at=late)
+    assert occupancy.current() == 0
+    assert occupancy.reconcile() == 0
+
+
+def test_live_checkin_and_exit_are_counted(members):
+    CheckinService.check_in(members[1])
+    assert occupancy.current() == 1
+    CheckinService.check_out(members[1])
+    assert occupancy.current() == 0
@@ -0,0 +1,173 @@
+"""
+Query-plan regression tests
+- Drives the hot endpoints of both stacks on a seeded SQLite database,
+  records every SELECT and runs EXPLAIN QUERY PLAN on it
+- A plan fails on a full table scan (SCAN <table> without an index) or a
+  temporary sort (USE TEMP B-TREE)
+- Accepted: the tiny admin-managed tables (plans, schema_version), the
+  '%text%' member search, the heatmap GROUP BY on a computed local hour
+"""
+import re
+import time
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import event
+
+import businessday
+from app.models import db, Plan, User
+from conftest import build_app
+from generate_data import generate
+from memberships import assign_plan
+from tenancy import use_location
+
+MEMBERS = 300
+SALT = 'plan-test-salt'
+TOKEN = {'X-Kiosk-Token': 'plan-test-token'}
+
+SMALL_TABLES = {'plans', 'schema_version'}
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+TABLE = re.compile(r'^(?:SCAN|SEARCH) (\w+)')
+
+
+def week_ago():
+    return (businessday.today() - timedelta(days=7)).isoformat()
+
+
+def endpoint_id(endpoint):
+    stack, method, url, body = endpoint
+    return f'{stack} {method} {url}'
+
+
+def scans(ref):
+    return {'scans': [{'id': 'p1', 'ref': ref, 'kind': 'checkin', 'scanned_at': time.time() * 1000}]}
+
+
+# (stack, method, url formatted with member / week_ago, body or callable(member) -> body)
+ENDPOINTS = [
+    ('top', 'POST', '/register/', {'name': 'Plan Test', 'age': '30', 'mobile_number': '9123456780'}),
+    ('top', 'POST', '/entry/', lambda m: {'mobile_number': m.mobile_number}),
+    ('top', 'POST', '/entry/', lambda m: {'membership_id': m.membership_id}),
+    ('top', 'POST', '/entry/exit', lambda m: {'mobile_number': m.mobile_number}),
+    ('top', 'POST', '/entry/api/check-duplicate', lambda m: {'mobile_number': m.mobile_number}),
+    ('top', 'GET', '/entry/kiosk/members', None),
+    ('top', 'GET', '/entry/kiosk/members?since=100', None),
+    ('top', 'POST', '/entry/kiosk/scans', lambda m: scans(m.kiosk_ref)),
+    ('top', 'GET', '/admin/dashboard', None),
+    ('top', 'GET', '/admin/users', None),
+    ('top', 'GET', '/admin/users?page=3', None),
+    ('top', 'GET', '/admin/users?search=SYN-0000012', None),
+    ('top', 'GET', '/admin/entries', None),
+    ('top', 'GET', '/admin/entries?date={week_ago}', None),
+    ('top', 'GET', '/admin/entries-today-not-entered', None),
+    ('top', 'GET', '/admin/entries-today-not-entered?days=7&age_min=20&age_max=40', None),
+    ('top', 'GET', '/admin/entries-today-not-entered?days=7&format=csv', None),
+    ('top', 'GET', '/admin/statistics', None),
+    ('top', 'GET', '/admin/statistics/peak-times', None),
+    ('top', 'GET', '/admin/api/analytics', None),
+    ('top', 'GET', '/admin/plans', None),
+    ('top', 'GET', '/admin/jobs', None),
+    ('top', 'GET', '/admin/audit', None),
+    ('top', 'GET', '/admin/api/user/{member.id}', None),
+    ('top', 'GET', '/admin/api/user/{member.id}/entries', None),
+    ('top', 'GET', '/admin/api/user/{member.id}/history', None),
+    ('package', 'POST', '/register', {'name': 'Plan Test', 'age': '30', 'mobile': '9123456780'}),
+    ('package', 'POST', '/checkin', lambda m: {'identifier': m.mobile_number}),
+    ('package', 'POST', '/checkout', lambda m: {'identifier': m.membership_id}),
+    ('package', 'GET', '/admin/dashboard', None),
+    ('package', 'GET', '/admin/users', None),
+]
+
+
+def _seed(flask_app):
+    with flask_app.app_context(), use_location(flask_app.config['DEFAULT_LOCATION']):
+        with db.session.get_bind().begin() as conn:
+            generate(conn, MEMBERS, 3, 1, flask_app.config['DEFAULT_LOCATION'])
+        plan = Plan(name='Monthly', duration_days=30, price=1000)
+        db.session.add(plan)
+        db.session.flush()
+        member = User.query.order_by(User.id).first()
+        assign_plan(member.id, plan)
+        db.session.commit()
+        db.session.remove()
+
+
+@pytest.fixture(scope='module')
+def seeded(tmp_path_factory):
+    apps = {}
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        directory = tmp_path_factory.mktemp('plans')
+        for stack in ('top', 'package'):
+            flask_app = build_app(stack, directory, monkeypatch)
+            flask_app.config.update(KIOSK_TOKENS={'plans': TOKEN['X-Kiosk-Token']}, KIOSK_HASH_SALT=SALT)
+            _seed(flask_app)
+            client = flask_app.test_client()
+            login = '/admin/login' if stack == 'top' else '/auth/login'
+            client.post(login, data={'username': 'admin', 'password': 'admin@123'})
+            apps[stack] = (flask_app, client)
+        yield apps
+
+
+def _member(flask_app):
+    with flask_app.app_context():
+        # Second member: the first one holds the subscription
+        member = User.query.order_by(User.id).offset(1).first()
+        db.session.expunge(member)
+        return member
+
+
+def _bad_plan_lines(conn, statement, parameters):
+    plan = [row[-1] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+    tables = {match.group(1) for match in map(TABLE.match, plan) if match}
+    if tables and tables <= SMALL_TABLES:
+        return [], plan
+    bad = [detail for detail in plan
+           if (FULL_SCAN.match(detail) and FULL_SCAN.match(detail).group(1) not in SMALL_TABLES)
+           or 'USE TEMP B-TREE' in detail]
+    return bad, plan
+
+
+def _accepted(statement):
+    # '%text%' search cannot use an index; heatmap groups by a computed hour
+    return " LIKE " in statement or 'local_hour' in statement or "strftime('%H'" in statement
+
+
+@pytest.mark.parametrize('stack, method, url, body', ENDPOINTS, ids=list(map(endpoint_id, ENDPOINTS)))
+def test_endpoint_query_plans(seeded, stack, method, url, body):
+    flask_app, client = seeded[stack]
+    member = _member(flask_app)
+    url = url.format(member=member, week_ago=week_ago())
+    body = body(member) if callable(body) else body
+    with flask_app.app_context():
+        engine = db.engine
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        headers = TOKEN if '/kiosk/' in url else {}
+        if method == 'POST':
+            kwargs = {'json': body} if '/kiosk/' in url or '/api/' in url else {'data': body}
+            response = client.post(url, headers=headers, **kwargs)
+        else:
+            response = client.get(url, headers=headers)
+            response.get_data()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+    assert response.status_code < 400, f'{method} {url} -> {response.status_code}'
+    assert statements, f'{method} {url} ran no queries'
+
+    failures = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            if _accepted(statement):
+                continue
+            bad, plan = _bad_plan_lines(conn, statement, parameters)
+            if bad:
+                failures.append(f'{statement}\n  plan: {plan}')
+    assert not failures, f'{method} {url}:\n' + '\n'.join(failures)
@@ -0,0 +1,168 @@
+"""
+Parity between the two route stacks
+- The same inputs are posted to the top-level app (routes_*.py) and to
+  the app/ package; both call services.py, so status codes, flash
+  categories, service error messages and database rows must match
+- Success wording is each stack's own copy: compared by category and
+  the member details it must mention
+"""
+import pytest
+
+from app.models import db, User, EntryLog, MemberStats
+
+# Form field names and URLs per stack
+STACKS = {
+    'top': {
+        'register': ('/register/', {'name': 'name', 'age': 'age', 'mobile': 'mobile_number'}),
+        'checkin': '/entry/',
+        'checkout': '/entry/exit',
+    },
+    'package': {
+        'register': ('/register', {'name': 'name', 'age': 'age', 'mobile': 'mobile'}),
+        'checkin': '/checkin',
+        'checkout': '/checkout',
+    },
+}
+
+
+class Stack:
+    """Test client for one stack with stack-neutral actions"""
+
+    def __init__(self, name, flask_app):
+        self.name = name
+        self.app = flask_app
+        self.client = flask_app.test_client()
+        self.routes = STACKS[name]
+
+    def _post(self, url, data):
+        response = self.client.post(url, data=data)
+        with self.client.session_transaction() as session:
+            flashes = session.pop('_flashes', [])
+        return response.status_code, flashes
+
+    def register(self, name, age, mobile):
+        url, fields = self.routes['register']
+        return self._post(url, {fields['name']: name, fields['age']: age, fields['mobile']: mobile})
+
+    def _scan(self, action, mobile=None, membership_id=None):
+        if self.name == 'package':
+            data = {'identifier': mobile or membership_id or ''}
+        else:
+            data = {'mobile_number': mobile or '', 'membership_id': membership_id or ''}
+        return self._post(self.routes[action], data)
+
+    def checkin(self, **identifier):
+        return self._scan('checkin', **identifier)
+
+    def checkout(self, **identifier):
+        return self._scan('checkout', **identifier)
+
+    def membership_id(self, mobile_e164):
+        with self.app.app_context():
+            return db.session.query(User.membership_id).filter_by(mobile_e164=mobile_e164).scalar()
+
+    def rows(self):
+        """Database side effects, without generated ids and timestamps"""
+        with self.app.app_context():
+            users = sorted(
+                (user.name, user.age, user.mobile_number, user.mobile_e164, user.location)
+                for user in User.query.execution_options(all_locations=True)
+            )
+            entries = sorted(
+                (entry.user.mobile_e164, entry.entry_date, entry.exit_time is not None)
+                for entry in EntryLog.query.execution_options(all_locations=True)
+            )
+            stats = sorted(
+                (db.session.get(User, row.user_id).mobile_e164, row.total_visits,
+                 row.current_streak, row.visits_this_month)
+                for row in MemberStats.query
+            )
+            db.session.remove()
+        return {'users': users, 'entries': entries, 'stats': stats}
+
+
+@pytest.fixture
+def stacks(make_app):
+    return [Stack(name, make_app(name)) for name in STACKS]
+
+
+def assert_same(outcomes):
+    """Every stack gave the same (status, flashes), with a message"""
+    (first_name, first), *others = outcomes.items()
+    assert first[1], f'{first_name} flashed nothing'
+    for name, outcome in others:
+        assert outcome == first, f'{name} differs from {first_name}'
+
+
+def run(stacks, action, *args, **kwargs):
+    return {stack.name: getattr(stack, action)(*args, **kwargs) for stack in stacks}
+
+
+def assert_success(outcomes, *mentions):
+    for name, (status, flashes) in outcomes.items():
+        assert status == 302, name
+        assert [category for category, _ in flashes] == ['success'], name
+        for mention in mentions:
+            assert mention(name) in flashes[0][1], name
+
+
+@pytest.mark.parametrize('name, age, mobile', [
+    ('', '30', '9876543210'),
+    ('Asha', '', '9876543210'),
+    ('Asha', 'abc', '9876543210'),
+    ('Asha', '7', '9876543210'),
+    ('Asha', '30', '12345'),
+    ('Asha', '30', ''),
+])
+def test_invalid_registration(stacks, name, age, mobile):
+    outcomes = run(stacks, 'register', name, age, mobile)
+    assert_same(outcomes)
+    assert all(flashes and flashes[0][0] == 'error' for _, flashes in outcomes.values())
+    assert all(stack.rows()['users'] == [] for stack in stacks)
+
+
+def test_registration_and_duplicate_mobile(stacks):
+    by_name = {stack.name: stack for stack in stacks}
+    outcomes = run(stacks, 'register', 'Asha Rao', '30', '98765 43210')
+    assert_success(outcomes, lambda name: by_name[name].membership_id('+919876543210'))
+
+    # Same number in another format
+    assert_same(run(stacks, 'register', 'Someone Else', '41', '+91 9876543210'))
+
+    first, second = (stack.rows() for stack in stacks)
+    assert first == second
+    assert len(first['users']) == 1
+
+
+def test_checkin_and_checkout(stacks):
+    run(stacks, 'register', 'Asha Rao', '30', '9876543210')
+
+    # Unknown member, nothing open to close yet
+    assert_same(run(stacks, 'checkin', mobile='9000000000'))
+    assert_same(run(stacks, 'checkout', mobile='9876543210'))
+
+    assert_success(run(stacks, 'checkin', mobile='9876543210'), lambda name: 'Asha Rao')
+    # Once per day, by either identifier
+    assert_same(run(stacks, 'checkin', mobile='9876543210'))
+    membership_ids = {stack.name: stack.membership_id('+919876543210') for stack in stacks}
+    assert_same({
+        stack.name: stack.checkin(membership_id=membership_ids[stack.name]) for stack in stacks
+    })
+
+    first, second = (stack.rows() for stack in stacks)
+    assert first == second
+    assert [closed for *_, closed in first['entries']] == [False]
+    assert first['stats'] == [('+919876543210', 1, 1, 1)]
+
+    assert_success(run(stacks, 'checkout', mobile='9876543210'), lambda name: 'Asha Rao')
+    assert_same(run(stacks, 'checkout', mobile='9876543210'))
+
+    first, second = (stack.rows() for stack in stacks)
+    assert first == second
+    assert [closed for *_, closed in first['entries']] == [True]
+
+
+def test_empty_identifier(stacks):
+    outcomes = run(stacks, 'checkin')
+    assert all(status == 302 for status, _ in outcomes.values())
+    assert all(flashes and flashes[0][0] == 'error' for _, flashes in outcomes.values())
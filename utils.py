@@ -1,9 +1,11 @@
 """
 Utility functions for QR code generation
+- qrcode/PIL are imported on first use, so workers that never render a
+  QR code do not pay for loading them at startup
 """
-import qrcode
 from io import BytesIO
 import base64
+from urllib.parse import urlencode
 
 
 class QRCodeGenerator:
@@ -11,10 +13,30 @@ class QRCodeGenerator:
     Handles QR code generation for the application
     - ONE registration QR code pointing to registration endpoint
     - ONE entry QR code pointing to entry verification endpoint
+    - ONE exit QR code pointing to the exit endpoint
     - QR codes are permanent and never expire
     - Multiple users can scan the same QR code
+    - Optional location code makes a per-branch QR (?location=<code>)
     """
 
+    @staticmethod
+    def build_url(app_url, path, location=None):
+        """
+        Build the URL encoded in a QR code
+        
+        Args:
+            app_url (str): Base URL of the application
+            path (str): Endpoint path ('/register', '/entry')
+            location (str): Optional gym location code
+        
+        Returns:
+            str: Full URL
+        """
+        url = f'{app_url}{path}'
+        if location:
+            url = f'{url}?{urlencode({"location": location})}'
+        return url
+
     @staticmethod
     def generate_qr_code(data, version=1, error_correction='M'):
         """
@@ -28,6 +50,8 @@ class QRCodeGenerator:
         Returns:
             PIL.Image: QR code image object
         """
+        import qrcode
+        
         qr = qrcode.QRCode(
             version=version,
             error_correction=getattr(qrcode.constants, f'ERROR_CORRECT_{error_correction}'),
@@ -58,7 +82,7 @@ class QRCodeGenerator:
         return f'data:image/png;base64,{img_base64}'
 
     @staticmethod
-    def generate_registration_qr(app_url):
+    def generate_registration_qr(app_url, location=None):
         """
         Generate permanent registration QR code
         - Points to the registration form endpoint
@@ -67,16 +91,17 @@ class QRCodeGenerator:
         
         Args:
             app_url (str): Base URL of the application
+            location (str): Optional gym location code
         
         Returns:
             str: Base64 encoded QR code image
         """
-        registration_url = f'{app_url}/register'
+        registration_url = QRCodeGenerator.build_url(app_url, '/register', location)
         img = QRCodeGenerator.generate_qr_code(registration_url)
         return QRCodeGenerator.image_to_base64(img)
 
     @staticmethod
-    def generate_entry_qr(app_url):
+    def generate_entry_qr(app_url, location=None):
         """
         Generate permanent entry/check-in QR code
         - Points to the entry verification endpoint
@@ -85,10 +110,28 @@ class QRCodeGenerator:
         
         Args:
             app_url (str): Base URL of the application
+            location (str): Optional gym location code
         
         Returns:
             str: Base64 encoded QR code image
         """
-        entry_url = f'{app_url}/entry'
+        entry_url = QRCodeGenerator.build_url(app_url, '/entry', location)
         img = QRCodeGenerator.generate_qr_code(entry_url)
         return QRCodeGenerator.image_to_base64(img)
+
+    @staticmethod
+    def generate_exit_qr(app_url, location=None):
+        """
+        Generate permanent exit QR code
+        - Points to the exit endpoint (closes today's open entry)
+        
+        Args:
+            app_url (str): Base URL of the application
+            location (str): Optional gym location code
+        
+        Returns:
+            str: Base64 encoded QR code image
+        """
+        exit_url = QRCodeGenerator.build_url(app_url, '/entry/exit', location)
+        img = QRCodeGenerator.generate_qr_code(exit_url)
+        return QRCodeGenerator.image_to_base64(img)
@@ -0,0 +1,24 @@
+"""
+WSGI entry point for production servers
+- gunicorn -c gunicorn.conf.py wsgi:app
+- Configuration is chosen by APP_ENV (production unless set otherwise)
+- Builds the application from app.py; that module is shadowed by the
+  app/ package on import, so it is loaded by file path
+- The app never migrates the schema here: run `python migrations.py
+  upgrade` (and `python run.py generate-qr`) once per deploy instead
+"""
+import importlib.util
+import os
+import sys
+
+os.environ.setdefault('APP_ENV', 'production')
+
+_spec = importlib.util.spec_from_file_location(
+    'gym_application', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+)
+_module = importlib.util.module_from_spec(_spec)
+# Registered first: Flask finds templates/static relative to this module
+sys.modules[_spec.name] = _module
+_spec.loader.exec_module(_module)
+
+app = _module.create_app()